@@ -23,9 +23,45 @@ class LooperConfigureDialog(GObject.Object, PeasGtk.Configurable):
         def set_looper_always_show(button):
             self.settings['always-show'] = button.get_active()
 
+        def set_looper_telemetry(button):
+            self.settings['telemetry'] = button.get_active()
+
+        def set_looper_profiling(button):
+            self.settings['profiling'] = button.get_active()
+
+        def set_looper_watchdog(button):
+            self.settings['watchdog'] = button.get_active()
+
+        def set_looper_detect_tuning(button):
+            self.settings['detect-tuning'] = button.get_active()
+
+        def set_looper_correct_tuning(button):
+            self.settings['correct-tuning'] = button.get_active()
+
+        def set_looper_detect_chords(button):
+            self.settings['detect-chords'] = button.get_active()
+
+        def set_looper_transcribe(button):
+            self.settings['transcribe'] = button.get_active()
+
+        def set_looper_suggest_loops(button):
+            self.settings['suggest-loops'] = button.get_active()
+
+        def set_looper_analyse_library(button):
+            self.settings['analyse-library'] = button.get_active()
+
         self.configure_callback_dic = {
             "rb_looper_position_changed": set_looper_position,
             "rb_looper_always_show_changed": set_looper_always_show,
+            "rb_looper_telemetry_changed": set_looper_telemetry,
+            "rb_looper_profiling_changed": set_looper_profiling,
+            "rb_looper_watchdog_changed": set_looper_watchdog,
+            "rb_looper_detect_tuning_changed": set_looper_detect_tuning,
+            "rb_looper_correct_tuning_changed": set_looper_correct_tuning,
+            "rb_looper_detect_chords_changed": set_looper_detect_chords,
+            "rb_looper_transcribe_changed": set_looper_transcribe,
+            "rb_looper_suggest_loops_changed": set_looper_suggest_loops,
+            "rb_looper_analyse_library_changed": set_looper_analyse_library,
         }
         builder = Gtk.Builder()
         PREFS_PATH = rb.find_plugin_file(self, 'ui/looper-prefs.ui')
@@ -37,5 +73,23 @@ class LooperConfigureDialog(GObject.Object, PeasGtk.Configurable):
         builder.get_object("rb_looper_position").set_active(active_position)
         always_show = self.settings['always-show']
         builder.get_object("rb_looper_always_show").set_active(always_show)
+        telemetry = self.settings['telemetry']
+        builder.get_object("rb_looper_telemetry").set_active(telemetry)
+        profiling = self.settings['profiling']
+        builder.get_object("rb_looper_profiling").set_active(profiling)
+        watchdog = self.settings['watchdog']
+        builder.get_object("rb_looper_watchdog").set_active(watchdog)
+        detect_tuning = self.settings['detect-tuning']
+        builder.get_object("rb_looper_detect_tuning").set_active(detect_tuning)
+        correct_tuning = self.settings['correct-tuning']
+        builder.get_object("rb_looper_correct_tuning").set_active(correct_tuning)
+        detect_chords = self.settings['detect-chords']
+        builder.get_object("rb_looper_detect_chords").set_active(detect_chords)
+        transcribe = self.settings['transcribe']
+        builder.get_object("rb_looper_transcribe").set_active(transcribe)
+        suggest_loops = self.settings['suggest-loops']
+        builder.get_object("rb_looper_suggest_loops").set_active(suggest_loops)
+        analyse_library = self.settings['analyse-library']
+        builder.get_object("rb_looper_analyse_library").set_active(analyse_library)
         builder.connect_signals(self.configure_callback_dic)
         return self.config
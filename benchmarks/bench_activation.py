@@ -0,0 +1,126 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Plugin activation time.
+
+Measures, on the mock shell:
+
+- import: importing the `looper` module, once per process,
+- activate: `do_activate`, what Rhythmbox waits for at startup,
+- idle: draining the main loop right after, i.e. work deferred to idle
+  callbacks; it delays the first redraw but not the startup,
+- enable: turning Looper on for the first time,
+- deactivate: `do_deactivate`.
+
+The first cycle is cold (GStreamer plugins and modules load) and reported
+on its own; the rest are summarized:
+
+    xvfb-run python benchmarks/bench_activation.py --json before.json
+    xvfb-run python benchmarks/bench_activation.py --compare before.json
+"""
+
+import sys
+import json
+import time
+import argparse
+
+from rbmock import Harness
+
+
+PHASES = ('activate', 'idle', 'enable', 'deactivate')
+
+
+def timed(func):
+    started = time.time()
+    func()
+    return (time.time() - started) * 1000
+
+
+def cycle(harness, entry):
+    times = {}
+    times['activate'] = timed(harness.activate)
+    times['idle'] = timed(harness.iterate)
+    harness.play(entry)
+    harness.iterate()
+    times['enable'] = timed(lambda: harness.set_looper_active(True))
+    harness.set_looper_active(False)
+    times['deactivate'] = timed(harness.deactivate)
+    harness.stop()
+    harness.iterate()
+    return times
+
+
+def median(values):
+    values = sorted(values)
+    return values[len(values) // 2]
+
+
+def report(results, baseline):
+    for name in ('import', 'cold') + PHASES:
+        if name not in results:
+            continue
+        line = '%-11s' % name
+        values = results[name]
+        if not isinstance(values, dict):
+            values = {'median': values}
+        for stat in sorted(values):
+            line += '  %s %8.2f ms' % (stat, values[stat])
+            if baseline and name in baseline:
+                before = baseline[name]
+                if not isinstance(before, dict):
+                    before = {'median': before}
+                if stat in before:
+                    line += ' (%+.2f)' % (values[stat] - before[stat])
+        print(line)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--cycles', type=int, default=20)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='show deltas against a previous '
+                                          '--json file')
+    args = parser.parse_args()
+
+    harness = Harness()
+    entry = harness.add_track('Activation', seconds=20)
+    results = {'import': timed(lambda: __import__('looper'))}
+
+    cold = cycle(harness, entry)
+    results['cold'] = cold['activate']
+    cycles = [cycle(harness, entry) for i in range(args.cycles)]
+    for phase in PHASES:
+        values = [times[phase] for times in cycles]
+        results[phase] = {'median': median(values), 'min': min(values),
+                          'max': max(values)}
+    harness.close()
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,127 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Compat layer cost.
+
+- import: importing `looper_rb3compat` in a fresh interpreter (with the
+  mock RB modules), median of `--imports` runs,
+- per call: the compat calls Looper makes while running, in microseconds.
+
+    python benchmarks/bench_compat.py --json before.json
+    python benchmarks/bench_compat.py --compare before.json
+
+No display needed.
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+import subprocess
+
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+IMPORT = '''
+import sys, time
+sys.path.insert(0, %r)
+import rbmock
+rbmock.install_modules()
+started = time.time()
+import looper_rb3compat
+print((time.time() - started) * 1000)
+''' % HERE
+
+CALLS = (
+    ('is_rb3', 'compat.is_rb3(shell)'),
+    ('compare_pygobject_version', 'compat.compare_pygobject_version("3.9")'),
+    ('get_action', 'group.get_action("ActivateLooper")'),
+    ('Action.get_active', 'action.get_active()'),
+    ('Action.label', 'action.label'),
+)
+
+
+def measure_import(runs):
+    times = []
+    for i in range(runs):
+        output = subprocess.check_output([sys.executable, '-c', IMPORT])
+        times.append(float(output.decode().split()[-1]))
+    return sorted(times)[len(times) // 2]
+
+
+def measure_calls(number):
+    import rbmock
+    rbmock.install_modules()
+    from gi.repository import Gio, GLib
+    import looper_rb3compat as compat
+
+    group = compat.ActionGroup(None, 'LooperActionGroup')
+    gaction = Gio.SimpleAction.new_stateful('ActivateLooper', None,
+                                            GLib.Variant('b', False))
+    action = compat.Action(None, gaction)
+    action.label = 'Looper'
+    # What add_action stores, without an application to add it to.
+    group._actions['ActivateLooper'] = action
+    namespace = {'compat': compat, 'shell': None, 'group': group,
+                 'action': action}
+
+    results = {}
+    for name, statement in CALLS:
+        seconds = min(timeit.repeat(statement, globals=namespace,
+                                    number=number, repeat=5))
+        results[name] = seconds / number * 1e6
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--imports', type=int, default=9)
+    parser.add_argument('--number', type=int, default=100000)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='show deltas against a previous '
+                                          '--json file')
+    args = parser.parse_args()
+
+    results = {'import_ms': measure_import(args.imports),
+               'calls_us': measure_calls(args.number)}
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    def delta(value, before):
+        return ' (%+.3f)' % (value - before) if before is not None else ''
+
+    print('%-28s %9.2f ms%s' % ('import', results['import_ms'], delta(
+        results['import_ms'], baseline and baseline.get('import_ms'))))
+    for name, statement in CALLS:
+        value = results['calls_us'][name]
+        before = baseline and baseline.get('calls_us', {}).get(name)
+        print('%-28s %9.3f us%s' % (name, value, delta(value, before)))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
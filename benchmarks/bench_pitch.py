@@ -0,0 +1,131 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Tuner pitch detection accuracy and cost.
+
+For notes from E1 to E6, rendered as a sine with a second harmonic plus
+noise and as a plucked string, reports the detection error in cents and
+the frames the detector gave up on, then the time one `Listener` frame
+costs (a real-time listener analyses RATE / HOP frames a second):
+
+    python benchmarks/bench_pitch.py --json before.json
+    python benchmarks/bench_pitch.py --compare before.json
+
+No display needed.
+"""
+
+import os
+import sys
+import json
+import math
+import timeit
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from looper_pitch import Listener, yin
+from looper_synth import pluck
+
+
+RATE = Listener.RATE
+FRAME = Listener.FRAME
+
+# E1 to E6, a semitone apart.
+FREQS = [41.2 * 2 ** (i / 12.0) for i in range(61)]
+
+
+def tone(freq, noise):
+    t = np.arange(FRAME) / float(RATE)
+    return (np.sin(2 * np.pi * freq * t) +
+            0.3 * np.sin(4 * np.pi * freq * t) +
+            noise * np.random.randn(FRAME))
+
+
+def plucked(freq, noise):
+    # Skip the attack, like a tuner listening to a ringing string.
+    samples = pluck(freq, FRAME + RATE // 10, RATE)[RATE // 10:]
+    return samples / np.abs(samples).max() + noise * np.random.randn(FRAME)
+
+
+def measure_accuracy(render, noise):
+    errors, missed = [], 0
+    for freq in FREQS:
+        found = yin(render(freq, noise), RATE)
+        if found is None:
+            missed += 1
+        else:
+            errors.append(abs(1200 * math.log(found / freq, 2)))
+    errors.sort()
+    return {'median_cents': errors[len(errors) // 2] if errors else None,
+            'max_cents': errors[-1] if errors else None,
+            'missed': missed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--noise', type=float, default=0.05)
+    parser.add_argument('--number', type=int, default=1000)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='show deltas against a previous '
+                                          '--json file')
+    args = parser.parse_args()
+
+    np.random.seed(0)
+    results = {'sine': measure_accuracy(tone, args.noise),
+               'pluck': measure_accuracy(plucked, args.noise)}
+    frame = tone(110.0, args.noise)
+    seconds = min(timeit.repeat(lambda: yin(frame, RATE),
+                                number=args.number, repeat=5))
+    results['frame_us'] = seconds / args.number * 1e6
+    results['cpu_percent'] = (results['frame_us'] / 1e6 *
+                              RATE / float(Listener.HOP) * 100)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    def delta(value, before):
+        if before is None or value is None:
+            return ''
+        return ' (%+.2f)' % (value - before)
+
+    for name in ('sine', 'pluck'):
+        before = (baseline or {}).get(name, {})
+        line = '%-6s' % name
+        for stat in ('median_cents', 'max_cents', 'missed'):
+            value = results[name][stat]
+            line += '  %s %s%s' % (stat, 'n/a' if value is None else
+                                   '%.2f' % value,
+                                   delta(value, before.get(stat)))
+        print(line)
+    for name, unit in (('frame_us', 'us'), ('cpu_percent', '%')):
+        print('%-12s %8.2f %s%s' % (name, results[name], unit, delta(
+            results[name], baseline and baseline.get(name))))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,386 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Loop seam accuracy.
+
+Plays synthetic tracks through the loop engine and measures, for each wrap
+from End back to Start:
+
+- overshoot: how far past End (song time) the audio went before the wrap,
+- undershoot: how far before Start (song time) the audio resumed,
+- gap: silence (wall time) between the last audio before the wrap and the
+  first audio after it.
+
+Every 100 ms slot of a track carries two tones, one encoding the second and
+one the tenth of a second, so the song position can be read back from the
+audio that reaches the sink. Resolution is about one analysis window
+(~46 ms).
+
+The matrix covers codecs and tempo/rate presets. Every change to
+`LoopEngine.tick`, `LooperPlugin.loop` or the seeking code should be judged
+against these numbers:
+
+    python benchmarks/bench_seam.py --json before.json
+    python benchmarks/bench_seam.py --compare before.json
+
+Requires NumPy. Runs in real time (each cell plays `--wraps` loops).
+"""
+
+import os
+import sys
+import json
+import time
+import wave
+import bisect
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from looper_engine import LoopEngine
+from looper_engine import PRESETS
+from looper_practice import PracticePlayer
+
+
+RATE = 44100
+
+SLOT = 0.1
+SECOND_BASE, SECOND_STEP = 300.0, 40.0
+TENTH_BASE, TENTH_STEP = 3200.0, 160.0
+
+WINDOW = 2048
+HOP = 1024
+SILENCE = 0.01
+
+CODECS = {
+    'wav': None,
+    'mp3-cbr': 'lamemp3enc target=bitrate cbr=true bitrate=192 ! id3v2mux',
+    'mp3-vbr': 'lamemp3enc target=quality quality=2 ! xingmux ! id3v2mux',
+    'ogg': 'vorbisenc quality=0.5 ! oggmux',
+    'flac': 'flacenc',
+}
+
+PRESET_VALUES = dict((label, value) for label, value in PRESETS)
+
+# (tempo, rate) preset labels
+DEFAULT_MATRIX = [
+    ('reset', 'reset'),
+    ('x0.5', 'reset'),
+    ('x0.75', 'reset'),
+    ('x1.5', 'reset'),
+    ('x2', 'reset'),
+    ('reset', 'x0.8'),
+    ('reset', 'x1.5'),
+]
+
+
+###############################################################################
+# Tracks
+###############################################################################
+
+def synth_timestamp_track(path, seconds):
+    """Stereo WAV whose tones encode the position of every 100 ms slot."""
+    t = np.arange(int(seconds * RATE)) / float(RATE)
+    slot = (t / SLOT).astype(int)
+    second_freq = SECOND_BASE + SECOND_STEP * (slot // 10)
+    tenth_freq = TENTH_BASE + TENTH_STEP * (slot % 10)
+    # Integrate the frequency to keep the phase continuous across slots.
+    signal = (0.4 * np.sin(2 * np.pi * np.cumsum(second_freq) / RATE) +
+              0.4 * np.sin(2 * np.pi * np.cumsum(tenth_freq) / RATE))
+    samples = (signal * 32767).astype('<i2')
+    out = wave.open(path, 'wb')
+    out.setnchannels(2)
+    out.setsampwidth(2)
+    out.setframerate(RATE)
+    out.writeframes(np.repeat(samples, 2).tobytes())
+    out.close()
+    return path
+
+
+def run_pipeline(description):
+    pipeline = Gst.parse_launch(description)
+    pipeline.set_state(Gst.State.PLAYING)
+    bus = pipeline.get_bus()
+    message = bus.timed_pop_filtered(
+        Gst.CLOCK_TIME_NONE, Gst.MessageType.EOS | Gst.MessageType.ERROR)
+    pipeline.set_state(Gst.State.NULL)
+    if message.type == Gst.MessageType.ERROR:
+        raise RuntimeError(message.parse_error()[0].message)
+
+
+def encode(wav_path, codec, tmpdir):
+    encoder = CODECS[codec]
+    if encoder is None:
+        return wav_path
+    factory = encoder.split()[0]
+    if not Gst.ElementFactory.find(factory):
+        return None
+    path = os.path.join(tmpdir, 'track.' + codec)
+    run_pipeline('filesrc location="%s" ! wavparse ! audioconvert ! %s ! '
+                 'filesink location="%s"' % (wav_path, encoder, path))
+    return path
+
+
+###############################################################################
+# Measurement
+###############################################################################
+
+def parabolic_peak(spectrum, index):
+    if 0 < index < len(spectrum) - 1:
+        a, b, c = spectrum[index - 1:index + 2]
+        denominator = a - 2 * b + c
+        if denominator:
+            return index + 0.5 * (a - c) / denominator
+    return float(index)
+
+
+class Probe(object):
+    """
+    Appsink based audio sink that reads the song position back from the
+    tones. Windows are stamped with the wall time at which they played.
+    """
+
+    def __init__(self, frequency_factor):
+        self.factor = frequency_factor
+        self.freqs = np.fft.rfftfreq(WINDOW, 1.0 / RATE)
+        self.hann = np.hanning(WINDOW)
+        self.samples = np.zeros(0, dtype=np.float32)
+        self.consumed = 0
+        self.anchors_index = []
+        self.anchors_wall = []
+        self.windows = []
+        self.lock = threading.Lock()
+
+        self.bin = Gst.parse_bin_from_description(
+            'audioconvert ! audioresample ! '
+            'audio/x-raw,format=F32LE,channels=1,rate=%d ! '
+            'appsink name=sink sync=true emit-signals=true' % RATE, True)
+        self.bin.get_by_name('sink').connect('new-sample', self.on_sample)
+
+    def band_value(self, spectrum, base, step, count):
+        low = (base - step / 2) * self.factor
+        high = (base + step * (count - 0.5)) * self.factor
+        band = np.nonzero((self.freqs >= low) & (self.freqs < high))[0]
+        index = band[np.argmax(spectrum[band])]
+        peak = parabolic_peak(spectrum, index)
+        freq = peak * RATE / WINDOW / self.factor
+        return int(round((freq - base) / step))
+
+    def decode(self, window):
+        if np.sqrt(np.mean(window ** 2)) < SILENCE:
+            return None
+        spectrum = np.abs(np.fft.rfft(window * self.hann))
+        second = self.band_value(spectrum, SECOND_BASE, SECOND_STEP, 60)
+        tenth = self.band_value(spectrum, TENTH_BASE, TENTH_STEP, 10)
+        return second + tenth * SLOT + SLOT / 2
+
+    def on_sample(self, sink):
+        sample = sink.emit('pull-sample')
+        wall = time.time()
+        buf = sample.get_buffer()
+        data = buf.extract_dup(0, buf.get_size())
+        with self.lock:
+            self.anchors_index.append(self.consumed + len(self.samples))
+            self.anchors_wall.append(wall)
+            self.samples = np.concatenate(
+                (self.samples, np.frombuffer(data, dtype=np.float32)))
+            while len(self.samples) >= WINDOW:
+                start = self.consumed
+                i = bisect.bisect_right(self.anchors_index, start) - 1
+                window_wall = (self.anchors_wall[i] +
+                               (start - self.anchors_index[i]) / float(RATE))
+                self.windows.append(
+                    (window_wall, self.decode(self.samples[:WINDOW])))
+                self.samples = self.samples[HOP:]
+                self.consumed += HOP
+        return Gst.FlowReturn.OK
+
+    def wraps(self, start, end):
+        """(overshoot, undershoot, gap) in ms for every wrap seen."""
+        results = []
+        previous = None
+        with self.lock:
+            windows = list(self.windows)
+        for wall, position in windows:
+            if position is None:
+                continue
+            if previous is not None and position < previous[1] - 3 * SLOT:
+                overshoot = (previous[1] - end) * 1000
+                undershoot = (start - position) * 1000
+                gap = max(wall - (previous[0] + HOP / float(RATE)), 0) * 1000
+                results.append((overshoot, undershoot, gap))
+            previous = (wall, position)
+        return results
+
+
+class SeamPlayer(PracticePlayer):
+    """
+    Practice player that can feed the engine the way Rhythmbox does:
+    whole seconds, once per second.
+    """
+
+    def __init__(self, uri, engine, audio_sink, rb_ticks, stop_after):
+        self.rb_ticks = rb_ticks
+        self.last_elapsed = None
+        self.stop_after = stop_after
+        super(SeamPlayer, self).__init__(uri, engine, audio_sink)
+
+    def on_poll(self):
+        if time.time() > self.stop_after:
+            # `run` removes the source once the loop is done
+            self.loop.quit()
+            return True
+        elapsed = self.position()
+        if elapsed is None:
+            return True
+        if self.rb_ticks:
+            elapsed = int(elapsed)
+            if elapsed == self.last_elapsed:
+                return True
+            self.last_elapsed = elapsed
+        self.engine.tick(elapsed)
+        return True
+
+
+def measure(path, tempo, rate, args):
+    engine = LoopEngine()
+    engine.set_boundaries(args.start, args.end)
+    engine.set_filter(tempo=tempo, rate=rate,
+                      enabled=(tempo, rate) != (100, 100))
+    probe = Probe(rate / 100.0)
+    loop_seconds = (args.end - args.start) / (tempo / 100.0) / (rate / 100.0)
+    # Play from Start: time to reach it, the wraps, and a little margin.
+    stop_after = time.time() + loop_seconds * (args.wraps + 0.5) + 2
+    player = SeamPlayer(Gst.filename_to_uri(path), engine, probe.bin,
+                        args.poll == 1000, stop_after)
+    player.POLL_INTERVAL = args.poll
+    player.playbin.set_state(Gst.State.PAUSED)
+    player.playbin.get_state(Gst.CLOCK_TIME_NONE)
+    player.playbin.seek_simple(Gst.Format.TIME,
+                               Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE,
+                               int(args.start * Gst.SECOND))
+    player.run()
+    return probe.wraps(args.start, args.end)
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    values = np.array(values)
+    return {
+        'p50': float(np.percentile(values, 50)),
+        'p90': float(np.percentile(values, 90)),
+        'p99': float(np.percentile(values, 99)),
+        'max': float(values.max()),
+    }
+
+
+def report(results, baseline):
+    header = '%-8s %-6s %-6s %5s  %-22s %-22s %-22s' % (
+        'codec', 'tempo', 'rate', 'wraps', 'overshoot ms p50/p90/max',
+        'undershoot ms p50/p90/max', 'gap ms p50/p90/max')
+    print(header)
+    print('-' * len(header))
+    for key in sorted(results):
+        cell = results[key]
+        codec, tempo, rate = key.split('/')
+        columns = []
+        for metric in ('overshoot', 'undershoot', 'gap'):
+            stats = cell[metric]
+            if not stats:
+                columns.append('%-22s' % '-')
+                continue
+            text = '%.0f/%.0f/%.0f' % (stats['p50'], stats['p90'],
+                                       stats['max'])
+            if baseline and key in baseline and baseline[key][metric]:
+                text += ' (%+.0f)' % (stats['p90'] -
+                                      baseline[key][metric]['p90'])
+            columns.append('%-22s' % text)
+        print('%-8s %-6s %-6s %5d  %s' % (codec, tempo, rate, cell['wraps'],
+                                         ' '.join(columns)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--codecs', default=','.join(sorted(CODECS)))
+    parser.add_argument('--matrix', default=None,
+                        help='tempo:rate preset pairs, e.g. x0.5:reset,x2:x1.5')
+    parser.add_argument('--start', type=int, default=5)
+    parser.add_argument('--end', type=int, default=9)
+    parser.add_argument('--wraps', type=int, default=10)
+    parser.add_argument('--poll', type=int, default=1000,
+                        help='engine tick in ms; 1000 feeds whole seconds '
+                             'like Rhythmbox')
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='show p90 deltas against a '
+                                          'previous --json file')
+    args = parser.parse_args()
+
+    Gst.init(None)
+    if args.matrix:
+        matrix = [pair.split(':') for pair in args.matrix.split(',')]
+    else:
+        matrix = DEFAULT_MATRIX
+    has_pitch = Gst.ElementFactory.find('pitch') is not None
+
+    tmpdir = tempfile.mkdtemp(prefix='looper-seam-')
+    wav = synth_timestamp_track(os.path.join(tmpdir, 'track.wav'),
+                                args.end + 20)
+
+    results = {}
+    for codec in args.codecs.split(','):
+        path = encode(wav, codec, tmpdir)
+        if path is None:
+            sys.stderr.write('skipping %s: encoder missing\n' % codec)
+            continue
+        for tempo_label, rate_label in matrix:
+            tempo = PRESET_VALUES[tempo_label]
+            rate = PRESET_VALUES[rate_label]
+            if (tempo, rate) != (100, 100) and not has_pitch:
+                sys.stderr.write('skipping %s/%s: pitch missing\n' % (
+                    tempo_label, rate_label))
+                continue
+            wraps = measure(path, tempo, rate, args)
+            results['%s/%s/%s' % (codec, tempo_label, rate_label)] = {
+                'wraps': len(wraps),
+                'overshoot': percentiles([w[0] for w in wraps]),
+                'undershoot': percentiles([w[1] for w in wraps]),
+                'gap': percentiles([w[2] for w in wraps]),
+            }
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+    report(results, baseline)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
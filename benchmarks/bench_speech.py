@@ -0,0 +1,134 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Speech filter removal and cost.
+
+Mixes a centered voice (a tone with harmonics), a centered bass and a
+guitar panned left, runs the mix through `CenterRemover` in player sized
+buffers, and reports how much each part is attenuated per channel, then
+the time a buffer costs and the load (the filter gives up over 50%):
+
+    python benchmarks/bench_speech.py --json before.json
+    python benchmarks/bench_speech.py --compare before.json
+
+No display needed.
+"""
+
+import os
+import sys
+import json
+import timeit
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from looper_speech import CenterRemover
+
+
+RATE = 44100
+SECONDS = 4
+
+# Part: (frequency, harmonics, left gain, right gain).
+PARTS = {
+    'voice': (440.0, 4, 1.0, 1.0),
+    'bass': (55.0, 2, 1.0, 1.0),
+    'guitar': (330.0, 3, 1.0, 0.3),
+}
+
+
+def render(freq, harmonics):
+    t = np.arange(RATE * SECONDS) / float(RATE)
+    return sum(0.2 / k * np.sin(2 * np.pi * k * freq * t)
+               for k in range(1, harmonics + 1))
+
+
+def mix():
+    left = sum(render(f, h) * l for f, h, l, r in PARTS.values())
+    right = sum(render(f, h) * r for f, h, l, r in PARTS.values())
+    return np.stack((left, right), axis=1).astype(np.float32)
+
+
+def run(samples, buffer_size):
+    remover = CenterRemover(RATE)
+    output = np.concatenate([remover.process(samples[i:i + buffer_size])
+                             for i in range(0, len(samples), buffer_size)])
+    return output[remover.size:], samples[:len(output) - remover.size]
+
+
+def level(samples, freq):
+    """Amplitude at `freq`, from the steady middle of `samples`."""
+    middle = samples[RATE:-RATE]
+    spectrum = np.abs(np.fft.rfft(middle * np.hanning(len(middle))))
+    return spectrum[int(round(freq * len(middle) / float(RATE)))]
+
+
+def measure_removal(buffer_size):
+    output, dry = run(mix(), buffer_size)
+    results = {}
+    for name, (freq, harmonics, l, r) in PARTS.items():
+        for channel, side in enumerate(('left', 'right')):
+            results['%s_%s_db' % (name, side)] = 20 * np.log10(
+                level(output[:, channel], freq) /
+                level(dry[:, channel], freq))
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[1])
+    parser.add_argument('--buffer', type=int, default=1024,
+                        help='samples per buffer')
+    parser.add_argument('--number', type=int, default=200)
+    parser.add_argument('--json', help='write results to this file')
+    parser.add_argument('--compare', help='show deltas against a previous '
+                                          '--json file')
+    args = parser.parse_args()
+
+    results = measure_removal(args.buffer)
+    remover = CenterRemover(RATE)
+    block = mix()[:args.buffer]
+    seconds = min(timeit.repeat(lambda: remover.process(block),
+                                number=args.number, repeat=5))
+    results['buffer_us'] = seconds / args.number * 1e6
+    results['cpu_percent'] = (results['buffer_us'] / 1e6 * RATE /
+                              float(args.buffer) * 100)
+    results['latency_ms'] = remover.size * 1000.0 / RATE
+
+    baseline = None
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+
+    units = {'db': 'dB', 'us': 'us', 'percent': '%', 'ms': 'ms'}
+    for name in sorted(results):
+        label, unit = name.rsplit('_', 1)
+        before = baseline and baseline.get(name)
+        print('%-14s %9.2f %s%s' % (label, results[name], units[unit],
+                                    '' if before is None else
+                                    ' (%+.2f)' % (results[name] - before)))
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(results, f, indent=2, sort_keys=True)
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,626 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Stand-in for the parts of Rhythmbox that Looper talks to.
+
+`RB.Shell`, the shell player, `player.add_filter`/`remove_filter`,
+RhythmDB entries and GSettings are replaced by local objects driven by a
+real GStreamer playbin playing synthetic audio. GTK still needs a display,
+so run it under Xvfb:
+
+    xvfb-run python benchmarks/rbmock.py
+
+The environment (HOME, XDG dirs, GSettings) is redirected to a temporary
+directory so nothing of the user's setup is read or written.
+"""
+
+import os
+import sys
+import math
+import time
+import wave
+import types
+import gettext
+import shutil
+import struct
+import tempfile
+import subprocess
+
+import gi
+gi.require_version('Gtk', '3.0')
+gi.require_version('Gst', '1.0')
+import gi.repository
+from gi.repository import Gio, GLib, GObject, Gst
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+# Looper's schema and the parts of Rhythmbox's schemas it uses.
+SCHEMA_DIRS = (os.path.join(ROOT, 'schema'),
+               os.path.join(ROOT, 'benchmarks', 'schema'))
+
+RATE = 44100
+
+
+def synth_track(path, seconds, freq=440.0, rate=RATE):
+    """Write a stereo 16 bit WAV file with a sine tone."""
+    out = wave.open(path, 'wb')
+    out.setnchannels(2)
+    out.setsampwidth(2)
+    out.setframerate(rate)
+    step = 2 * math.pi * freq / rate
+    frames = bytearray()
+    for i in range(int(seconds * rate)):
+        sample = int(16000 * math.sin(step * i))
+        frames += struct.pack('<hh', sample, sample)
+    out.writeframes(bytes(frames))
+    out.close()
+    return path
+
+
+###############################################################################
+# RB
+###############################################################################
+
+class ShellUILocation(object):
+    MAIN_TOP, MAIN_BOTTOM, SIDEBAR, RIGHT_SIDEBAR = range(4)
+
+
+class RhythmDBPropType(object):
+    (LOCATION, TITLE, ARTIST, ALBUM, DURATION, MTIME, FILE_SIZE,
+     MEDIA_TYPE) = range(8)
+
+
+MEDIA_TYPES = {
+    '.wav': 'audio/x-wav',
+    '.mp3': 'audio/mpeg',
+    '.ogg': 'audio/x-vorbis',
+    '.flac': 'audio/x-flac',
+}
+
+
+class RhythmDBEntry(GObject.Object):
+    def __init__(self, location, title, artist, duration):
+        super(RhythmDBEntry, self).__init__()
+        self._strings = {
+            RhythmDBPropType.LOCATION: location,
+            RhythmDBPropType.TITLE: title,
+            RhythmDBPropType.ARTIST: artist,
+            RhythmDBPropType.ALBUM: '',
+            RhythmDBPropType.MEDIA_TYPE: MEDIA_TYPES.get(
+                os.path.splitext(location)[1], 'application/octet-stream'),
+        }
+        self._ulongs = {RhythmDBPropType.DURATION: int(duration)}
+
+    def get_string(self, prop):
+        return self._strings.get(prop, '')
+
+    def get_ulong(self, prop):
+        return self._ulongs.get(prop, 0)
+
+    def get_playback_uri(self):
+        return self._strings[RhythmDBPropType.LOCATION]
+
+
+class RhythmDB(GObject.Object):
+    def __init__(self):
+        super(RhythmDB, self).__init__()
+        self.entries = []
+
+    def add(self, entry):
+        self.entries.append(entry)
+        return entry
+
+    def entry_foreach(self, func, *data):
+        for entry in list(self.entries):
+            func(entry, *data)
+
+    def entry_lookup_by_location(self, location):
+        for entry in self.entries:
+            if entry.get_playback_uri() == location:
+                return entry
+        return None
+
+
+class Player(GObject.Object):
+    """
+    RBPlayer stand-in. Filters live in a bin set as the playbin's
+    `audio-filter` and are relinked from an idle pad probe, like the
+    Rhythmbox player does.
+    """
+
+    def __init__(self, audio_sink=None):
+        super(Player, self).__init__()
+        self.playbin = Gst.ElementFactory.make('playbin', None)
+        if audio_sink is None:
+            audio_sink = Gst.ElementFactory.make('fakesink', None)
+            audio_sink.set_property('sync', True)
+        self.playbin.set_property('audio-sink', audio_sink)
+
+        self.filterbin = Gst.Bin.new('looper-mock-filters')
+        self.head = Gst.ElementFactory.make('audioconvert', None)
+        self.tail = Gst.ElementFactory.make('audioconvert', None)
+        self.filterbin.add(self.head)
+        self.filterbin.add(self.tail)
+        self.head.link(self.tail)
+        self.filterbin.add_pad(Gst.GhostPad.new(
+            'sink', self.head.get_static_pad('sink')))
+        self.filterbin.add_pad(Gst.GhostPad.new(
+            'src', self.tail.get_static_pad('src')))
+        self.playbin.set_property('audio-filter', self.filterbin)
+
+        self.filters = []
+        self._wrappers = {}
+        self._linked = [self.head, self.tail]
+
+    def open(self, uri):
+        self.playbin.set_state(Gst.State.READY)
+        self.playbin.set_property('uri', uri)
+        self.playbin.set_state(Gst.State.PLAYING)
+
+    def close(self):
+        self.playbin.set_state(Gst.State.NULL)
+
+    def position(self):
+        ok, position = self.playbin.query_position(Gst.Format.TIME)
+        if not ok:
+            return None
+        return position / Gst.SECOND
+
+    def seek(self, offset):
+        position = self.position()
+        if position is None:
+            return False
+        target = max(position + offset, 0)
+        return self.playbin.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH,
+                                        int(target * Gst.SECOND))
+
+    def add_filter(self, element):
+        if element in self.filters:
+            return False
+        self.filters.append(element)
+        self._relink()
+        return True
+
+    def remove_filter(self, element):
+        if element not in self.filters:
+            return False
+        self.filters.remove(element)
+        self._relink()
+        return True
+
+    def _wrap(self, element):
+        wrapper = Gst.Bin.new(None)
+        convert_in = Gst.ElementFactory.make('audioconvert', None)
+        convert_out = Gst.ElementFactory.make('audioconvert', None)
+        for child in (convert_in, element, convert_out):
+            wrapper.add(child)
+        convert_in.link(element)
+        element.link(convert_out)
+        wrapper.add_pad(Gst.GhostPad.new(
+            'sink', convert_in.get_static_pad('sink')))
+        wrapper.add_pad(Gst.GhostPad.new(
+            'src', convert_out.get_static_pad('src')))
+        return wrapper
+
+    def _relink(self):
+        pad = self.head.get_static_pad('src')
+        pad.add_probe(Gst.PadProbeType.IDLE, self._on_idle)
+
+    def _on_idle(self, pad, info):
+        for upstream, downstream in zip(self._linked, self._linked[1:]):
+            upstream.unlink(downstream)
+
+        for element in list(self._wrappers):
+            if element not in self.filters:
+                wrapper = self._wrappers.pop(element)
+                wrapper.set_state(Gst.State.NULL)
+                self.filterbin.remove(wrapper)
+                wrapper.remove(element)
+
+        chain = [self.head]
+        for element in self.filters:
+            if element not in self._wrappers:
+                wrapper = self._wrap(element)
+                self._wrappers[element] = wrapper
+                self.filterbin.add(wrapper)
+                wrapper.sync_state_with_parent()
+            chain.append(self._wrappers[element])
+        chain.append(self.tail)
+
+        for upstream, downstream in zip(chain, chain[1:]):
+            upstream.link(downstream)
+        self._linked = chain
+        return Gst.PadProbeReturn.REMOVE
+
+
+class ShellPlayer(GObject.Object):
+    """
+    Emits `elapsed-changed` once per second of playback and
+    `playing-song-changed` when a new entry is played.
+    """
+
+    __gsignals__ = {
+        'playing-song-changed': (GObject.SIGNAL_RUN_LAST, None,
+                                 (GObject.Object,)),
+        'elapsed-changed': (GObject.SIGNAL_RUN_LAST, None,
+                            (GObject.TYPE_UINT,)),
+    }
+
+    player = GObject.property(type=GObject.Object)
+
+    # How often (ms) the playbin position is polled.
+    TICK_INTERVAL = 100
+
+    def __init__(self, audio_sink=None):
+        super(ShellPlayer, self).__init__()
+        self.props.player = Player(audio_sink)
+        self._entry = None
+        self._elapsed = -1
+        self._tick_id = None
+
+    def play_entry(self, entry):
+        self._entry = entry
+        self._elapsed = -1
+        self.props.player.open(entry.get_playback_uri())
+        if self._tick_id is None:
+            self._tick_id = GLib.timeout_add(self.TICK_INTERVAL, self._on_tick)
+        self.emit('playing-song-changed', entry)
+
+    def stop(self):
+        if self._tick_id is not None:
+            GLib.source_remove(self._tick_id)
+            self._tick_id = None
+        self.props.player.close()
+        self._entry = None
+        self.emit('playing-song-changed', None)
+
+    def get_playing_entry(self):
+        return self._entry
+
+    def get_playing_song_duration(self):
+        if self._entry is None:
+            return -1
+        return self._entry.get_ulong(RhythmDBPropType.DURATION)
+
+    def get_playing_time(self):
+        position = self.props.player.position()
+        return (position is not None, int(position or 0))
+
+    def seek(self, offset):
+        if not self.props.player.seek(offset):
+            raise GLib.Error('Seek failed')
+
+    def _on_tick(self):
+        position = self.props.player.position()
+        if position is not None and int(position) != self._elapsed:
+            self._elapsed = int(position)
+            self.emit('elapsed-changed', self._elapsed)
+        return True
+
+
+class Shell(GObject.Object):
+    shell_player = GObject.property(type=GObject.Object)
+    db = GObject.property(type=GObject.Object)
+    window = GObject.property(type=GObject.Object)
+    prefs = GObject.property(type=GObject.Object)
+    application = GObject.property(type=GObject.Object)
+
+    def __init__(self, application, audio_sink=None):
+        from gi.repository import Gtk
+        super(Shell, self).__init__()
+        self.props.application = application
+        self.props.shell_player = ShellPlayer(audio_sink)
+        self.props.db = RhythmDB()
+
+        # Main window with a toolbar holding the position slider, found by
+        # Looper through the widget names.
+        window = Gtk.Window()
+        self.box = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        toolbar = Gtk.Box()
+        toolbar.set_name('ToolBar')
+        toolbar.pack_start(Gtk.Scale(orientation=Gtk.Orientation.HORIZONTAL),
+                           True, True, 0)
+        self.box.pack_start(toolbar, False, False, 0)
+        window.add(self.box)
+        self.props.window = window
+
+        # Looper keeps away from the preferences dialog, the crossfade
+        # preference comes from the player settings.
+        self.props.prefs = None
+
+        self.widgets = {}
+
+    def add_widget(self, widget, location, expand, fill):
+        self.widgets[widget] = location
+        self.box.pack_start(widget, expand, fill, 0)
+
+    def remove_widget(self, widget, location):
+        if widget in self.widgets:
+            del self.widgets[widget]
+            self.box.remove(widget)
+
+
+def make_application():
+    from gi.repository import Gtk
+
+    class Application(Gtk.Application):
+        """RB.Application stand-in keeping plugin menu items."""
+
+        def __init__(self):
+            super(Application, self).__init__(
+                application_id='org.gnome.RhythmboxLooperMock',
+                flags=Gio.ApplicationFlags.NON_UNIQUE)
+            self.plugin_menu_items = {}
+
+        def add_plugin_menu_item(self, menu, item_id, item):
+            self.plugin_menu_items[(menu, item_id)] = item
+
+        def remove_plugin_menu_item(self, menu, item_id):
+            self.plugin_menu_items.pop((menu, item_id), None)
+
+    app = Application()
+    app.register(None)
+    app.set_default()
+    return app
+
+
+###############################################################################
+# GSettings
+###############################################################################
+
+class Settings(GObject.Object):
+    """
+    Dict backed GSettings stand-in, used when the schema cannot be compiled.
+    """
+
+    __gsignals__ = {
+        'changed': (GObject.SIGNAL_RUN_LAST | GObject.SIGNAL_DETAILED, None,
+                    (str,)),
+    }
+
+    _stores = {}
+
+    def __init__(self, schema_id):
+        super(Settings, self).__init__()
+        if schema_id not in self._stores:
+            self._stores[schema_id] = schema_defaults(schema_id)
+        self._values = self._stores[schema_id]
+
+    def __getitem__(self, key):
+        return self._values[key]
+
+    def __setitem__(self, key, value):
+        self._values[key] = value
+        self.emit('changed::' + key, key)
+
+    def get_value(self, key):
+        return self._values[key]
+
+
+def schema_files():
+    for directory in SCHEMA_DIRS:
+        for name in sorted(os.listdir(directory)):
+            if name.endswith('.gschema.xml'):
+                yield os.path.join(directory, name)
+
+
+def schema_defaults(schema_id):
+    """Default values of a schema in the schema directory."""
+    import xml.etree.ElementTree as ET
+    values = {}
+    for path in schema_files():
+        root = ET.parse(path).getroot()
+        for schema in root.findall('schema'):
+            if schema.get('id') != schema_id:
+                continue
+            for key in schema.findall('key'):
+                variant = GLib.Variant.parse(GLib.VariantType(key.get('type')),
+                                             key.find('default').text,
+                                             None, None)
+                values[key.get('name')] = variant.unpack()
+    return values
+
+
+def install_settings(schema_dir):
+    """
+    Use real GSettings with the memory backend when the schema compiler is
+    available, otherwise replace Gio.Settings with the dict stand-in.
+    """
+    for path in schema_files():
+        shutil.copy(path, schema_dir)
+    try:
+        subprocess.check_call(['glib-compile-schemas', schema_dir])
+    except (OSError, subprocess.CalledProcessError):
+        Gio.Settings = Settings
+        return False
+    os.environ['GSETTINGS_SCHEMA_DIR'] = schema_dir
+    os.environ['GSETTINGS_BACKEND'] = 'memory'
+    return True
+
+
+###############################################################################
+# Install
+###############################################################################
+
+def install_modules():
+    """Register the RB, Peas, PeasGtk and rb modules for Looper's imports."""
+    rb_module = types.ModuleType('gi.repository.RB')
+    rb_module.Shell = Shell
+    rb_module.ShellPlayer = ShellPlayer
+    rb_module.ShellUILocation = ShellUILocation
+    rb_module.RhythmDB = RhythmDB
+    rb_module.RhythmDBEntry = RhythmDBEntry
+    rb_module.RhythmDBPropType = RhythmDBPropType
+
+    peas = types.ModuleType('gi.repository.Peas')
+    peas.Activatable = type('Activatable', (object,), {})
+
+    peasgtk = types.ModuleType('gi.repository.PeasGtk')
+    peasgtk.Configurable = type('Configurable', (object,), {})
+
+    for name, module in (('RB', rb_module), ('Peas', peas),
+                         ('PeasGtk', peasgtk)):
+        sys.modules['gi.repository.' + name] = module
+        setattr(gi.repository, name, module)
+
+    rb = types.ModuleType('rb')
+    rb.find_plugin_file = lambda plugin, filename: os.path.join(ROOT, filename)
+    sys.modules['rb'] = rb
+
+    # Rhythmbox installs `_` for its Python plugins.
+    gettext.install('rhythmbox')
+
+
+_installed = None
+
+
+def install():
+    """
+    Prepare the process to import Looper. Returns the temporary directory
+    used as HOME. Safe to call more than once.
+    """
+    global _installed
+    if _installed:
+        return _installed
+
+    tmpdir = tempfile.mkdtemp(prefix='looper-mock-')
+    os.environ['HOME'] = tmpdir
+    for var, name in (('XDG_CACHE_HOME', '.cache'),
+                      ('XDG_CONFIG_HOME', '.config'),
+                      ('XDG_DATA_HOME', '.local/share')):
+        os.environ[var] = os.path.join(tmpdir, name)
+        os.makedirs(os.environ[var])
+    schema_dir = os.path.join(tmpdir, 'schemas')
+    os.makedirs(schema_dir)
+    install_settings(schema_dir)
+
+    Gst.init(None)
+    from gi.repository import Gtk
+    if not Gtk.init_check(None)[0]:
+        raise RuntimeError('No display available, run under xvfb-run')
+
+    install_modules()
+    _installed = tmpdir
+    return tmpdir
+
+
+###############################################################################
+# Harness
+###############################################################################
+
+class Harness(object):
+    """
+    A shell with a library of synthetic tracks and the Looper plugin.
+
+        harness = Harness()
+        entry = harness.add_track('Song', seconds=30)
+        harness.activate()
+        harness.play(entry)
+        harness.set_looper_active(True)
+        harness.run(5)
+        harness.deactivate()
+        harness.close()
+    """
+
+    def __init__(self, audio_sink=None):
+        self.tmpdir = install()
+        self.app = make_application()
+        self.shell = Shell(self.app, audio_sink)
+        self.shell_player = self.shell.props.shell_player
+        self.db = self.shell.props.db
+        self.plugin = None
+
+    def add_track(self, title, artist='Looper', seconds=30, freq=440.0,
+                  path=None):
+        """Synthesize a track (unless `path` is given) and add it to the db."""
+        if path is None:
+            path = os.path.join(self.tmpdir, '%s-%s.wav' % (artist, title))
+            synth_track(path, seconds, freq)
+        entry = RhythmDBEntry(Gst.filename_to_uri(path), title, artist,
+                              seconds)
+        return self.db.add(entry)
+
+    def activate(self):
+        import looper
+        self.plugin = looper.LooperPlugin()
+        self.plugin.object = self.shell
+        self.plugin.do_activate()
+        return self.plugin
+
+    def deactivate(self):
+        self.plugin.do_deactivate()
+        self.plugin = None
+
+    def set_looper_active(self, active):
+        action = self.plugin.actions.get_action('ActivateLooper')
+        if action.get_active() != active:
+            action.set_active(active)
+
+    def play(self, entry):
+        self.shell_player.play_entry(entry)
+
+    def stop(self):
+        self.shell_player.stop()
+
+    def run(self, seconds):
+        """Run the main loop for `seconds`."""
+        loop = GLib.MainLoop()
+        GLib.timeout_add(int(seconds * 1000), loop.quit)
+        loop.run()
+
+    def iterate(self):
+        """Dispatch everything pending without blocking."""
+        context = GLib.MainContext.default()
+        while context.pending():
+            context.iteration(False)
+
+    def close(self):
+        if self.plugin is not None:
+            self.deactivate()
+        self.shell_player.props.player.close()
+        self.shell.props.window.destroy()
+
+
+def main():
+    harness = Harness()
+    first = harness.add_track('First', seconds=20, freq=440)
+    second = harness.add_track('Second', seconds=20, freq=330)
+    plugin = harness.activate()
+    harness.play(first)
+    harness.set_looper_active(True)
+    plugin.controls.start_slider.set_value(2)
+    plugin.controls.end_slider.set_value(6)
+
+    started = time.time()
+    harness.run(10)
+    elapsed = harness.shell_player.get_playing_time()[1]
+    print('After %.1fs of playback position is %ss (loop 2-6s)' % (
+        time.time() - started, elapsed))
+
+    harness.play(second)
+    harness.run(1)
+    print('Song changed to %s' % plugin.song_title)
+    harness.close()
+    return 0 if 2 <= elapsed <= 6 else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,206 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Long session soak test.
+
+`loop` mode keeps a short loop running with the pitch filter on and reports,
+every `--report-every` iterations, where the wraps land relative to Start
+(drift), the RSS, the number of Python objects and the number of live
+GObject signal handlers.
+
+`lifecycle` mode cycles activation, song changes, saved loops and
+deactivation, and reports the same counters per cycle. Anything that grows
+steadily is a leak.
+
+    xvfb-run python benchmarks/soak.py loop --iterations 20000
+    xvfb-run python benchmarks/soak.py lifecycle --cycles 500
+"""
+
+import os
+import gc
+import sys
+import time
+import weakref
+import argparse
+import resource
+
+from rbmock import Harness
+from gi.repository import GObject
+
+
+class HandlerCounter(object):
+    """
+    Counts signal handlers that are still connected on live objects, by
+    recording every `connect` made through PyGObject.
+    """
+
+    def __init__(self):
+        self.handlers = []
+        self._connect = GObject.Object.connect
+
+    def install(self):
+        counter = self
+
+        def connect(obj, *args, **kwargs):
+            handler_id = counter._connect(obj, *args, **kwargs)
+            counter.handlers.append((weakref.ref(obj), handler_id))
+            return handler_id
+        GObject.Object.connect = connect
+
+    def live(self):
+        alive = []
+        for ref, handler_id in self.handlers:
+            obj = ref()
+            if (obj is not None and
+                    GObject.signal_handler_is_connected(obj, handler_id)):
+                alive.append((ref, handler_id))
+        self.handlers = alive
+        return len(alive)
+
+
+def rss_kb():
+    try:
+        with open('/proc/self/statm') as f:
+            pages = int(f.read().split()[1])
+        return pages * os.sysconf('SC_PAGE_SIZE') // 1024
+    except (IOError, OSError):
+        # Peak instead of current, but still shows growth.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def count_instances(name):
+    return sum(1 for obj in gc.get_objects()
+               if type(obj).__name__ == name)
+
+
+def counters(handlers):
+    gc.collect()
+    return {
+        'rss_kb': rss_kb(),
+        'objects': len(gc.get_objects()),
+        'handlers': handlers.live(),
+        'loop_controls': count_instances('LoopControl'),
+    }
+
+
+def print_row(label, values, extra=''):
+    print('%-10s rss %8d kB  objects %8d  handlers %6d  LoopControls %4d %s'
+          % (label, values['rss_kb'], values['objects'], values['handlers'],
+             values['loop_controls'], extra))
+    sys.stdout.flush()
+
+
+def soak_loop(harness, handlers, args):
+    entry = harness.add_track('Soak', seconds=args.end + 10)
+    plugin = harness.activate()
+    harness.play(entry)
+    harness.set_looper_active(True)
+    plugin.controls.start_slider.set_value(args.start)
+    plugin.controls.end_slider.set_value(args.end)
+    if plugin.rbpitch.gst_pitch:
+        plugin.controls.rbpitch_btn.set_active(True)
+        plugin.rbpitch.tempo.slider.set_value(args.tempo)
+    else:
+        sys.stderr.write('pitch missing, soaking without the filter\n')
+
+    state = {'iterations': 0, 'landed': [], 'wrapped': False}
+    engine_seek = plugin.engine.seek
+
+    def seek(seek_time):
+        if seek_time < 0:
+            state['iterations'] += 1
+            state['wrapped'] = True
+        engine_seek(seek_time)
+    plugin.engine.seek = seek
+
+    def on_elapsed(player, elapsed):
+        if state['wrapped']:
+            state['wrapped'] = False
+            position = harness.shell_player.props.player.position()
+            start = plugin.engine.boundaries()[0]
+            if position is not None:
+                state['landed'].append(position - start)
+    harness.shell_player.connect('elapsed-changed', on_elapsed)
+
+    print_row('start', counters(handlers))
+    started = time.time()
+    reported = 0
+    while state['iterations'] < args.iterations:
+        harness.run(1)
+        if state['iterations'] - reported >= args.report_every:
+            reported = state['iterations']
+            landed = state['landed'] or [0]
+            drift = sum(landed) / len(landed)
+            state['landed'] = []
+            print_row('%d' % reported, counters(handlers),
+                      'drift %+.3fs  elapsed %ds' % (
+                          drift, time.time() - started))
+    harness.deactivate()
+    print_row('end', counters(handlers))
+
+
+def soak_lifecycle(harness, handlers, args):
+    first = harness.add_track('First', seconds=20)
+    second = harness.add_track('Second', seconds=20, freq=330)
+    print_row('start', counters(handlers))
+    for cycle in range(1, args.cycles + 1):
+        plugin = harness.activate()
+        harness.play(first)
+        harness.set_looper_active(True)
+        plugin.on_save_loop(None)
+        harness.play(second)
+        harness.iterate()
+        harness.play(first)
+        harness.iterate()
+        harness.set_looper_active(False)
+        harness.deactivate()
+        harness.stop()
+        harness.iterate()
+        if cycle % args.report_every == 0:
+            print_row('%d' % cycle, counters(handlers))
+    print_row('end', counters(handlers))
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Looper soak test.')
+    sub = parser.add_subparsers(dest='mode')
+    loop = sub.add_parser('loop')
+    loop.add_argument('--iterations', type=int, default=20000)
+    loop.add_argument('--report-every', type=int, default=500)
+    loop.add_argument('--start', type=int, default=2)
+    loop.add_argument('--end', type=int, default=4)
+    loop.add_argument('--tempo', type=int, default=150)
+    lifecycle = sub.add_parser('lifecycle')
+    lifecycle.add_argument('--cycles', type=int, default=500)
+    lifecycle.add_argument('--report-every', type=int, default=50)
+    args = parser.parse_args()
+
+    handlers = HandlerCounter()
+    handlers.install()
+    harness = Harness()
+    if args.mode == 'lifecycle':
+        soak_lifecycle(harness, handlers, args)
+    else:
+        soak_loop(harness, handlers, args)
+    harness.close()
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
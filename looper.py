@@ -20,9 +20,11 @@
 import os
 import sys
 import json
-import math
 import shutil
+import math
 import hashlib
+import functools
+import threading
 from string import Template
 
 from gi.repository import Gio, Gtk, GObject, RB, Peas, GLib, Gdk, Gst
@@ -32,18 +34,56 @@ from looper_rb3compat import ActionGroup
 from looper_rb3compat import ApplicationShell
 from looper_rb3compat import is_rb3
 
-from tuner import Tuner
 from LooperConfigureDialog import LooperConfigureDialog
+from looper_cache import AnalysisCache, Store, song_key
+from looper_engine import LoopEngine
+from looper_engine import MIN_RANGE
+from looper_engine import PRESETS
+from looper_engine import seconds_to_time
+from looper_isolation import IsolationFilter
+from looper_isolation import PRESETS as ISOLATION_PRESETS
+from looper_midi import write_midi_file
+from looper_tasks import Executor
+from looper_telemetry import Telemetry
+from looper_profiler import FilterProfiler
+from looper_watchdog import Watchdog
+from looper_watchdog import watched
+from looper_timeline import Timeline
+from looper_widgets import WidgetLocator
+from looper_widgets import find
 
 
-# Minimal allowed range in seconds.
-# (1 second is too small for meaningful sound)
-MIN_RANGE = 2
-
 ON_LABEL = 'Enabled'
 
 OFF_LABEL = 'Disabled'
 
+# Parts of the loop to play, see `looper_analysis.separate`: (name, label).
+SEPARATIONS = (
+    ('off', 'Full mix'),
+    ('harmonic', 'No drums'),
+    ('percussive', 'Drums only'),
+)
+
+# Latest version of each file written by `save_file`.
+_saved = {}
+_saved_lock = threading.Lock()
+
+
+def save_file(path, data, version):
+    """
+    Write `data` to the file at `path` through a temporary file, so it's
+    never left half written, unless a later `version` of it was written
+    meanwhile (by another thread).
+    """
+    with _saved_lock:
+        if _saved.get(path, -1) > version:
+            return
+        temporary = path + '.tmp'
+        with open(temporary, 'w') as f:
+            f.write(data)
+        os.rename(temporary, path)
+        _saved[path] = version
+
 
 def create_slider(*args):
     if not args:
@@ -55,17 +95,14 @@ def create_slider(*args):
     return slider
 
 
-def seconds_to_time(seconds):
-    """Converts seconds to time format (MM:SS)."""
-    m, s = divmod(int(seconds), 60)
-    return "%02d:%02d" % (m, s)
-
-
 class LoopControl(Gtk.Grid):
-    def __init__(self, looper, index, name, start_slider_value, end_slider_value):
+    def __init__(self, looper, index, name, start_slider_value, end_slider_value,
+                 isolation=None):
         super(LoopControl, self).__init__()
         self.index = index
         self.name = name
+        # Isolation preset played with the loop, see `IsolationFilter`.
+        self.isolation = isolation
         self.looper = looper
         self.start_slider_value = start_slider_value
         self.end_slider_value = end_slider_value
@@ -83,8 +120,10 @@ class LoopControl(Gtk.Grid):
         self.activation_btn_menu = Gtk.Menu()
         self.rename_item = Gtk.MenuItem('Rename')
         self.delete_item = Gtk.MenuItem('Delete')
+        self.isolation_item = Gtk.MenuItem('Save isolation')
         self.activation_btn_menu.append(self.rename_item)
         self.activation_btn_menu.append(self.delete_item)
+        self.activation_btn_menu.append(self.isolation_item)
         self.activation_btn_menu.show_all()
 
         self.start_slider = self.create_slider(self.start_slider_value,
@@ -121,6 +160,8 @@ class LoopControl(Gtk.Grid):
         self.rename_done_sigid = self.loop_name.connect('activate', self.on_rename_done)
         self.show_rename_sigid = self.rename_item.connect("activate", self.on_show_rename)
         self.delete_sigid = self.delete_item.connect("activate", self.on_delete)
+        self.isolation_sigid = self.isolation_item.connect(
+            'activate', self.on_keep_isolation)
         self.activation_btn_sigid = self.activation_btn.connect(
             'button-press-event', self.on_activation, self.activation_btn_menu)
         self.start_slider_moved_sigid = self.start_slider.connect(
@@ -128,6 +169,7 @@ class LoopControl(Gtk.Grid):
         self.end_slider_moved_sigid = self.end_slider.connect(
             'value-changed', self.on_slider_moved, 'end')
 
+    @watched
     def on_activation(self, button, event, menu):
         is_success, button = event.get_button()
         if is_success:
@@ -139,29 +181,14 @@ class LoopControl(Gtk.Grid):
                 self.set_loop()
         return True
 
+    @watched
     def on_slider_moved(self, button, value, moving_slider):
         """Dont let Start slider be greater than End or vice versa."""
-        start_value = self.start_slider.get_value()
-        end_value = self.end_slider.get_value()
-        min_range = self.looper.controls.min_range.get_value_as_int()
-        if moving_slider == 'start':
-            slider_start_max = end_value - min_range
-            if start_value > slider_start_max:
-                if self.looper.duration and end_value >= self.looper.duration:
-                    new_value = end_value - min_range
-                    self.start_slider.set_value(new_value)
-                else:
-                    new_value = start_value + min_range
-                    self.end_slider.set_value(new_value)
-        else:
-            slider_end_min = start_value + min_range
-            if end_value < slider_end_min:
-                if start_value == 0.0:
-                    new_value = start_value + min_range
-                    self.end_slider.set_value(new_value)
-                else:
-                    new_value = end_value - min_range
-                    self.start_slider.set_value(new_value)
+        start_value, end_value = self.looper.engine.clamp(
+            self.start_slider.get_value(), self.end_slider.get_value(),
+            moving_slider)
+        self.start_slider.set_value(start_value)
+        self.end_slider.set_value(end_value)
         self.refresh_slider_label()
         self.update_loop()
         self.looper.save_loops()
@@ -173,6 +200,8 @@ class LoopControl(Gtk.Grid):
             loop['start'] = self.start_slider.get_value()
             loop['end'] = self.end_slider.get_value()
             loop['name'] = self.name
+            if self.isolation is not None:
+                loop['isolation'] = self.isolation
 
     def refresh_slider_label(self):
         start_slider_label = seconds_to_time(self.start_slider.get_value())
@@ -184,6 +213,15 @@ class LoopControl(Gtk.Grid):
     def set_loop(self):
         self.looper.controls.start_slider.set_value(self.start_slider.get_value())
         self.looper.controls.end_slider.set_value(self.end_slider.get_value())
+        if self.isolation is not None:
+            self.looper.controls.set_isolation(self.isolation)
+
+    @watched
+    def on_keep_isolation(self, widget):
+        """Play the loop with the isolation preset playing now."""
+        self.isolation = self.looper.controls.isolation_combo.get_active_id()
+        self.update_loop()
+        self.looper.save_loops()
 
     def on_show_rename(self, widget):
         self.stack.set_visible_child_name('loop_name')
@@ -191,6 +229,7 @@ class LoopControl(Gtk.Grid):
         self.rename_canceled_sigid = self.loop_name.connect(
             'focus-out-event', self.on_rename_canceled)
 
+    @watched
     def on_rename_done(self, widget):
         name = widget.get_text()
         self.activation_btn.set_label(name)
@@ -211,6 +250,7 @@ class LoopControl(Gtk.Grid):
             self.loop_name.disconnect(self.rename_canceled_sigid)
         self.rename_canceled_sigid = None
 
+    @watched
     def on_delete(self, widget):
         song_id = self.looper.get_song_id()
         if song_id in self.looper.loops:
@@ -220,12 +260,16 @@ class LoopControl(Gtk.Grid):
         self.looper.save_loops()
 
     def destroy_widgets(self):
+        # The menu has no parent, so it is not destroyed with the grid.
+        self.activation_btn_menu.destroy()
+        self.destroy()
         del self.loop_name
         del self.stack
         del self.activation_btn
         del self.activation_btn_menu
         del self.rename_item
         del self.delete_item
+        del self.isolation_item
         del self.start_slider
         del self.end_slider
 
@@ -233,6 +277,7 @@ class LoopControl(Gtk.Grid):
         self.loop_name.disconnect(self.rename_done_sigid)
         self.rename_item.disconnect(self.show_rename_sigid)
         self.delete_item.disconnect(self.delete_sigid)
+        self.isolation_item.disconnect(self.isolation_sigid)
         self.activation_btn.disconnect(self.activation_btn_sigid)
         self.start_slider.disconnect(self.start_slider_moved_sigid)
         self.end_slider.disconnect(self.end_slider_moved_sigid)
@@ -251,27 +296,24 @@ class RbPitchElem(Gtk.Box):
         self.label = Gtk.Label('%s (%%): ' % label)
         self.pack_start(self.label, False, False, 0)
         self.pack_start(self.slider, True, True, 0)
+        self.preset_sigids = []
         if presets and on_preset_clicked_callback:
             for label, value in presets:
                 button = Gtk.Button(label)
                 button.value = value
-                button.connect('clicked', on_preset_clicked_callback)
+                sigid = button.connect('clicked', on_preset_clicked_callback)
+                self.preset_sigids.append((button, sigid))
                 self.pack_start(button, False, False, 2)
 
+    def destroy_widgets(self):
+        for button, sigid in self.preset_sigids:
+            button.disconnect(sigid)
+        del self.preset_sigids
+
 
 class RbPitch(Gtk.Box):
     DEFAULT_ADJUSTMENT = (100, 10, 1000, 1, 1, 0)
-    TEMPO_PRESETS = [
-        ('x0.5', 50),
-        ('x0.6', 60),
-        ('x0.7', 70),
-        ('x0.75', 75),
-        ('x0.8', 80),
-        ('x0.9', 90),
-        ('x1.5', 150),
-        ('x2', 200),
-        ('reset', 100),
-    ]
+    TEMPO_PRESETS = PRESETS
     PITCH_PRESETS = TEMPO_PRESETS
     RATE_PRESETS = TEMPO_PRESETS
     def __init__(self, looper):
@@ -307,20 +349,28 @@ class RbPitch(Gtk.Box):
     def on_rate_preset(self, button):
         self.rate.slider.set_value(button.value)
 
+    @watched
     def on_tempo_change(self, slider):
+        self.looper.engine.set_filter(tempo=slider.get_value())
         if self.gst_pitch:
             tempo = slider.get_value()
             self.gst_pitch.set_property('tempo', tempo / 100)
 
+    @watched
     def on_pitch_change(self, slider):
+        self.looper.engine.set_filter(pitch=slider.get_value())
         if self.gst_pitch:
             pitch = slider.get_value()
             self.gst_pitch.set_property('pitch', pitch / 100)
+        self.looper.refresh_transposition()
 
+    @watched
     def on_rate_change(self, slider):
+        self.looper.engine.set_filter(rate=slider.get_value())
         if self.gst_pitch:
             rate = slider.get_value()
             self.gst_pitch.set_property('rate', rate / 100)
+        self.looper.refresh_transposition()
 
     def destroy_widgets(self):
         self.tempo.slider.disconnect(self.tempo_slider_sigid)
@@ -328,6 +378,9 @@ class RbPitch(Gtk.Box):
         self.rate.slider.disconnect(self.rate_slider_sigid)
         if self.gst_pitch:
             self.looper.player.remove_filter(self.gst_pitch)
+        self.tempo.destroy_widgets()
+        self.pitch.destroy_widgets()
+        self.rate.destroy_widgets()
         del self.tempo
         del self.pitch
         del self.rate
@@ -335,6 +388,69 @@ class RbPitch(Gtk.Box):
         del self.gst_pitch
 
 
+class Suggestions(Gtk.Box):
+    """
+    Sections found in the song, as buttons saving them as loops. A button
+    is insensitive while its section is saved or no more loops fit.
+    """
+
+    def __init__(self, looper):
+        super(Suggestions, self).__init__()
+        self.looper = looper
+        self.set_orientation(Gtk.Orientation.HORIZONTAL)
+        self.set_spacing(2)
+        self.set_no_show_all(True)
+        self.label = Gtk.Label('Suggested loops: ')
+        self.label.show()
+        self.pack_start(self.label, False, False, 0)
+        self.buttons = []
+
+    def set_sections(self, sections):
+        """`sections` is a list of (start, end, name), in song time."""
+        self.clear()
+        for start, end, name in sections:
+            button = Gtk.Button(name)
+            button.set_tooltip_text('{} - {}'.format(seconds_to_time(start),
+                                                     seconds_to_time(end)))
+            button.section = (start, end, name)
+            button.sigid = button.connect('clicked', self.on_suggestion)
+            self.pack_start(button, False, False, 0)
+            self.buttons.append(button)
+            button.show()
+        self.refresh()
+        # Not `show_all`, which skips widgets with no_show_all
+        if self.buttons:
+            self.show()
+
+    def clear(self):
+        for button in self.buttons:
+            button.disconnect(button.sigid)
+            button.destroy()
+        self.buttons = []
+        self.hide()
+
+    def refresh(self):
+        loops = self.looper.loops.get(self.looper.get_song_id(), [])
+        saved = set((loop['start'], loop['end']) for loop in loops)
+        full = len(loops) >= self.looper.MAX_LOOPS_NUM
+        for button in self.buttons:
+            start, end, name = button.section
+            button.set_sensitive(not full and (int(start), int(end))
+                                 not in saved)
+
+    @watched
+    def on_suggestion(self, button):
+        start, end, name = button.section
+        # Sliders and saved loops are in whole seconds
+        self.looper.add_loop(name, int(start), int(end))
+
+    def destroy_widgets(self):
+        self.clear()
+        del self.looper
+        del self.label
+        del self.buttons
+
+
 class Controls(Gtk.Grid):
     def __init__(self, looper):
         super(Controls, self).__init__()
@@ -347,16 +463,48 @@ class Controls(Gtk.Grid):
 
         self.save_loop_btn = Gtk.Button(label='Save loop')
 
+        # Created on the first click, see `get_tuner`, then only shown and
+        # hidden.
+        self.tuner = None
         self.tuner_btn = Gtk.Button('Tuner')
         self.tuner_sigid = self.tuner_btn.connect('clicked', self.on_tuner_btn_clicked)
 
-        self.audiokaraoke = Gst.ElementFactory.make('audiokaraoke', None)
-        self.audiokaraoke_btn = Gtk.ToggleButton('Filter out speech')
-        self.audiokaraoke_sigid = self.audiokaraoke_btn.connect('clicked', self.on_audiokaraoke_toggle)
+        # Created on first use, see `get_speech_filter`.
+        self.speech_filter = None
+        self.speech_filter_made = False
+        self.speech_filter_btn = Gtk.ToggleButton('Filter out speech')
+        self.speech_filter_sigid = self.speech_filter_btn.connect('clicked', self.on_speech_filter_toggle)
 
         self.rbpitch_btn = Gtk.ToggleButton('T/P/R')
         self.rbpitch_sigid = self.rbpitch_btn.connect('clicked', self.on_rbpitch_toggle)
 
+        # Made and added to the player when a preset is first picked (see
+        # `LooperPlugin.add_isolation`): presets then switch without
+        # relinking, and off bypasses it.
+        self.isolation = None
+        self.isolation_made = False
+        self.isolation_added = False
+        self.isolation_combo = Gtk.ComboBoxText()
+        for preset in ISOLATION_PRESETS:
+            self.isolation_combo.append(preset[0], preset[1])
+        self.isolation_combo.set_active_id('off')
+        self.isolation_sigid = self.isolation_combo.connect(
+            'changed', self.on_isolation_changed)
+
+        # Made when a part is first picked, and in the player, ahead of
+        # Looper's other filters, while one is (see
+        # `LooperPlugin.add_render_filter`).
+        self.render_filter = None
+        self.render_filter_made = False
+        self.render_filter_added = False
+        self.render_rate_sigid = None
+        self.separation_combo = Gtk.ComboBoxText()
+        for name, label in SEPARATIONS:
+            self.separation_combo.append(name, label)
+        self.separation_combo.set_active_id('off')
+        self.separation_sigid = self.separation_combo.connect(
+            'changed', self.on_separation_changed)
+
         self.min_range_label = Gtk.Label()
         self.min_range_label.set_text('Min range ')
         adj = Gtk.Adjustment(MIN_RANGE, MIN_RANGE, MIN_RANGE, 1, 10, 0)
@@ -376,18 +524,31 @@ class Controls(Gtk.Grid):
         self.end_slider = create_slider()
         self.end_slider.set_property('margin-right', 5)
 
-        self.attach(self.start_slider, 0, 0, 7, 2)
-        self.attach(self.end_slider, 7, 0, 7, 2)
+        self.attach(self.start_slider, 0, 0, 8, 2)
+        self.attach(self.end_slider, 8, 0, 8, 2)
 
-        self.attach(self.status_label, 0, 2, 14, 2)
+        self.attach(self.status_label, 0, 2, 16, 2)
 
         self.attach(self.tuner_btn, 0, 4, 2, 2)
-        self.attach(self.audiokaraoke_btn, 2, 4, 2, 2)
+        self.attach(self.speech_filter_btn, 2, 4, 2, 2)
         self.attach(self.rbpitch_btn, 4, 4, 2, 2)
-        self.attach(self.min_range_label, 6, 4, 2, 2)
-        self.attach(self.min_range, 8, 4, 1, 2)
-        self.attach(self.save_loop_btn, 10, 4, 2, 2)
-        self.attach(self.activation_btn, 12, 4, 2, 2)
+        self.attach(self.isolation_combo, 6, 4, 2, 2)
+        self.attach(self.separation_combo, 8, 4, 2, 2)
+        self.attach(self.min_range_label, 10, 4, 1, 2)
+        self.attach(self.min_range, 11, 4, 1, 2)
+        self.attach(self.save_loop_btn, 12, 4, 2, 2)
+        self.attach(self.activation_btn, 14, 4, 2, 2)
+
+        # Packed under the grid, whose rows are all as high as the
+        # tallest, by the plugin (see `do_activate`), with the width of
+        # the progress bar so both share the loop's scale. Shown only when
+        # enabled in the settings.
+        self.timeline = Timeline()
+        self.timeline.set_no_show_all(True)
+        self.timeline_menu = Gtk.Menu()
+        self.export_midi_item = Gtk.MenuItem('Export MIDI...')
+        self.timeline_menu.append(self.export_midi_item)
+        self.timeline_menu.show_all()
 
         if is_rb3(looper.shell):
             # In RB3 plugins cannot be activated from custom buttons so
@@ -419,6 +580,12 @@ class Controls(Gtk.Grid):
         self.save_loop_btn_sigid = self.save_loop_btn.connect(
             'clicked', looper.on_save_loop)
 
+        self.timeline_sigid = self.timeline.connect(
+            'button-press-event', self.on_timeline_pressed)
+        self.export_midi_sigid = self.export_midi_item.connect(
+            'activate', looper.on_export_midi)
+
+    @watched
     def on_rb_activation(self, action, state, data):
         """
         Change our custom activation button label as appropriate for the
@@ -431,6 +598,7 @@ class Controls(Gtk.Grid):
             self.activation_btn.set_label(OFF_LABEL)
             self.activation_btn.get_style_context().remove_class('looper_active')
 
+    @watched
     def on_btn_activation(self, button):
         """
         Change our custom activation button label as appropriate for the
@@ -449,35 +617,29 @@ class Controls(Gtk.Grid):
             label = ON_LABEL
         self.looper.action.action.emit('activate', state)
 
+    @watched
     def on_min_range_changed(self, spinner):
+        self.looper.engine.min_range = spinner.get_value_as_int()
         # simulate slider moved event so sliders obey new min_range value
         self.on_slider_moved(self.start_slider, 'start')
 
+    @watched
     def on_slider_moved(self, slider, moving_slider):
         """Dont let Start slider be greater than End or vice versa."""
-        start_value = self.start_slider.get_value()
-        end_value = self.end_slider.get_value()
-        min_range = self.min_range.get_value_as_int()
-        if moving_slider == 'start':
-            slider_start_max = end_value - min_range
-            if start_value > slider_start_max:
-                if self.looper.duration and end_value >= self.looper.duration:
-                    new_value = end_value - min_range
-                    self.start_slider.set_value(new_value)
-                else:
-                    new_value = start_value + min_range
-                    self.end_slider.set_value(new_value)
-        else:
-            slider_end_min = start_value + min_range
-            if end_value < slider_end_min:
-                if start_value == 0.0:
-                    new_value = start_value + min_range
-                    self.end_slider.set_value(new_value)
-                else:
-                    new_value = end_value - min_range
-                    self.start_slider.set_value(new_value)
-
+        start_value, end_value = self.looper.engine.clamp(
+            self.start_slider.get_value(), self.end_slider.get_value(),
+            moving_slider)
+        self.start_slider.set_value(start_value)
+        self.end_slider.set_value(end_value)
+        self.sync_engine()
         self.looper.refresh_rb_position_slider()
+        self.looper.refresh_timeline()
+        self.looper.refresh_separation()
+
+    def sync_engine(self):
+        """Push the current slider values to the loop engine."""
+        self.looper.engine.set_boundaries(self.start_slider.get_value(),
+                                          self.end_slider.get_value())
 
     def on_format_slider_value(self, scale, value):
         return seconds_to_time(value)
@@ -499,6 +661,7 @@ class Controls(Gtk.Grid):
         adj.set_lower(lower_limit)
         adj.set_upper(upper_limit)
         adj.set_value(current_value)
+        self.looper.engine.min_range = int(current_value)
         self.min_range.set_numeric(True)
         self.min_range.set_update_policy(1)
 
@@ -514,33 +677,147 @@ class Controls(Gtk.Grid):
             end_adj.set_lower(self.looper.end_slider_min)
             end_adj.set_upper(self.looper.end_slider_max)
             end_adj.set_value(self.looper.duration)
+        self.sync_engine()
+
+    def get_speech_filter(self):
+        """
+        The speech filter element, made on the first call: Looper's center
+        filter (see `looper_speech`), else audiokaraoke.
+        """
+        if not self.speech_filter_made:
+            try:
+                from looper_speech import make_center_filter
+                self.speech_filter = make_center_filter()
+            except ImportError:
+                self.speech_filter = None
+            if self.speech_filter is None:
+                self.speech_filter = Gst.ElementFactory.make('audiokaraoke',
+                                                             None)
+            self.speech_filter_made = True
+            self.refresh_speech_band()
+        return self.speech_filter
+
+    def refresh_speech_band(self):
+        """Restrict the speech filter to the band in the settings."""
+        element = self.speech_filter
+        if element is None:
+            return
+        low, high = self.looper.speech_band
+        if element.get_factory().get_name() == 'audiokaraoke':
+            # audiokaraoke keeps the centered sound of its band: the bass
+            element.set_property('filter-band', low / 2.0)
+            element.set_property('filter-width', float(low))
+        else:
+            element.set_property('low', low)
+            element.set_property('high', high)
 
-    def on_audiokaraoke_toggle(self, button):
-        if self.audiokaraoke:
+    @watched
+    def on_speech_filter_toggle(self, button):
+        if self.get_speech_filter():
             if button.get_active() is True:
-                self.looper.player.add_filter(self.audiokaraoke)
+                self.looper.player.add_filter(self.speech_filter)
             else:
-                self.looper.player.remove_filter(self.audiokaraoke)
+                self.looper.player.remove_filter(self.speech_filter)
+            self.looper.on_filters_changed()
         else:
-            self.audiokaraoke_btn.set_label('audiokaraoke missing')
-
+            self.speech_filter_btn.set_label('speech filter missing')
+
+    def get_isolation(self):
+        """The `IsolationFilter`, made on the first call."""
+        if not self.isolation_made:
+            self.isolation = IsolationFilter.make()
+            self.isolation_made = True
+        return self.isolation
+
+    def set_isolation(self, preset):
+        """Switch to isolation `preset`, as if picked."""
+        self.isolation_combo.set_active_id(preset)
+
+    @watched
+    def on_isolation_changed(self, combo):
+        preset = combo.get_active_id()
+        if preset is None or (preset == 'off' and not self.isolation_added):
+            return
+        isolation = self.get_isolation()
+        if isolation is None:
+            combo.set_tooltip_text('equalizer-nbands, audiocheblimit or '
+                                   'audiopanorama missing')
+            return
+        if not self.isolation_added:
+            self.looper.add_isolation()
+        isolation.set_preset(preset)
+
+    def get_render_filter(self):
+        """
+        The element playing renders of the loop (see `looper_render`), made
+        on the first call, None without NumPy or the GStreamer Python
+        bindings.
+        """
+        if not self.render_filter_made:
+            try:
+                from looper_render import make_render_filter
+                self.render_filter = make_render_filter()
+            except ImportError:
+                self.render_filter = None
+            self.render_filter_made = True
+        return self.render_filter
+
+    @watched
+    def on_separation_changed(self, combo):
+        part = combo.get_active_id()
+        if part is None:
+            return
+        if part == 'off':
+            if self.render_filter_added:
+                self.looper.remove_render_filter()
+        elif not self.render_filter_added:
+            if self.get_render_filter() is None:
+                combo.set_tooltip_text('NumPy or GStreamer Python bindings '
+                                       'missing')
+                return
+            self.looper.add_render_filter()
+        self.looper.refresh_separation()
+
+    def get_tuner(self):
+        """The Tuner window, built on the first call."""
+        if self.tuner is None:
+            from tuner import Tuner
+            self.tuner = Tuner(settings=self.looper.settings,
+                               parent=self.looper.shell.props.window)
+            self.tuner.set_reference(self.looper.tuner_reference)
+        return self.tuner
+
+    @watched
     def on_tuner_btn_clicked(self, button):
-        tuner = Tuner([16, 21, 26, 31, 35, 40])
-        tuner.run()
-        tuner.destroy()
+        self.get_tuner().present()
+
+    @watched
+    def on_timeline_pressed(self, timeline, event):
+        is_success, button = event.get_button()
+        # right click
+        if is_success and button == 3:
+            self.export_midi_item.set_sensitive(bool(timeline.notes))
+            self.timeline_menu.popup(None, None, None, None, button,
+                                     Gtk.get_current_event_time())
+        return True
 
+    @watched
     def on_rbpitch_toggle(self, button):
-        if self.looper.rbpitch.gst_pitch:
+        if self.looper.get_rbpitch().gst_pitch:
+            self.looper.engine.set_filter(enabled=button.get_active())
             if button.get_active() is True:
                 self.looper.player.add_filter(self.looper.rbpitch.gst_pitch)
             else:
                 self.looper.player.remove_filter(self.looper.rbpitch.gst_pitch)
+            self.looper.on_filters_changed()
+            self.looper.refresh_transposition()
         else:
             self.rbpitch_btn.set_label('pitch missing')
 
     def destroy_widgets(self):
         if is_rb3(self.looper.shell):
             self.activation_btn.disconnect(self.activation_btn_sigid)
+            self.looper.action.action.disconnect(self.action_sigid)
         self.min_range.disconnect(self.min_range_sigid)
         self.start_slider.disconnect(self.start_slider_changed_sigid)
         self.start_slider.disconnect(self.start_slider_value_sigid)
@@ -548,8 +825,24 @@ class Controls(Gtk.Grid):
         self.end_slider.disconnect(self.end_slider_value_sigid)
         self.save_loop_btn.disconnect(self.save_loop_btn_sigid)
         self.tuner_btn.disconnect(self.tuner_sigid)
-        self.audiokaraoke_btn.disconnect(self.audiokaraoke_sigid)
+        self.speech_filter_btn.disconnect(self.speech_filter_sigid)
         self.rbpitch_btn.disconnect(self.rbpitch_sigid)
+        self.isolation_combo.disconnect(self.isolation_sigid)
+        if self.isolation is not None:
+            self.isolation.destroy()
+            if self.isolation_added:
+                self.looper.player.remove_filter(self.isolation.element)
+        self.separation_combo.disconnect(self.separation_sigid)
+        if self.render_filter_added:
+            self.render_filter.disconnect(self.render_rate_sigid)
+            self.looper.player.remove_filter(self.render_filter)
+        self.timeline.disconnect(self.timeline_sigid)
+        self.export_midi_item.disconnect(self.export_midi_sigid)
+        self.timeline.destroy_widgets()
+        # The menu has no parent, so it is not destroyed with the grid.
+        self.timeline_menu.destroy()
+        if self.tuner is not None:
+            self.tuner.destroy()
         del self.looper
         del self.save_loop_btn
         del self.min_range_label
@@ -559,9 +852,147 @@ class Controls(Gtk.Grid):
         del self.start_slider
         del self.end_slider
         del self.tuner_btn
+        del self.tuner
+        del self.timeline
+        del self.timeline_menu
+        del self.export_midi_item
         del self.rbpitch_btn
-        del self.audiokaraoke_btn
-        del self.audiokaraoke
+        del self.speech_filter_btn
+        del self.speech_filter
+        del self.speech_filter_made
+        del self.isolation_combo
+        del self.isolation
+        del self.isolation_made
+        del self.isolation_added
+        del self.separation_combo
+        del self.render_filter
+        del self.render_filter_made
+        del self.render_filter_added
+        del self.render_rate_sigid
+
+
+class DebugPanel(Gtk.Expander):
+    """
+    Expander with live numbers from a debug source (telemetry, profiler),
+    which must provide `summary()`, `reset()` and `dump(path)`.
+    `get_source()` returns it, None while it's off.
+    """
+
+    # How often (seconds) the panel is refreshed while visible.
+    REFRESH_INTERVAL = 1
+
+    # File in the home directory the source is dumped to.
+    FILENAME = None
+
+    def __init__(self, looper, label, get_source):
+        super(DebugPanel, self).__init__(label=label)
+        self.looper = looper
+        self.get_source = get_source
+        self.refresh_id = None
+
+        self.label = Gtk.Label()
+        self.label.set_alignment(0, 0)
+        self.label.set_selectable(True)
+        self.reset_btn = Gtk.Button('Reset')
+        self.dump_btn = Gtk.Button('Dump to file')
+
+        buttons = Gtk.Box(orientation=Gtk.Orientation.VERTICAL)
+        buttons.pack_start(self.reset_btn, False, False, 2)
+        buttons.pack_start(self.dump_btn, False, False, 2)
+        box = Gtk.Box()
+        box.pack_start(self.label, True, True, 5)
+        box.pack_start(buttons, False, False, 5)
+        self.add(box)
+        # Shown only when enabled in the settings.
+        self.set_no_show_all(True)
+
+        self.reset_sigid = self.reset_btn.connect('clicked', self.on_reset)
+        self.dump_sigid = self.dump_btn.connect('clicked', self.on_dump)
+
+    def update(self, source):
+        """Collect whatever is sampled rather than recorded."""
+        pass
+
+    def start(self):
+        self.show_all()
+        if self.refresh_id is None:
+            self.refresh_id = GLib.timeout_add_seconds(self.REFRESH_INTERVAL,
+                                                       self.refresh)
+
+    def stop(self):
+        self.hide()
+        if self.refresh_id is not None:
+            GLib.source_remove(self.refresh_id)
+            self.refresh_id = None
+
+    @watched
+    def refresh(self):
+        source = self.get_source()
+        if source is not None:
+            self.update(source)
+            if self.get_expanded():
+                self.label.set_markup('<tt>%s</tt>' % GLib.markup_escape_text(
+                    source.summary()))
+        return True
+
+    def on_reset(self, button):
+        source = self.get_source()
+        if source is not None:
+            source.reset()
+            self.refresh()
+
+    def on_dump(self, button):
+        source = self.get_source()
+        if source is not None:
+            path = os.path.join(os.path.expanduser('~'), self.FILENAME)
+            source.dump(path)
+            self.dump_btn.set_tooltip_text('Saved to %s' % path)
+
+    def destroy_widgets(self):
+        self.stop()
+        self.reset_btn.disconnect(self.reset_sigid)
+        self.dump_btn.disconnect(self.dump_sigid)
+        del self.looper
+        del self.get_source
+        del self.label
+        del self.reset_btn
+        del self.dump_btn
+
+
+class TelemetryPanel(DebugPanel):
+    """Loop engine telemetry."""
+
+    FILENAME = '.looper_telemetry.json'
+
+    def __init__(self, looper):
+        super(TelemetryPanel, self).__init__(looper, 'Telemetry',
+                                             lambda: looper.telemetry)
+
+    def update(self, telemetry):
+        telemetry.filter(self.looper.query_filter_latency())
+
+
+class ProfilerPanel(DebugPanel):
+    """Per element profile of Looper's filters."""
+
+    FILENAME = '.looper_profile.json'
+
+    def __init__(self, looper):
+        super(ProfilerPanel, self).__init__(looper, 'Filter profile',
+                                            lambda: looper.profiler)
+
+    def update(self, profiler):
+        profiler.update()
+
+
+class WatchdogPanel(DebugPanel):
+    """Main loop stalls and the Looper handlers behind them."""
+
+    FILENAME = '.looper_watchdog.json'
+
+    def __init__(self, looper):
+        super(WatchdogPanel, self).__init__(looper, 'Main loop watchdog',
+                                            lambda: looper.watchdog)
 
 
 class LooperPlugin(GObject.Object, Peas.Activatable):
@@ -589,6 +1020,31 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
 
     LOOPS_FILENAME = '.loops.json'
 
+    # Directory, under the user's cache directory, of the data derived
+    # from songs, see `looper_cache`.
+    CACHE_DIRNAME = 'looper'
+
+    # Tuning estimates whose peaks agree less are ignored, see
+    # `looper_analysis.tuning_offset`.
+    MIN_TUNING_CONSISTENCY = 0.2
+
+    # Time (ms) the loop boundaries must rest before their chords and
+    # notes are analysed, or their separation rendered.
+    ANALYSIS_DELAY = 300
+
+    # Group of the tasks about the playing song, see `looper_tasks`.
+    SONG_TASKS = 'song'
+
+    # Time (s) after activation before the library is analysed, leaving
+    # Rhythmbox to load it.
+    LIBRARY_DELAY = 30
+
+    # How often (ms) the position is checked after a seek, for telemetry.
+    SEEK_POLL = 5
+
+    # Rhythmbox's player settings, holding the crossfade preference.
+    PLAYER_SCHEMA = 'org.gnome.rhythmbox.player'
+
     LOOPS_PER_ROW = 8
 
     MAX_LOOPS_NUM = 32
@@ -607,7 +1063,6 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         super(LooperPlugin, self).__init__()
 
     def do_activate(self):
-        self.load_css()
         self.settings = Gio.Settings("org.gnome.rhythmbox.plugins.looper")
         # old value will be needed when removing/adding(moving) GUI
         self.gui_position = self.POSITIONS[self.settings['position']]
@@ -616,6 +1071,11 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         self.player = self.shell_player.props.player
         self.db = self.shell.props.db
 
+        self.engine = LoopEngine(seek=self.seek, position=self.stream_position)
+        # Polls the position after a seek while telemetry measures it, see
+        # `poll_seek`.
+        self.seek_poll_id = None
+
         self.appshell = ApplicationShell(self.shell)
         self.main_box = Gtk.Box()
         self.main_box.set_orientation(Gtk.Orientation.VERTICAL)
@@ -623,21 +1083,67 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         self.controls_box = Gtk.Box()
         self.controls_box.set_orientation(Gtk.Orientation.VERTICAL)
 
+        # Cached action state and setting, kept up to date by their change
+        # handlers so refreshes don't query them.
+        self.active = False
+        self.always_show = self.settings['always-show']
+
         self._create_main_action()
 
         self.controls = Controls(self)
+        controls_vbox = Gtk.Box()
+        controls_vbox.set_orientation(Gtk.Orientation.VERTICAL)
+        controls_vbox.pack_start(self.controls, True, True, 0)
+        controls_vbox.pack_start(self.controls.timeline, False, False, 0)
+        self.suggestions = Suggestions(self)
+        controls_vbox.pack_start(self.suggestions, False, False, 2)
         controls_frame = Gtk.Frame()
-        controls_frame.add(self.controls)
+        controls_frame.add(controls_vbox)
         controls_frame.set_property('margin-left', 2)
         controls_frame.set_property('margin-right', 2)
-        self.rbpitch = RbPitch(self)
-        rbpitch_frame = Gtk.Frame()
-        rbpitch_frame.add(self.rbpitch)
-        rbpitch_frame.set_property('margin-left', 2)
-        rbpitch_frame.set_property('margin-right', 2)
-        self.controls_box.pack_start(rbpitch_frame, True, True, 5)
+        # Filled on first use or when idle, see `get_rbpitch`.
+        self.rbpitch = None
+        self.rbpitch_frame = Gtk.Frame()
+        self.rbpitch_frame.set_property('margin-left', 2)
+        self.rbpitch_frame.set_property('margin-right', 2)
+        self.controls_box.pack_start(self.rbpitch_frame, True, True, 5)
         self.controls_box.pack_start(controls_frame, True, True, 5)
 
+        self.telemetry = None
+        self.telemetry_panel = TelemetryPanel(self)
+        self.controls_box.pack_start(self.telemetry_panel, False, False, 0)
+
+        self.profiler = None
+        self.profiler_panel = ProfilerPanel(self)
+        self.controls_box.pack_start(self.profiler_panel, False, False, 0)
+
+        self.watchdog = None
+        self.watchdog_panel = WatchdogPanel(self)
+        self.controls_box.pack_start(self.watchdog_panel, False, False, 0)
+
+        # Background work, see `looper_tasks`. Tasks of the SONG_TASKS group
+        # are cancelled when the playing song changes: connected before
+        # `on_playing_song_changed`, which submits the new song's.
+        self.tasks = Executor()
+        self.tasks.cancel_on(self.shell_player, 'playing-song-changed',
+                             self.SONG_TASKS)
+        self.store = Store(os.path.join(GLib.get_user_cache_dir(),
+                                        self.CACHE_DIRNAME),
+                           self.settings['cache-size'] * 1024 * 1024)
+        self.analysis_cache = AnalysisCache(self.store)
+        # Analyses the whole library, see `refresh_library`.
+        self.library = None
+        self.library_id = None
+        # Estimated tuning (cents) of the playing song.
+        self.song_tuning = None
+        self.tuning_corrected = False
+        # Pending analyses of the loop region, see `refresh_timeline`.
+        self.timeline_id = None
+        # Pending render of the loop region's separation and the key of
+        # the latest, see `refresh_separation`.
+        self.separation_id = None
+        self.separation_key = None
+
         self.loops_box = Gtk.Grid()
         self.loops_box.set_row_spacing(2)
         self.loops_box.set_column_spacing(2)
@@ -645,7 +1151,9 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         self.loops_box.set_row_homogeneous(True)
         self.loops_box.set_border_width(0)
 
-        self.rb_slider = self.find_rb_slider()
+        self.rb_slider_locator = WidgetLocator(self.find_rb_slider,
+                                               self.shell.props.window)
+        self.player_settings = self.load_player_settings()
 
         self.main_box.pack_start(self.controls_box, True, True, 10)
         self.main_box.pack_start(Gtk.Separator(orientation=Gtk.Orientation.HORIZONTAL), True, True, 0)
@@ -654,12 +1162,12 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         # position = self.POSITIONS[self.settings['position']]
         self.shell.add_widget(self.main_box, self.gui_position, True, False)
 
-        self.rbpitch.tempo.slider.set_value(self.rbpitch.tempo_val)
-        self.rbpitch.pitch.slider.set_value(self.rbpitch.pitch_val)
-        self.rbpitch.rate.slider.set_value(self.rbpitch.rate_val)
-
         self.save_crossfade_settings()
 
+        self.refresh_telemetry()
+        self.refresh_profiler()
+        self.refresh_watchdog()
+
         self.settings_changed_sigid = self.settings.connect(
             'changed', self.on_settings_changed)
 
@@ -670,14 +1178,43 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         self.refresh_widgets()
         self.refresh_status_label()
 
-        if self.settings['always-show']:
+        if self.always_show:
             self.refresh_rb_position_slider()
             self.main_box.show_all()
 
         self.loops = {}
+        # Versions of the loops saved, see `save_file`.
+        self.loops_version = 0
         self.load_loops_file()
         self.loops_box.hide()
 
+        # Whatever isn't needed to show the controls is built when idle.
+        self.warm_up_id = GLib.idle_add(self.warm_up,
+                                        priority=GLib.PRIORITY_LOW)
+
+    @watched
+    def warm_up(self):
+        """
+        Build what activation skipped, before the user asks for it. Only
+        objects: filters join the player and songs are analysed once used.
+        """
+        self.warm_up_id = None
+        self.load_css()
+        self.get_rbpitch()
+        self.controls.get_speech_filter()
+        return False
+
+    def get_rbpitch(self):
+        """The tempo/pitch/rate controls, built on the first call."""
+        if self.rbpitch is None:
+            self.rbpitch = RbPitch(self)
+            self.rbpitch_frame.add(self.rbpitch)
+            self.rbpitch.show_all()
+            self.rbpitch.tempo.slider.set_value(self.rbpitch.tempo_val)
+            self.rbpitch.pitch.slider.set_value(self.rbpitch.pitch_val)
+            self.rbpitch.rate.slider.set_value(self.rbpitch.rate_val)
+        return self.rbpitch
+
     def load_css(self):
         cssProvider = Gtk.CssProvider()
         css_path = rb.find_plugin_file(self, 'looper.css')
@@ -686,17 +1223,27 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         styleContext = Gtk.StyleContext()
         styleContext.add_provider_for_screen(screen, cssProvider, Gtk.STYLE_PROVIDER_PRIORITY_USER)
 
+    @watched
     def on_activation(self, *args):
-        action = self.actions.get_action('ActivateLooper')
-        if action.get_active():
+        self.active = self.actions.get_action('ActivateLooper').get_active()
+        if self.active:
             # connect elapsed handler/signal to handle the loop
             self.elapsed_changed_sigid = self.shell_player.connect(
                 "elapsed-changed", self.loop)
 
             # Disable cross fade. It interferes at the edges of the song ..
-            if (self.crossfade and self.crossfade.get_active()):
-                    self.crossfade.set_active(False)
+            if self.crossfade:
+                self.crossfade = False
+            # Looked for again, once: it may have been missing until now
+            self.rb_slider_locator.forget()
             self.refresh_rb_position_slider()
+            self.get_rbpitch()
+            # A song could be playing, analysed only once Looper is used.
+            self.refresh_tuning()
+            self.refresh_sections()
+            if self.library is None and self.library_id is None:
+                self.library_id = GLib.timeout_add_seconds(
+                    self.LIBRARY_DELAY, self.start_library)
             self.controls_box.show_all()
             if self.shell_player.get_playing_song_duration() > -1:
                 self.loops_box.show_all()
@@ -705,15 +1252,16 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
             self.shell_player.disconnect(self.elapsed_changed_sigid)
             del self.elapsed_changed_sigid
             # Restore users crossfade if it was enabled
-            if self.crossfade and self.was_crossfade_active:
-                self.crossfade.set_active(True)
-            if not self.settings['always-show']:
+            if self.was_crossfade_active:
+                self.crossfade = True
+            if not self.always_show:
                 self.main_box.hide()
-                if hasattr(self, 'rb_slider'):
+                if self.rb_slider is not None:
                     self.rb_slider.clear_marks()
             self.loops_box.hide()
 
         self.refresh_status_label()
+        self.refresh_separation()
 
     def _create_main_action(self):
         self.actions = ActionGroup(self.shell, 'LooperActionGroup')
@@ -728,40 +1276,41 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         self.action = self.appshell.lookup_action('LooperActionGroup',
                                                   'ActivateLooper', 'app')
 
+    @watched
     def find_rb_slider(self):
-        rb_toolbar = self.find(self.shell.props.window, 'ToolBar', 'by_name')
+        rb_toolbar = find(self.shell.props.window, 'ToolBar', 'by_name')
         if not rb_toolbar:
-            rb_toolbar = self.find(self.shell.props.window,
-                                   'main-toolbar', 'by_id')
-        return self.find(rb_toolbar, 'GtkScale', 'by_name')
-
-    # Couldn't find better way to find widgets than loop through them
-    def find(self, node, search_id, search_type):
-        if isinstance(node, Gtk.Buildable):
-            if search_type == 'by_id':
-                if Gtk.Buildable.get_name(node) == search_id:
-                    return node
-            elif search_type == 'by_name':
-                if node.get_name() == search_id:
-                    return node
-
-        if isinstance(node, Gtk.Container):
-            for child in node.get_children():
-                ret = self.find(child, search_id, search_type)
-                if ret:
-                    return ret
-        return None
+            rb_toolbar = find(self.shell.props.window, 'main-toolbar', 'by_id')
+        return find(rb_toolbar, 'GtkScale', 'by_name')
+
+    @property
+    def rb_slider(self):
+        return self.rb_slider_locator.get()
+
+    def load_player_settings(self):
+        """Rhythmbox's player settings, None if its schema isn't installed."""
+        source = Gio.SettingsSchemaSource.get_default()
+        if source is None or source.lookup(self.PLAYER_SCHEMA, True) is None:
+            return None
+        return Gio.Settings(self.PLAYER_SCHEMA)
+
+    @property
+    def crossfade(self):
+        if self.player_settings is None:
+            return False
+        return self.player_settings['use-xfade-backend']
+
+    @crossfade.setter
+    def crossfade(self, active):
+        if self.player_settings is not None:
+            self.player_settings['use-xfade-backend'] = active
 
     def save_crossfade_settings(self):
         # We need to disable cross fade while Looper is active. So store
-        # RB's xfade widget and user preference for later use.
-        # Next line throws error in the Rhythmbox's console. Dont know why.
-        prefs = self.shell.props.prefs  # <-- error. Unreleased refs maybe.
-        self.crossfade = self.find(prefs, 'use_xfade_backend', 'by_id')
-        self.was_crossfade_active = False
-        if self.crossfade and self.crossfade.get_active():
-            self.was_crossfade_active = True
+        # user preference for later use.
+        self.was_crossfade_active = self.crossfade
 
+    @watched
     def on_settings_changed(self, settings, setting):
         """Handles changes to settings."""
         if setting == 'position':
@@ -769,56 +1318,517 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
             new_gui_position = self.POSITIONS[self.settings['position']]
             self.shell.add_widget(self.main_box, new_gui_position, True, False)
             self.gui_position = new_gui_position
+        elif setting == 'telemetry':
+            self.refresh_telemetry()
+        elif setting == 'profiling':
+            self.refresh_profiler()
+        elif setting == 'watchdog':
+            self.refresh_watchdog()
+        elif setting in ('detect-tuning', 'correct-tuning'):
+            self.refresh_tuning()
+        elif setting in ('detect-chords', 'transcribe'):
+            self.refresh_timeline()
+        elif setting == 'suggest-loops':
+            self.refresh_sections()
+        elif setting == 'analyse-library':
+            if self.library_id is not None:
+                GLib.source_remove(self.library_id)
+                self.library_id = None
+            self.refresh_library()
+        elif setting in ('speech-band-low', 'speech-band-high'):
+            self.controls.refresh_speech_band()
+        elif setting == 'cache-size':
+            self.store.set_budget(self.settings['cache-size'] * 1024 * 1024)
         elif setting == 'always-show':
-            action = self.actions.get_action('ActivateLooper')
-            if settings['always-show']:
+            self.always_show = settings['always-show']
+            if self.always_show:
+                self.get_rbpitch()
                 self.main_box.show_all()
-                if action.get_active() is not True:
+                if not self.active:
                     self.loops_box.hide()
             else:
-                if action.get_active() is not True:
+                if not self.active:
                     self.main_box.hide()
 
+    def refresh_telemetry(self):
+        """Create or drop the telemetry as the setting says."""
+        if self.settings['telemetry']:
+            if self.telemetry is None:
+                self.telemetry = Telemetry()
+                self.telemetry.codec = self.song_media_type or 'unknown'
+            self.telemetry_panel.start()
+        else:
+            self.telemetry = None
+            self.telemetry_panel.stop()
+        self.engine.telemetry = self.telemetry
+
+    def refresh_profiler(self):
+        """Create or drop the filter profiler as the setting says."""
+        if self.settings['profiling']:
+            if self.profiler is None:
+                self.profiler = FilterProfiler()
+            self.profiler.sync(self.active_filters())
+            self.profiler_panel.start()
+        else:
+            if self.profiler is not None:
+                self.profiler.detach_all()
+            self.profiler = None
+            self.profiler_panel.stop()
+
+    def refresh_watchdog(self):
+        """Install or drop the main loop watchdog as the setting says."""
+        if self.settings['watchdog']:
+            if self.watchdog is None:
+                self.watchdog = Watchdog()
+                self.watchdog.install()
+            self.watchdog_panel.start()
+        else:
+            if self.watchdog is not None:
+                self.watchdog.uninstall()
+            self.watchdog = None
+            self.watchdog_panel.stop()
+
+    def analysis(self, name):
+        """The `looper_analysis` function `name`, None without NumPy."""
+        try:
+            import looper_analysis
+        except ImportError:
+            sys.stderr.write('Song analysis needs NumPy\n')
+            return None
+        looper_analysis.use_store(self.store)
+        return getattr(looper_analysis, name)
+
+    def analyse(self, name, args, callback, process=False):
+        """
+        Run the `analysis` `name` as a task about the playing song,
+        replacing the one running or waiting.
+        """
+        func = self.analysis(name)
+        if func is None:
+            return
+        if process:
+            args = (self.store, func) + tuple(args)
+            func = self.analysis('in_store')
+        self.tasks.submit(func, args, callback, process=process, key=name,
+                          group=self.SONG_TASKS)
+
+    def start_library(self):
+        self.library_id = None
+        self.refresh_library()
+        return False
+
+    @watched
+    def refresh_library(self):
+        """Analyse the library in the background if the settings say so."""
+        if not self.settings['analyse-library']:
+            if self.library is not None:
+                self.library.stop()
+                self.library = None
+            return
+        if self.library is not None and not self.library.finished:
+            return
+        try:
+            from looper_library import LibraryAnalyser
+        except ImportError:
+            sys.stderr.write('Song analysis needs NumPy\n')
+            return
+        self.library = LibraryAnalyser(self.library_songs(),
+                                       self.analysis_cache,
+                                       self.MIN_TUNING_CONSISTENCY)
+        self.library.start()
+
+    def library_songs(self):
+        """
+        (song id, uri) of the library's songs, those with loops first.
+        Hidden ones (e.g. files gone missing) are left out.
+        """
+        song_type = self.db.entry_type_get_by_name('song')
+        songs = []
+
+        def add(entry, *data):
+            if (entry.get_entry_type() == song_type and
+                    not entry.get_boolean(RB.RhythmDBPropType.HIDDEN)):
+                songs.append((self.get_song_id(entry),
+                              entry.get_playback_uri()))
+        self.db.entry_foreach(add, None)
+        songs.sort(key=lambda song: song[0] not in self.loops)
+        return songs
+
+    @watched
+    def refresh_tuning(self):
+        """Estimate the playing song's tuning if the settings say so."""
+        self.set_song_tuning(None)
+        song_id = self.get_song_id()
+        if not self.settings['detect-tuning'] or not song_id:
+            self.tasks.cancel('song_tuning')
+            return
+        uri = self.entry.get_playback_uri()
+        estimate = self.analysis_cache.get(song_id, uri, 'tuning')
+        if estimate is not None:
+            self.set_song_tuning(estimate)
+            return
+        self.analyse('song_tuning', (uri,),
+                     functools.partial(self.on_tuning_estimated, song_id, uri))
+
+    @watched
+    def on_tuning_estimated(self, song_id, uri, estimate):
+        """Cache a song's estimated tuning, apply it if it's still playing."""
+        if estimate is None:
+            return
+        estimate = list(estimate)
+        self.analysis_cache.put(song_id, uri, 'tuning', estimate)
+        if song_id == self.get_song_id():
+            self.set_song_tuning(estimate)
+            # Chroma and notes depend on the recording's A4
+            self.refresh_timeline()
+
+    def set_song_tuning(self, estimate):
+        """
+        Apply the playing song's tuning estimate ([cents, consistency], or
+        None): to the pitch if correcting, else to the tuner's reference.
+        """
+        cents = None
+        if estimate is not None:
+            cents, consistency = estimate
+            if consistency < self.MIN_TUNING_CONSISTENCY:
+                cents = None
+        self.song_tuning = cents
+        if cents is not None and self.settings['correct-tuning']:
+            self.get_rbpitch().pitch.slider.set_value(
+                100 * 2 ** (-cents / 1200.0))
+            if not self.controls.rbpitch_btn.get_active():
+                self.controls.rbpitch_btn.set_active(True)
+            self.tuning_corrected = True
+        elif self.tuning_corrected:
+            self.rbpitch.pitch.slider.set_value(100)
+            self.tuning_corrected = False
+        if self.controls.tuner is not None:
+            self.controls.tuner.set_reference(self.tuner_reference)
+        self.refresh_transposition()
+
+    @property
+    def recording_reference(self):
+        """Frequency of A4 in the playing song's recording."""
+        if self.song_tuning is None:
+            return 440.0
+        return 440.0 * 2 ** (self.song_tuning / 1200.0)
+
+    @property
+    def tuner_reference(self):
+        """Frequency of A4 in the playing song, as the tuner should use."""
+        if self.tuning_corrected:
+            return 440.0
+        return self.recording_reference
+
+    @property
+    def transposition(self):
+        """
+        Semitones between the notes of the recording and what is heard,
+        named as the tuner does: the pitch filter's, plus the recording's
+        tuning if the tuner doesn't follow it.
+        """
+        shift = self.engine.transposition + 12 * math.log(
+            self.recording_reference / self.tuner_reference, 2)
+        return int(round(shift))
+
+    def refresh_transposition(self):
+        self.controls.timeline.set_transpose(self.transposition)
+
+    def refresh_timeline(self):
+        """
+        Show the chords and notes of the loop region if the settings say
+        so. Their analysis waits for the sliders to rest a moment.
+        """
+        timeline = self.controls.timeline
+        chords = self.settings['detect-chords']
+        notes = self.settings['transcribe']
+        for name, enabled in (('loop_harmony', chords),
+                              ('loop_notes', notes)):
+            if not enabled:
+                self.tasks.cancel(name)
+        if not chords and not notes:
+            timeline.hide()
+            return
+        timeline.set_bands(chords, notes)
+        timeline.set_region(self.engine.start, self.engine.end)
+        timeline.show()
+        if self.timeline_id is not None:
+            GLib.source_remove(self.timeline_id)
+        self.timeline_id = GLib.timeout_add(self.ANALYSIS_DELAY,
+                                            self.analyse_region)
+
+    @watched
+    def analyse_region(self):
+        """Analyse the loop region's chords and notes in the background."""
+        self.timeline_id = None
+        song_id = self.get_song_id()
+        if not song_id or not self.duration:
+            return False
+        args = (self.entry.get_playback_uri(), self.engine.start,
+                self.engine.end, self.recording_reference)
+        if self.settings['detect-chords']:
+            self.analyse('loop_harmony', args,
+                         functools.partial(self.on_harmony, song_id))
+        if self.settings['transcribe']:
+            self.analyse('loop_notes', args,
+                         functools.partial(self.on_notes, song_id))
+        return False
+
+    def refresh_separation(self):
+        """
+        Play the loop region's part picked in the controls, while looping.
+        Its render waits for the sliders to rest a moment; until then the
+        previous render plays where it overlaps the region.
+        """
+        if self.separation_id is not None:
+            GLib.source_remove(self.separation_id)
+            self.separation_id = None
+        if (not self.controls.render_filter_added or not self.active or
+                self.controls.separation_combo.get_active_id() == 'off'):
+            self.tasks.cancel('loop_separation')
+            self.separation_key = None
+            if self.controls.render_filter_added:
+                self.controls.render_filter.set_render(None)
+            return
+        self.separation_id = GLib.timeout_add(self.ANALYSIS_DELAY,
+                                              self.render_separation)
+
+    @watched
+    def render_separation(self):
+        """
+        Play the loop region's separation from the store, rendering it in
+        the background if it isn't there.
+        """
+        self.separation_id = None
+        song_id = self.get_song_id()
+        if not song_id or not self.duration:
+            return False
+        part = self.controls.separation_combo.get_active_id()
+        rate = self.controls.render_filter.rate
+        if not rate:
+            # Rendered once the rate is known, see `on_render_rate`
+            return False
+        uri = self.entry.get_playback_uri()
+        start, end = self.engine.start, self.engine.end
+        key = song_key(song_id, uri, 'separation', [start, end, part, rate])
+        self.separation_key = key
+        render = self.store.get_array(key)
+        if render is not None:
+            self.controls.render_filter.set_render(render, start, rate)
+            return False
+        # Long: in a child process, which writes the render to the store
+        self.analyse('loop_separation',
+                     (self.store, key, uri, start, end, part, rate),
+                     functools.partial(self.on_separation, start, rate),
+                     process=True)
+        return False
+
+    @watched
+    def on_render_rate(self, render_filter, pspec):
+        """
+        The player's rate changed (from its streaming thread): renders at
+        the old one are ignored, render at the new one.
+        """
+        GLib.idle_add(self.refresh_separation)
+
+    @watched
+    def on_separation(self, start, rate, key):
+        if key == self.separation_key:
+            render = self.store.get_array(key)
+            if render is not None:
+                self.controls.render_filter.set_render(render, start, rate)
+
+    @watched
+    def on_harmony(self, song_id, harmony):
+        if song_id == self.get_song_id():
+            self.controls.timeline.set_harmony(harmony['key'],
+                                               harmony['chords'])
+
+    @watched
+    def on_notes(self, song_id, notes):
+        if song_id == self.get_song_id():
+            self.controls.timeline.set_notes(notes['notes'])
+
+    @watched
+    def on_export_midi(self, item):
+        """Save the loop region's notes, as heard, to a MIDI file."""
+        timeline = self.controls.timeline
+        start, end = timeline.start, timeline.end
+        transpose = timeline.transpose
+        notes = [(max(a, start) - start, min(b, end) - start,
+                  note + transpose, velocity)
+                 for a, b, note, velocity in timeline.notes
+                 if b > start and a < end]
+        name = u'{0} {1}-{2}'.format(self.song_title or 'Loop',
+                                     seconds_to_time(start),
+                                     seconds_to_time(end))
+        dialog = Gtk.FileChooserDialog(
+            'Export MIDI', self.shell.props.window, Gtk.FileChooserAction.SAVE,
+            (Gtk.STOCK_CANCEL, Gtk.ResponseType.CANCEL,
+             Gtk.STOCK_SAVE, Gtk.ResponseType.ACCEPT))
+        dialog.set_do_overwrite_confirmation(True)
+        dialog.set_current_folder(os.path.expanduser('~'))
+        dialog.set_current_name(name.replace(':', '.') + '.mid')
+        if dialog.run() == Gtk.ResponseType.ACCEPT:
+            path = dialog.get_filename()
+            self.tasks.submit(
+                write_midi_file, (path, notes, name), priority=Executor.HIGH,
+                errback=lambda e: sys.stderr.write(
+                    'Error on saving %s: %s\n' % (path, e)))
+        dialog.destroy()
+
+    @watched
+    def refresh_sections(self):
+        """Suggest the playing song's sections as loops if the settings say
+        so."""
+        self.suggestions.clear()
+        song_id = self.get_song_id()
+        if not self.settings['suggest-loops'] or not song_id:
+            self.tasks.cancel('song_sections')
+            return
+        uri = self.entry.get_playback_uri()
+        sections = self.analysis_cache.get(song_id, uri, 'sections')
+        if sections is not None:
+            self.suggestions.set_sections(sections)
+            return
+        # Long, and needs the whole song decoded: in a child process
+        self.analyse('song_sections', (uri, self.recording_reference),
+                     functools.partial(self.on_sections, song_id, uri),
+                     process=True)
+
+    @watched
+    def on_sections(self, song_id, uri, sections):
+        """Cache a song's sections, suggest them if it's still playing."""
+        sections = [list(section) for section in sections['sections']]
+        self.analysis_cache.put(song_id, uri, 'sections', sections)
+        if song_id == self.get_song_id() and self.settings['suggest-loops']:
+            self.suggestions.set_sections(sections)
+
+    def on_filters_changed(self):
+        if self.profiler is not None:
+            self.profiler.sync(self.active_filters())
+
+    def active_filters(self):
+        """GStreamer elements Looper currently has in the player."""
+        filters = []
+        if self.controls.render_filter_added:
+            filters.append(self.controls.render_filter)
+        if (self.rbpitch is not None and self.rbpitch.gst_pitch and
+                self.controls.rbpitch_btn.get_active()):
+            filters.append(self.rbpitch.gst_pitch)
+        if (self.controls.speech_filter and
+                self.controls.speech_filter_btn.get_active()):
+            filters.append(self.controls.speech_filter)
+        if self.controls.isolation_added:
+            filters.append(self.controls.isolation.element)
+        return filters
+
+    def add_render_filter(self):
+        """
+        Add the render filter to the player, ahead of Looper's other
+        filters, so it sees the song's own timestamps and they process the
+        render too: those in the player are added again after it. Only
+        while a part is picked, as it converts the stream to stereo float.
+        """
+        controls = self.controls
+        others = self.active_filters()
+        for element in others:
+            self.player.remove_filter(element)
+        self.player.add_filter(controls.render_filter)
+        controls.render_filter_added = True
+        controls.render_rate_sigid = controls.render_filter.connect(
+            'notify::rate', self.on_render_rate)
+        for element in others:
+            self.player.add_filter(element)
+        self.on_filters_changed()
+
+    def remove_render_filter(self):
+        """Take the render filter out of the player, as when it was added."""
+        controls = self.controls
+        controls.render_filter.set_render(None)
+        controls.render_filter.disconnect(controls.render_rate_sigid)
+        controls.render_rate_sigid = None
+        self.player.remove_filter(controls.render_filter)
+        controls.render_filter_added = False
+        self.on_filters_changed()
+
+    def add_isolation(self):
+        """
+        Add the isolation bin to the player, the only time it's linked:
+        presets then only change its properties, and off bypasses it.
+        """
+        self.player.add_filter(self.controls.isolation.element)
+        self.controls.isolation_added = True
+        self.on_filters_changed()
+
+    def query_filter_latency(self):
+        """Latency (ms) reported by Looper's filters in the player."""
+        latency = 0
+        for element in self.active_filters():
+            query = Gst.Query.new_latency()
+            if element.query(query):
+                live, min_latency, max_latency = query.parse_latency()
+                latency += min_latency
+        return latency / Gst.MSECOND
+
+    @watched
     def on_playing_song_changed(self, source, user_data):
         """Refresh sliders and RB's position marks."""
+        if self.telemetry is not None:
+            self.telemetry.codec = self.song_media_type or 'unknown'
         self.refresh_widgets()
         self.clear_loops()
         self.load_song_loops()
-        action = self.actions.get_action('ActivateLooper')
-        if action.get_active() is True:
+        self.controls.timeline.clear()
+        if self.controls.render_filter_added:
+            self.controls.render_filter.set_render(None)
+        self.refresh_tuning()
+        self.refresh_timeline()
+        self.refresh_separation()
+        self.refresh_sections()
+        if self.active:
             self.refresh_rb_position_slider()
             self.loops_box.show_all()
         else:
             self.loops_box.hide()
 
+    @property
+    def speech_band(self):
+        """(low, high) Hz of the speech filter."""
+        return (self.settings['speech-band-low'],
+                self.settings['speech-band-high'])
+
+    @property
+    def duration(self):
+        return self.engine.duration
+
     def refresh_song_duration(self):
         duration = self.shell_player.get_playing_song_duration()
         if duration != -1 and duration >= (self.SEC_BEFORE_END + 2):
-            self.duration = duration - self.SEC_BEFORE_END
+            self.engine.duration = duration - self.SEC_BEFORE_END
         else:
-            self.duration = None
+            self.engine.duration = None
 
     def refresh_rb_position_slider(self):
         """
         Add marks to RB's position slider with Looper's start/end time values.
         """
         # Add start and end marks to the position slider
-        action = self.actions.get_action('ActivateLooper')
-        if self.rb_slider and (action.get_active() or self.settings['always-show']):
-            self.rb_slider.clear_marks()
-
-            start_time = seconds_to_time(self.controls.start_slider.get_value())
-            end_time = seconds_to_time(self.controls.end_slider.get_value())
+        rb_slider = self.rb_slider
+        if rb_slider and (self.active or self.always_show):
+            rb_slider.clear_marks()
 
-            self.rb_slider.add_mark(self.controls.start_slider.get_value(),
-                                             Gtk.PositionType.TOP, start_time)
-            self.rb_slider.add_mark(self.controls.end_slider.get_value(),
-                                             Gtk.PositionType.TOP, end_time)
+            state = self.engine.state
+            rb_slider.add_mark(state.start, Gtk.PositionType.TOP,
+                               seconds_to_time(state.start))
+            rb_slider.add_mark(state.end, Gtk.PositionType.TOP,
+                               seconds_to_time(state.end))
 
+    @watched
     def clear_loops(self):
         for child in self.loops_box.get_children():
-            child.deactivate()
             self.loops_box.remove(child)
+            child.deactivate()
 
     def load_song_loops(self):
         song_id = self.get_song_id()
@@ -826,20 +1836,26 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
             if song_id and song_id in self.loops:
                 self.load_loops(self.loops[song_id])
 
+    @watched
     def on_save_loop(self, button):
+        name = '{} - {}'.format(
+            seconds_to_time(self.controls.start_slider.get_value()),
+            seconds_to_time(self.controls.end_slider.get_value()),
+        )
+        self.add_loop(name, self.controls.start_slider.get_value(),
+                      self.controls.end_slider.get_value())
+
+    def add_loop(self, name, start, end):
+        """Save a loop of the playing song, unless MAX_LOOPS_NUM are."""
         song_id = self.get_song_id()
         if song_id:
             if song_id not in self.loops:
                 self.loops[song_id] = []
             if len(self.loops[song_id]) >= self.MAX_LOOPS_NUM:
                 return
-            name = '{} - {}'.format(
-                seconds_to_time(self.controls.start_slider.get_value()),
-                seconds_to_time(self.controls.end_slider.get_value()),
-            )
             loop = {
-                'end': self.controls.end_slider.get_value(),
-                'start': self.controls.start_slider.get_value(),
+                'end': end,
+                'start': start,
                 'name': name
             }
             self.loops[song_id].append(loop)
@@ -853,6 +1869,7 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         self.controls.status_label.set_text(status_text)
         self.controls.status_label.set_fraction(0)
 
+    @watched
     def refresh_widgets(self):
         self.refresh_song_duration()
         self.controls.refresh_min_range_button()
@@ -882,12 +1899,17 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         row, column  = divmod(number_of_children, self.LOOPS_PER_ROW)
         return column, row
 
-    def get_song_id(self):
-        if not self.entry:
+    def get_song_id(self, entry=None):
+        """Id of `entry`, by default the playing song, for loops and
+        analyses."""
+        entry = entry or self.entry
+        if not entry:
             return None
-        song_id = u'{0}-{1}'.format(self.song_artist, self.song_title)
+        song_id = u'{0}-{1}'.format(
+            entry.get_string(RB.RhythmDBPropType.ARTIST),
+            entry.get_string(RB.RhythmDBPropType.TITLE))
         if not song_id:
-            song_id =  self.entry.get_playback_uri()
+            song_id =  entry.get_playback_uri()
         return hashlib.md5(song_id.encode('utf8')).hexdigest()
 
     @property
@@ -912,28 +1934,45 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
             return self.entry.get_string(RB.RhythmDBPropType.LOCATION)
         return ''
 
+    @property
+    def song_media_type(self):
+        if self.entry:
+            return self.entry.get_string(RB.RhythmDBPropType.MEDIA_TYPE)
+        return ''
+
+    @watched
     def load_loops(self, loops):
         for index, loop in enumerate(loops):
             loop = loops[index]
-            loop_control = LoopControl(self, index, loop['name'], loop['start'], loop['end'])
+            loop_control = LoopControl(self, index, loop['name'], loop['start'], loop['end'],
+                                       loop.get('isolation'))
             # TODO:
             # Use ScrolledWindow instead of limited numbers of loops per grid row.
             # For now we will use limited number of loops per row as the
             # Gtk.ScrolledWindow is not working for some reason.
             row, column = self.get_grid_column_and_row()
             self.loops_box.attach(loop_control, row, column, 1, 1)
-        action = self.actions.get_action('ActivateLooper')
-        if action.get_active():
+        if self.active:
             self.loops_box.show_all()
+        self.suggestions.refresh()
 
     def save_loops(self):
-        Gdk.threads_add_idle(GLib.PRIORITY_DEFAULT_IDLE, self.save_loops_to_file)
-
+        """Save the loops as they are now, in the background."""
+        if self.loops:
+            self.loops_version += 1
+            path = self.get_loops_file_path()
+            self.tasks.submit(
+                save_file, (path, json.dumps(self.loops), self.loops_version),
+                priority=Executor.HIGH, key='save_loops',
+                errback=lambda e: sys.stderr.write(
+                    'Error on saving %s: %s\n' % (path, e)))
+
+    @watched
     def save_loops_to_file(self):
         if self.loops:
-            loops_file = self.get_loops_file_path()
-            with open(loops_file, 'w') as f:
-                f.write(json.dumps(self.loops))
+            self.loops_version += 1
+            save_file(self.get_loops_file_path(), json.dumps(self.loops),
+                      self.loops_version)
 
     @property
     def start_slider_max(self):
@@ -957,40 +1996,45 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
             return MIN_RANGE
         return 0
 
+    @watched
     def loop(self, player, elapsed):
         """
         Signal handler called every second of the current playing song.
         Forces the song to stay inside Looper's slider limits.
         """
-        # Start and End sliders values
-        start = int(self.controls.start_slider.get_value())
-        end = int(self.controls.end_slider.get_value())
-
-        if self.rbpitch.gst_pitch and self.controls.rbpitch_btn.get_active() is True:
-            tempo = self.rbpitch.tempo.slider.get_value()
-            rate = self.rbpitch.rate.slider.get_value()
-            start = math.floor(start / (tempo / 100) / (rate / 100))
-            end = math.ceil(end / (tempo / 100) / (rate / 100))
-
-        if elapsed < start:
-            # current time is bellow Start slider so fast forward
-            seek_time = start - elapsed
-        elif elapsed >= end:
-            # current time is above End slider so rewind
-            seek_time = start - elapsed
-        else:
-            # current position is within sliders, so chill
-            seek_time = False
-
-        # Sometimes song change event interferes with seeking. Therefore
-        # dont do anything if elapsed time is 0 (less than 1).
-        if seek_time and elapsed > 0:
-            try:
-                self.shell_player.seek(seek_time)
-            except GObject.GError:
-                sys.stderr.write('Seek to ' + str(seek_time) + 's failed\n')
+        start, end = self.engine.tick(elapsed)
+        if self.engine.seek_pending and self.seek_poll_id is None:
+            self.seek_poll_id = GLib.timeout_add(self.SEEK_POLL,
+                                                 self.poll_seek)
         self.update_label(elapsed, start, end)
 
+    @watched
+    def poll_seek(self):
+        """Tell the engine where the stream is until its seek is done."""
+        if self.engine.seek_done(self.stream_position()):
+            return True
+        self.seek_poll_id = None
+        return False
+
+    def stream_position(self):
+        """Precise position (s) of the playing stream, None if unknown."""
+        nanoseconds = self.player.get_time()
+        if isinstance(nanoseconds, tuple):
+            ok, nanoseconds = nanoseconds
+            if not ok:
+                return None
+        if nanoseconds is None or nanoseconds < 0:
+            return None
+        return nanoseconds / float(Gst.SECOND)
+
+    def seek(self, seek_time):
+        try:
+            self.shell_player.seek(seek_time)
+        except GObject.GError:
+            sys.stderr.write('Seek to ' + str(seek_time) + 's failed\n')
+            return False
+        return True
+
     def update_label(self, elapsed, start, end):
         """Update label based on current song time and sliders positions."""
         current_loop_seconds = elapsed - start
@@ -1005,16 +2049,42 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
             self.controls.status_label.set_text(label)
             fraction = current_loop_seconds / loop_duration_seconds
             self.controls.status_label.set_fraction(fraction)
+            if self.controls.timeline.get_visible():
+                # Same fraction of the loop, in song time
+                self.controls.timeline.set_position(self.engine.start +
+                    fraction * (self.engine.end - self.engine.start))
 
     def do_deactivate(self):
+        if self.warm_up_id is not None:
+            GLib.source_remove(self.warm_up_id)
         self.save_loops_to_file()
 
+        self.telemetry_panel.destroy_widgets()
+        self.profiler_panel.destroy_widgets()
+        if self.profiler is not None:
+            self.profiler.detach_all()
+        self.watchdog_panel.destroy_widgets()
+        if self.watchdog is not None:
+            self.watchdog.uninstall()
+        self.tasks.shutdown()
+        if self.library_id is not None:
+            GLib.source_remove(self.library_id)
+        if self.library is not None:
+            self.library.stop()
+        if self.timeline_id is not None:
+            GLib.source_remove(self.timeline_id)
+        if self.seek_poll_id is not None:
+            GLib.source_remove(self.seek_poll_id)
+        if self.separation_id is not None:
+            GLib.source_remove(self.separation_id)
         self.controls.destroy_widgets()
-        self.rbpitch.destroy_widgets()
+        self.suggestions.destroy_widgets()
+        if self.rbpitch is not None:
+            self.rbpitch.destroy_widgets()
 
         # Restore users crossfade preference
-        if self.crossfade and self.was_crossfade_active:
-            self.crossfade.set_active(True)
+        if self.was_crossfade_active:
+            self.crossfade = True
 
         self.settings.disconnect(self.settings_changed_sigid)
         self.shell_player.disconnect(self.song_changed_sigid)
@@ -1024,16 +2094,21 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         self.appshell.cleanup()
 
         self.main_box.set_visible(False)
-        self.shell.remove_widget(self.main_box, RB.ShellUILocation.MAIN_TOP)
+        self.shell.remove_widget(self.main_box, self.gui_position)
+        self.main_box.destroy()
 
-        if hasattr(self, 'rb_slider'):
+        if self.rb_slider is not None:
             self.rb_slider.clear_marks()
-            del self.rb_slider
+        self.rb_slider_locator.forget()
 
         del self.controls
+        del self.suggestions
         del self.loops_box
-        del self.crossfade
+        del self.rb_slider_locator
+        del self.player_settings
         del self.was_crossfade_active
+        del self.active
+        del self.always_show
         del self.shell_player
         del self.shell
         del self.player
@@ -1042,6 +2117,26 @@ class LooperPlugin(GObject.Object, Peas.Activatable):
         del self.main_box
         del self.controls_box
         del self.rbpitch
+        del self.rbpitch_frame
+        del self.warm_up_id
+        del self.telemetry_panel
+        del self.profiler_panel
+        del self.profiler
+        del self.tasks
+        del self.timeline_id
+        del self.seek_poll_id
+        del self.separation_id
+        del self.separation_key
+        del self.analysis_cache
+        del self.store
+        del self.library
+        del self.library_id
+        del self.song_tuning
+        del self.tuning_corrected
+        del self.watchdog_panel
+        del self.watchdog
+        del self.telemetry
+        del self.engine
         del self.actions
         del self.action
 
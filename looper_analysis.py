@@ -0,0 +1,964 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Song analysis.
+
+`decode` turns a song, or a region of it, into samples with GStreamer,
+without a main loop, so it can run in a background task (see
+`looper_tasks`); the analyses are plain NumPy on those samples.
+
+- `tuning_offset`: how far, in cents, the recording is from A4 = 440 Hz,
+- `loop_harmony`: key and chords of a region, from a chromagram that is
+  computed frame by frame as regions ask for it and kept per song,
+- `loop_notes`: the notes of a monophonic line in a region, from the pitch
+  and spectral flux of short frames, kept per song the same way,
+- `song_sections`: the song cut where its self-similarity changes, each
+  part named after the parts it repeats, from chroma averaged per beat,
+- `library_song`: the analyses kept per song, all at once, for songs
+  analysed ahead of being played,
+- `loop_separation`: a region in stereo with only its harmonic or only its
+  percussive part, rendered into the store for playback.
+
+The last decoded songs and their frame features stay in memory, so moving
+a loop boundary only analyses the frames it uncovers. With a store (see
+`use_store`) decoded songs are also kept on disk, read back memory mapped.
+"""
+
+import os
+import sys
+import math
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from gi.repository import Gst
+
+from looper_cache import Store, song_key
+from looper_pitch import yin_frames
+
+
+# Analysis sample rate: enough for the partials that matter below 5 kHz.
+RATE = 11025
+
+# Chroma frames: FFT size (0.37 s) and hop between frames (0.19 s), and
+# frames analysed at once.
+FRAME = 4096
+HOP = 2048
+BLOCK = 256
+
+# Note frames: two periods of the lowest note tracked (46 ms), a hop of
+# 23 ms, and the range and YIN threshold of the tracking.
+NOTE_FRAME = 1024
+NOTE_HOP = 256
+NOTE_FMIN = 60.0
+NOTE_FMAX = 1600.0
+NOTE_THRESHOLD = 0.2
+
+# Shortest note kept, and shortest time between onsets, in note frames.
+MIN_NOTE_FRAMES = 3
+MIN_ONSET_GAP = 3
+
+# Tempo range (bpm) of the beat tracker, and the tempo it favours.
+MIN_TEMPO = 60
+MAX_TEMPO = 200
+PREFERRED_TEMPO = 120
+
+# Sections: beats stacked into a self-similarity feature, beats each side of
+# a boundary in the novelty kernel, shortest section in beats, and how
+# similar two sections must be to count as the same part.
+EMBED_BEATS = 4
+KERNEL_BEATS = 16
+MIN_SECTION_BEATS = 16
+SAME_SECTION = 0.8
+
+# Harmonic/percussive separation, at the player's rate: FFT size and hop
+# (46 and 12 ms at 44.1 kHz), lengths of the median filters across frames
+# (0.2 s) and across bins (370 Hz), bins filtered at once, and frames
+# separated at once (24 s), bounding the memory of long regions.
+SEPARATION_FRAME = 2048
+SEPARATION_HOP = 512
+HARMONIC_FRAMES = 17
+PERCUSSIVE_BINS = 17
+SEPARATION_BLOCK = 64
+SEPARATION_CHUNK = 2048
+
+# Frames quieter than this (RMS) have no chord and no note.
+SILENCE = 1e-3
+
+# How often (s) decoding checks for errors while waiting for samples, and
+# how long (s) it waits at most.
+DECODE_POLL = 0.5
+DECODE_TIMEOUT = 30
+
+# Decoded songs, and songs whose frame features are kept.
+DECODED_SONGS = 2
+FEATURE_SONGS = 8
+
+NOTE_NAMES = ['C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B']
+NO_CHORD = 'N'
+
+# Krumhansl-Kessler key profiles, from the tonic.
+MAJOR_PROFILE = [6.35, 2.23, 3.48, 2.33, 4.38, 4.09,
+                 2.52, 5.19, 2.39, 3.66, 2.29, 2.88]
+MINOR_PROFILE = [6.33, 2.68, 3.52, 5.38, 2.60, 3.53,
+                 2.54, 4.75, 3.98, 2.69, 3.34, 3.17]
+
+_decoded = OrderedDict()
+_decode_lock = threading.Lock()
+# Songs being decoded, by uri: set when done.
+_decoding = {}
+_chroma = OrderedDict()
+_melody = OrderedDict()
+_features_lock = threading.Lock()
+_weights = {}
+_store = None
+
+
+def reset_locks():
+    """
+    Re-create the locks in a forked child: another thread of the parent
+    may have held them, and would never release them in the child.
+    """
+    global _decode_lock, _features_lock
+    _decode_lock = threading.Lock()
+    _features_lock = threading.Lock()
+    _decoding.clear()
+    if _store is not None:
+        use_store(Store(_store.directory, _store.budget))
+
+
+if hasattr(os, 'register_at_fork'):
+    os.register_at_fork(after_in_child=reset_locks)
+
+
+def decode(uri, rate=RATE, channels=1, start=None, end=None):
+    """
+    The song at `uri` as float32 samples at `rate`: mono, or (count,
+    `channels`) when more. All of it, or from `start` to `end` seconds.
+    """
+    Gst.init_check(None)
+    pipeline = Gst.parse_launch(
+        'uridecodebin name=decoder ! audioconvert ! audioresample ! '
+        'audio/x-raw,format=F32LE,channels=%d,rate=%d ! '
+        'appsink name=sink sync=false' % (channels, rate))
+    pipeline.get_by_name('decoder').set_property('uri', uri)
+    sink = pipeline.get_by_name('sink')
+    bus = pipeline.get_bus()
+    chunks = []
+    # Samples wanted, when not to the end
+    remaining = None
+    if end is not None:
+        remaining = int((end - (start or 0)) * rate) * channels
+
+    def check(result):
+        message = bus.pop_filtered(Gst.MessageType.ERROR)
+        if message is not None:
+            error, debug = message.parse_error()
+            raise IOError('Decoding %s failed: %s' % (uri, error.message))
+        if result == Gst.StateChangeReturn.FAILURE:
+            raise IOError('Decoding %s failed' % uri)
+
+    try:
+        if start:
+            check(pipeline.set_state(Gst.State.PAUSED))
+            result = pipeline.get_state(DECODE_TIMEOUT * Gst.SECOND)[0]
+            check(result)
+            if result == Gst.StateChangeReturn.ASYNC:
+                raise IOError('Decoding %s stalled' % uri)
+            pipeline.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH |
+                                 Gst.SeekFlags.ACCURATE,
+                                 int(start * Gst.SECOND))
+        check(pipeline.set_state(Gst.State.PLAYING))
+        # A source that fails never sends EOS: wait for samples a while at
+        # a time, checking for errors in between
+        waited = 0
+        while remaining is None or remaining > 0:
+            sample = sink.emit('try-pull-sample',
+                               int(DECODE_POLL * Gst.SECOND))
+            if sample is None:
+                if sink.get_property('eos'):
+                    break
+                check(None)
+                waited += DECODE_POLL
+                if waited >= DECODE_TIMEOUT:
+                    raise IOError('Decoding %s stalled' % uri)
+                continue
+            waited = 0
+            buf = sample.get_buffer()
+            ok, info = buf.map(Gst.MapFlags.READ)
+            if ok:
+                chunk = np.frombuffer(info.data, dtype='<f4')
+                if remaining is not None:
+                    chunk = chunk[:remaining]
+                    remaining -= len(chunk)
+                chunks.append(chunk.copy())
+                buf.unmap(info)
+        check(None)
+    finally:
+        pipeline.set_state(Gst.State.NULL)
+    samples = (np.concatenate(chunks) if chunks else
+               np.zeros(0, dtype=np.float32))
+    if channels > 1:
+        return samples.reshape(-1, channels)
+    return samples
+
+
+def use_store(store):
+    """Keep decoded songs in `store`, a `looper_cache.Store` (None: don't)."""
+    global _store
+    _store = store
+
+
+def in_store(store, func, *args):
+    """
+    `func(*args)` keeping decoded songs in `store`, for tasks run in child
+    processes, which don't share the plugin's `use_store`.
+    """
+    use_store(store)
+    return func(*args)
+
+
+def stored_samples(uri):
+    """`decode`, from the store if it has the song."""
+    if _store is None:
+        return decode(uri)
+    key = song_key(None, uri, 'samples', RATE)
+    samples = _store.get_array(key)
+    if samples is None:
+        samples = decode(uri)
+        _store.put_array(key, samples)
+    return samples
+
+
+def song_samples(uri):
+    """`decode`, from memory for the last songs decoded."""
+    with _decode_lock:
+        samples = _decoded.pop(uri, None)
+        if samples is not None:
+            _decoded[uri] = samples
+            return samples
+        # A song asked for twice is decoded once: the second call waits
+        done = _decoding.get(uri)
+        decoding = done is None
+        if decoding:
+            done = _decoding[uri] = threading.Event()
+    if not decoding:
+        done.wait()
+        return song_samples(uri)
+    try:
+        samples = stored_samples(uri)
+        with _decode_lock:
+            _decoded[uri] = samples
+            while len(_decoded) > DECODED_SONGS:
+                _decoded.popitem(last=False)
+    finally:
+        with _decode_lock:
+            _decoding.pop(uri, None)
+        done.set()
+    return samples
+
+
+def tuning_offset(samples, rate=RATE, windows=48, size=4096,
+                  fmin=100.0, fmax=2000.0):
+    """
+    Deviation of the recording from A4 = 440 Hz in cents (-50 to 50) and
+    how consistent the spectral peaks agree on it (0 to 1), or None for
+    silence.
+
+    Spectral peaks of `windows` frames spread over the song are located to
+    a fraction of a bin, and their distances to the equal tempered grid
+    averaged on a circle (-50 and +50 cents are the same deviation),
+    weighted by magnitude.
+    """
+    if len(samples) < size:
+        return None
+    starts = np.linspace(0, len(samples) - size, windows).astype(int)
+    frames = np.stack([samples[s:s + size] for s in starts])
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(size), axis=1))
+
+    # Local maxima louder than a tenth of their frame's loudest bin
+    loudest = spectrum.max(axis=1, keepdims=True)
+    middle = spectrum[:, 1:-1]
+    peaks = ((middle > spectrum[:, :-2]) & (middle >= spectrum[:, 2:]) &
+             (middle > 0.1 * loudest) & (loudest > 1e-3))
+    rows, cols = np.nonzero(peaks)
+    cols += 1
+
+    # Parabolic interpolation of the log magnitude
+    logmag = np.log(spectrum + 1e-12)
+    before, here, after = (logmag[rows, cols - 1], logmag[rows, cols],
+                           logmag[rows, cols + 1])
+    curve = before - 2 * here + after
+    shift = np.where(curve < 0, 0.5 * (before - after) /
+                     np.where(curve < 0, curve, -1), 0)
+    freqs = (cols + shift) * rate / float(size)
+    keep = (freqs >= fmin) & (freqs <= fmax)
+    if not keep.any():
+        return None
+    freqs = freqs[keep]
+    weights = spectrum[rows, cols][keep]
+
+    angles = 2 * np.pi * 12 * np.log2(freqs / 440.0)
+    x = np.sum(weights * np.cos(angles))
+    y = np.sum(weights * np.sin(angles))
+    cents = math.atan2(y, x) * 100 / (2 * np.pi)
+    return cents, float(math.hypot(x, y) / np.sum(weights))
+
+
+def song_tuning(uri):
+    """`tuning_offset` of the song at `uri`."""
+    return tuning_offset(song_samples(uri))
+
+
+def frame_count(length, hop=HOP):
+    """Frames in `length` samples, the last one zero padded."""
+    return max(int(math.ceil(length / float(hop))), 1)
+
+
+def frame_time(index, hop=HOP, size=FRAME):
+    """Song time (s) where frame `index` starts to dominate."""
+    return (index * hop + (size - hop) / 2.0) / RATE
+
+
+def time_frame(seconds, hop=HOP, size=FRAME):
+    """Frame dominating at `seconds`."""
+    return max(int((seconds * RATE - (size - hop) / 2.0) / hop), 0)
+
+
+def frames(samples, first, last, hop=HOP, size=FRAME):
+    """Frames `first` to `last` of `samples` as rows, zero padded."""
+    needed = max(last - 1, first) * hop + size
+    if len(samples) < needed:
+        samples = np.concatenate((samples, np.zeros(needed - len(samples),
+                                                    dtype=samples.dtype)))
+    starts = np.arange(first, last) * hop
+    return samples[starts[:, None] + np.arange(size)]
+
+
+def cached_frames(store, key, uri, first, last, compute, hop=HOP):
+    """
+    Frames `first` to `last` of per song features, kept in `store` under
+    `key`: a list of arrays with a row per frame. `compute(samples, start,
+    end)` returns them for a run of frames; only frames never asked for
+    before are computed (the song is decoded only then).
+    """
+    with _features_lock:
+        song = store.pop(key, None)
+    if song is None:
+        count = frame_count(len(song_samples(uri)), hop)
+        song = (None, np.zeros(count, dtype=bool))
+    tables, done = song
+    first, last = max(first, 0), min(last, len(done))
+
+    missing = np.nonzero(~done[first:last])[0] + first
+    if len(missing):
+        samples = song_samples(uri)
+        for run in np.split(missing, np.nonzero(np.diff(missing) > 1)[0] + 1):
+            start, end = run[0], run[-1] + 1
+            results = compute(samples, start, end)
+            if tables is None:
+                tables = [np.zeros((len(done),) + result.shape[1:],
+                                   dtype=result.dtype) for result in results]
+            for table, result in zip(tables, results):
+                table[start:end] = result
+            done[start:end] = True
+
+    with _features_lock:
+        store[key] = (tables, done)
+        while len(store) > FEATURE_SONGS:
+            store.popitem(last=False)
+    if tables is None:
+        # Nothing was ever asked for: empty results of the right shapes
+        return list(compute(np.zeros(0, dtype=np.float32), first, first))
+    return [table[first:last] for table in tables]
+
+
+def chroma_weights(reference=440.0, rate=RATE, size=FRAME,
+                   fmin=55.0, fmax=5000.0):
+    """(FFT bins, 12) matrix summing bins into pitch classes, C first."""
+    key = (round(reference, 2), rate, size, fmin, fmax)
+    weights = _weights.get(key)
+    if weights is None:
+        freqs = np.arange(size // 2 + 1) * rate / float(size)
+        bins = np.nonzero((freqs >= fmin) & (freqs <= fmax))[0]
+        classes = np.round(12 * np.log2(freqs[bins] / reference) + 9)
+        weights = np.zeros((len(freqs), 12))
+        weights[bins, classes.astype(int) % 12] = 1
+        _weights[key] = weights
+    return weights
+
+
+def chroma(samples, first, last, reference=440.0, rate=RATE):
+    """
+    Chroma of frames `first` to `last` (excluded), each normalized to
+    unit length, and their loudness (RMS).
+    """
+    weights = chroma_weights(reference, rate)
+    window = np.hanning(FRAME)
+    values = np.zeros((last - first, 12), dtype=np.float32)
+    loudness = np.zeros(last - first, dtype=np.float32)
+    for block in range(first, last, BLOCK):
+        end = min(block + BLOCK, last)
+        rows = frames(samples, block, end)
+        spectrum = np.abs(np.fft.rfft(rows * window, axis=1))
+        # Drop the noise floor, which would otherwise favour the pitch
+        # classes with the most bins, and compress what's left
+        floor = 2 * np.median(spectrum, axis=1)[:, None]
+        classes = np.log1p(np.maximum(spectrum - floor, 0)).dot(weights)
+        norms = np.sqrt(np.sum(classes ** 2, axis=1))
+        values[block - first:end - first] = (classes /
+                                             np.maximum(norms, 1e-9)[:, None])
+        loudness[block - first:end - first] = np.sqrt(np.mean(rows ** 2,
+                                                              axis=1))
+    return values, loudness
+
+
+def song_chroma(uri, first, last, reference=440.0):
+    """
+    `chroma` of frames `first` to `last` of the song at `uri`, kept per
+    song and reference (see `cached_frames`).
+    """
+    compute = lambda samples, start, end: chroma(samples, start, end,
+                                                 reference)
+    return cached_frames(_chroma, (uri, round(reference, 1)), uri, first,
+                         last, compute)
+
+
+def melody(samples, first, last, rate=RATE):
+    """
+    Pitch (Hz, NaN for none), loudness (RMS) and spectral flux of note
+    frames `first` to `last`.
+    """
+    window = np.hanning(NOTE_FRAME)
+    pitch = np.zeros(last - first)
+    loudness = np.zeros(last - first, dtype=np.float32)
+    flux = np.zeros(last - first, dtype=np.float32)
+    for block in range(first, last, BLOCK):
+        end = min(block + BLOCK, last)
+        # With the frame before the block, for the flux of its first one
+        before = max(block - 1, 0)
+        rows = frames(samples, before, end, NOTE_HOP, NOTE_FRAME)
+        spectrum = np.log1p(100 * np.abs(np.fft.rfft(rows * window, axis=1)))
+        if before == block:
+            spectrum = np.concatenate((np.zeros((1, spectrum.shape[1])),
+                                       spectrum))
+        rows = rows[block - before:]
+        pitch[block - first:end - first] = yin_frames(
+            rows, rate, NOTE_FMIN, NOTE_FMAX, NOTE_THRESHOLD, SILENCE)
+        loudness[block - first:end - first] = np.sqrt(np.mean(rows ** 2,
+                                                              axis=1))
+        flux[block - first:end - first] = np.sum(
+            np.maximum(np.diff(spectrum, axis=0), 0), axis=1)
+    return pitch, loudness, flux
+
+
+def song_melody(uri, first, last):
+    """`melody` of note frames `first` to `last` of the song at `uri`."""
+    return cached_frames(_melody, uri, uri, first, last, melody, NOTE_HOP)
+
+
+def _chord_templates():
+    names, templates = [], []
+    for root in range(12):
+        for suffix, intervals in (('', (0, 4, 7)), ('m', (0, 3, 7))):
+            template = np.zeros(12)
+            template[[(root + i) % 12 for i in intervals]] = 1 / math.sqrt(3)
+            names.append(NOTE_NAMES[root] + suffix)
+            templates.append(template)
+    return names, np.array(templates)
+
+CHORD_NAMES, CHORD_TEMPLATES = _chord_templates()
+
+
+def chords(values, loudness, smooth=5):
+    """
+    Chord of each frame, as an index in CHORD_NAMES or -1 for none: the
+    major or minor triad closest to the chroma summed over `smooth` frames.
+    """
+    scores = values.dot(CHORD_TEMPLATES.T)
+    before = smooth // 2
+    padded = np.concatenate((np.zeros((before + 1, scores.shape[1])), scores,
+                             np.zeros((smooth - 1 - before,
+                                       scores.shape[1]))))
+    running = np.cumsum(padded, axis=0)
+    labels = np.argmax(running[smooth:] - running[:-smooth], axis=1)
+    labels[loudness < SILENCE] = -1
+    return labels
+
+
+def segments(labels, first=0):
+    """Runs of equal labels as (first frame, end frame, label)."""
+    if not len(labels):
+        return []
+    bounds = np.concatenate(([0], np.nonzero(np.diff(labels))[0] + 1,
+                             [len(labels)]))
+    return [(first + int(start), first + int(end), int(labels[start]))
+            for start, end in zip(bounds[:-1], bounds[1:])]
+
+
+def _key_profiles():
+    names, profiles = [], []
+    for mode, profile in (('major', MAJOR_PROFILE), ('minor', MINOR_PROFILE)):
+        for tonic in range(12):
+            names.append('%s %s' % (NOTE_NAMES[tonic], mode))
+            profiles.append(np.roll(profile, tonic))
+    profiles = np.array(profiles)
+    profiles -= profiles.mean(axis=1)[:, None]
+    profiles /= np.sqrt(np.sum(profiles ** 2, axis=1))[:, None]
+    return names, profiles
+
+KEY_NAMES, KEY_PROFILES = _key_profiles()
+
+
+def key(values):
+    """Key (e.g. 'A minor') whose profile best correlates with the summed
+    chroma, None without chroma."""
+    total = values.sum(axis=0)
+    total = total - total.mean()
+    norm = math.sqrt(np.sum(total ** 2))
+    if norm == 0:
+        return None
+    return KEY_NAMES[int(np.argmax(KEY_PROFILES.dot(total / norm)))]
+
+
+def onsets(flux, context=10, spread=2, ratio=1.5, gap=MIN_ONSET_GAP):
+    """
+    Frames where notes start: peaks of the spectral flux within `spread`
+    frames that stand `ratio` times above its mean over `context` frames
+    around, at least `gap` frames apart.
+    """
+    count = len(flux)
+    if not count:
+        return []
+    padded = np.concatenate((np.zeros(context + 1), flux, np.zeros(context)))
+    running = np.cumsum(padded)
+    mean = (running[2 * context + 1:] - running[:count]) / (2 * context + 1)
+    padded = np.concatenate((np.zeros(spread), flux, np.zeros(spread)))
+    peak = np.max([padded[i:i + count] for i in range(2 * spread + 1)],
+                  axis=0)
+    candidates = np.nonzero((flux >= peak) & (flux > ratio * mean) &
+                            (flux > 0.05 * flux.max()))[0]
+    found = []
+    for index in candidates:
+        if not found or index - found[-1] >= gap:
+            found.append(int(index))
+    return found
+
+
+def median_filter(values, size):
+    """Running median of `size` values, the edges repeated."""
+    before = size // 2
+    padded = np.concatenate(([values[0]] * before, values,
+                             [values[-1]] * (size - 1 - before)))
+    return np.median([padded[i:i + len(values)] for i in range(size)],
+                     axis=0)
+
+
+def median_filter_axis(values, size, axis):
+    """
+    `median_filter` of a 2-D array along `axis`, SEPARATION_BLOCK lines
+    at a time to bound the memory of the stacked copies.
+    """
+    values = np.swapaxes(values, 0, axis)
+    before = size // 2
+    padded = np.concatenate([values[:1]] * before + [values] +
+                            [values[-1:]] * (size - 1 - before))
+    output = np.empty_like(values)
+    for first in range(0, values.shape[1], SEPARATION_BLOCK):
+        block = padded[:, first:first + SEPARATION_BLOCK]
+        output[:, first:first + SEPARATION_BLOCK] = np.median(
+            [block[i:i + len(values)] for i in range(size)], axis=0)
+    return np.swapaxes(output, 0, axis)
+
+
+def separate(samples, part, size=SEPARATION_FRAME, hop=SEPARATION_HOP):
+    """
+    Only the 'harmonic' or only the 'percussive' `part` of `samples`
+    (count, channels), by median filtering (Fitzgerald 2010): in the
+    spectrogram, sustained notes are lines across frames, kept by a median
+    across frames, and hits lines across bins, kept by a median across
+    bins. Each bin gets a soft mask from the two medians, the same in
+    every channel so the stereo image stays.
+
+    Done SEPARATION_CHUNK frames at a time, each with the frames around it
+    its output depends on, so the chunks join seamlessly.
+    """
+    chunk = SEPARATION_CHUNK * hop
+    margin = size + HARMONIC_FRAMES * hop
+    if len(samples) <= chunk + 2 * margin:
+        return separate_chunk(samples, part, size, hop)
+    output = np.empty(samples.shape, np.float32)
+    for first in range(0, len(samples), chunk):
+        begin = max(first - margin, 0)
+        separated = separate_chunk(samples[begin:first + chunk + margin],
+                                   part, size, hop)
+        output[first:first + chunk] = separated[first - begin:
+                                                first - begin + chunk]
+    return output
+
+
+def separate_chunk(samples, part, size, hop):
+    """`separate` all of `samples` at once."""
+    count, channels = samples.shape
+    # Square root of a periodic Hann window, before and after the
+    # transform: the squares of frames a quarter frame apart sum to 2.
+    window = np.sqrt(0.5 - 0.5 * np.cos(
+        2 * np.pi * np.arange(size) / size))[None, :, None]
+    overlap = size // hop
+    padded = np.concatenate((np.zeros((size, channels), np.float32), samples,
+                             np.zeros((size + hop, channels), np.float32)))
+    frames = (len(padded) - size) // hop + 1
+    indices = np.arange(frames)[:, None] * hop + np.arange(size)[None, :]
+    spectra = np.fft.rfft(padded[indices] * window, axis=1)
+    magnitude = np.abs(spectra).sum(axis=2).astype(np.float32)
+    harmonic = median_filter_axis(magnitude, HARMONIC_FRAMES, 0) ** 2
+    percussive = median_filter_axis(magnitude, PERCUSSIVE_BINS, 1) ** 2
+    kept = harmonic if part == 'harmonic' else percussive
+    spectra *= (kept / np.maximum(harmonic + percussive, 1e-12))[:, :, None]
+    frames = np.fft.irfft(spectra, size, axis=1) * window
+    # Overlap-add, hop by hop: each is a quarter of `overlap` frames
+    output = np.zeros((len(padded) // hop + overlap, hop, channels))
+    for quarter in range(overlap):
+        output[quarter:quarter + len(frames)] += \
+            frames[:, quarter * hop:(quarter + 1) * hop]
+    output = output.reshape(-1, channels) * (2.0 * hop / size)
+    return output[size:size + count].astype(np.float32)
+
+
+def loop_separation(store, key, uri, start, end, part, rate):
+    """
+    Render the region from `start` to `end` seconds of the song at `uri`,
+    stereo at `rate`, with only its `part` (see `separate`), into `store`
+    under `key`. Returns `key`.
+    """
+    samples = decode(uri, rate, 2, start, end)
+    if not len(samples):
+        raise IOError('Nothing decoded from %s' % uri)
+    store.put_array(key, separate(samples, part))
+    return key
+
+
+def notes(pitch, loudness, flux, reference=440.0, first=0, smooth=5,
+          lag=5):
+    """
+    Notes of a monophonic line as (first frame, end frame, MIDI note,
+    velocity), with A4 at `reference` Hz.
+
+    Between onsets, runs of frames on the same note that last
+    MIN_NOTE_FRAMES at least are notes, the first one starting at the
+    onset if it follows within `lag` frames. Right after an onset the
+    tracker may still hear the note before, so a run on that note is
+    dropped when another follows.
+    """
+    if not len(pitch):
+        return []
+    with np.errstate(invalid='ignore', divide='ignore'):
+        midi = np.round(69 + 12 * np.log2(pitch / reference))
+    labels = np.where(np.isnan(midi) | (loudness < SILENCE), -1, midi)
+    labels = median_filter(labels, smooth).astype(int)
+    bounds = sorted(set([0, len(labels)] + onsets(flux)))
+    loudest = max(float(loudness.max()), SILENCE)
+    found = []
+    previous = None
+    for start, end in zip(bounds[:-1], bounds[1:]):
+        runs = [(a, b, label) for a, b, label in
+                segments(labels[start:end], start)
+                if 0 <= label <= 127 and b - a >= MIN_NOTE_FRAMES]
+        if len(runs) > 1 and runs[0][2] == previous:
+            runs = runs[1:]
+        if runs and runs[0][0] - start <= lag:
+            runs[0] = (start,) + runs[0][1:]
+        for a, b, label in runs:
+            # 40 dB under the loudest frame is the softest velocity
+            level = 20 * math.log10(max(float(loudness[a:b].max()),
+                                        SILENCE) / loudest)
+            velocity = int(round(127 * min(max(1 + level / 40.0, 0.1), 1)))
+            found.append((first + a, first + b, label, velocity))
+            previous = label
+    return found
+
+
+def loop_notes(uri, start, end, reference=440.0):
+    """
+    Notes between `start` and `end` (s) of the song at `uri` with A4 at
+    `reference` Hz: {'notes': [(start, end, MIDI note, velocity), ...]},
+    notes clipped to the region.
+    """
+    first = time_frame(start, NOTE_HOP, NOTE_FRAME)
+    last = time_frame(end, NOTE_HOP, NOTE_FRAME) + 1
+    pitch, loudness, flux = song_melody(uri, first, last)
+    found = []
+    for a, b, note, velocity in notes(pitch, loudness, flux, reference,
+                                      first):
+        # An attack shows in the frame a hop before the one dominating
+        # when it happens
+        a = max(frame_time(a + 1, NOTE_HOP, NOTE_FRAME), start)
+        b = min(frame_time(b + 1, NOTE_HOP, NOTE_FRAME), end)
+        if a < b:
+            found.append((a, b, note, velocity))
+    return {'notes': found}
+
+
+def loop_harmony(uri, start, end, reference=440.0):
+    """
+    Key and chords between `start` and `end` (s) of the song at `uri`:
+    {'key': name or None, 'chords': [(start, end, name), ...]}, chords
+    clipped to the region.
+    """
+    first, last = time_frame(start), time_frame(end) + 1
+    values, loudness = song_chroma(uri, first, last, reference)
+    found = []
+    for a, b, label in segments(chords(values, loudness), first):
+        name = CHORD_NAMES[label] if label >= 0 else NO_CHORD
+        found.append((max(frame_time(a), start), min(frame_time(b), end),
+                      name))
+    return {'key': key(values[loudness >= SILENCE]), 'chords': found}
+
+
+def tempo_period(envelope, fps):
+    """
+    Beat period in frames of an onset `envelope` sampled `fps` times a
+    second: the autocorrelation peak, weighted towards PREFERRED_TEMPO
+    (one octave off halves the weight).
+    """
+    envelope = envelope - envelope.mean()
+    size = 1 << int(math.ceil(math.log(2 * len(envelope), 2)))
+    spectrum = np.fft.rfft(envelope, size)
+    acf = np.fft.irfft(spectrum * np.conj(spectrum), size)
+    lags = np.arange(int(fps * 60 / MAX_TEMPO), int(fps * 60 / MIN_TEMPO) + 1)
+    bpm = fps * 60.0 / lags
+    weight = np.exp(-0.5 * np.log2(bpm / PREFERRED_TEMPO) ** 2 / 0.5)
+    return int(lags[np.argmax(acf[lags] * weight)])
+
+
+def beats(envelope, period, tightness=100.0):
+    """
+    Beat frames of an onset `envelope`: the path through its peaks with
+    gaps close to `period` frames, found by dynamic programming (Ellis,
+    "Beat tracking by dynamic programming", 2007).
+    """
+    count = len(envelope)
+    if count < 2 * period:
+        return []
+    envelope = envelope / max(float(envelope.std()), 1e-9)
+    gaps = np.arange(int(round(period / 2.0)), 2 * period + 1)
+    penalty = -tightness * np.log(gaps / float(period)) ** 2
+    score = envelope.astype(np.float64)
+    back = np.zeros(count, dtype=int) - 1
+    for index in range(gaps[0], count):
+        previous = index - gaps
+        valid = previous >= 0
+        candidates = score[previous[valid]] + penalty[valid]
+        best = int(np.argmax(candidates))
+        if candidates[best] > 0:
+            score[index] += candidates[best]
+            back[index] = previous[valid][best]
+
+    # From the best scoring frame of the last period, back to the first
+    index = count - period + int(np.argmax(score[-period:]))
+    found = []
+    while index >= 0:
+        found.append(index)
+        index = back[index]
+    return found[::-1]
+
+
+def beat_chroma(values, times, bounds):
+    """
+    Mean of the chroma `values` of frames at `times` between each pair of
+    consecutive `bounds` (s), the nearest frame's for beats without one.
+    """
+    beat = np.searchsorted(bounds, times, side='right') - 1
+    inside = (beat >= 0) & (beat < len(bounds) - 1)
+    sums = np.zeros((len(bounds) - 1, values.shape[1]))
+    np.add.at(sums, beat[inside], values[inside])
+    counts = np.bincount(beat[inside], minlength=len(bounds) - 1)
+    empty = np.nonzero(counts == 0)[0]
+    middles = (bounds[empty] + bounds[empty + 1]) / 2.0
+    nearest = np.clip(np.searchsorted(times, middles), 0, len(times) - 1)
+    sums[empty] = values[nearest]
+    counts[empty] = 1
+    return sums / counts[:, None]
+
+
+def self_similarity(values, embed=EMBED_BEATS):
+    """
+    Cosine similarity of every beat with every other, each beat described
+    by its chroma and that of the `embed` - 1 beats after it.
+    """
+    count = len(values)
+    padded = np.concatenate((values, np.zeros((embed - 1, values.shape[1]))))
+    stacked = np.concatenate([padded[i:i + count] for i in range(embed)],
+                             axis=1)
+    stacked /= np.maximum(np.sqrt(np.sum(stacked ** 2, axis=1)), 1e-9)[:, None]
+    return stacked.dot(stacked.T)
+
+
+def novelty(similarity, size=KERNEL_BEATS):
+    """
+    How much the music changes at each beat: correlation of the
+    self-similarity along its diagonal with a tapered checkerboard kernel
+    (Foote, "Automatic audio segmentation using a measure of audio
+    novelty", 2000).
+    """
+    count = len(similarity)
+    sign = np.concatenate((-np.ones(size), np.ones(size)))
+    taper = np.exp(-0.5 * (np.arange(-size, size) + 0.5) ** 2 /
+                   (size / 2.0) ** 2)
+    kernel = np.outer(sign * taper, sign * taper)
+    padded = np.zeros((count + 2 * size, count + 2 * size))
+    padded[size:size + count, size:size + count] = similarity
+    return np.array([np.sum(kernel * padded[i:i + 2 * size, i:i + 2 * size])
+                     for i in range(count)])
+
+
+def section_bounds(curve, shortest=MIN_SECTION_BEATS):
+    """
+    Beats starting sections: the strongest peaks of the novelty `curve`,
+    at least `shortest` beats from each other and from the ends.
+    """
+    count = len(curve)
+    peaks = [i for i in range(1, count - 1)
+             if curve[i] >= curve[i - 1] and curve[i] > curve[i + 1] and
+             curve[i] > 0]
+    bounds = [0, count]
+    for peak in sorted(peaks, key=lambda i: -curve[i]):
+        if all(abs(peak - bound) >= shortest for bound in bounds):
+            bounds.append(peak)
+    return sorted(bounds)
+
+
+def section_similarity(similarity, a, b, slack=2):
+    """
+    How alike sections `a` and `b` ((first, end) beats) are: the mean
+    similarity of their beats taken in step from their starts, allowing
+    `slack` beats of misalignment.
+    """
+    best = -1.0
+    for shift in range(-slack, slack + 1):
+        steps = np.arange(max(0, -shift), min(a[1] - a[0],
+                                              b[1] - b[0] - shift))
+        if len(steps):
+            best = max(best, float(similarity[a[0] + steps,
+                                              b[0] + shift + steps].mean()))
+    return best
+
+
+def section_names(sections, similarity, loudness):
+    """
+    Names of `sections` ((first, end) beats): sections alike are the same
+    part. The loudest part that repeats is the chorus, the first other one
+    that repeats the verse; single ones are the intro, outro or bridges.
+    """
+    parts = []
+    for index, section in enumerate(sections):
+        for part in parts:
+            if section_similarity(similarity, sections[part[0]],
+                                  section) >= SAME_SECTION:
+                part.append(index)
+                break
+        else:
+            parts.append([index])
+
+    def level(part):
+        return np.mean([loudness[a:b].mean() for a, b in
+                        (sections[i] for i in part)])
+
+    repeated = [part for part in parts if len(part) > 1]
+    titles = {}
+    if repeated:
+        chorus = max(repeated, key=level)
+        titles[id(chorus)] = 'Chorus'
+        others = [part for part in repeated if part is not chorus]
+        for number, part in enumerate(others):
+            titles[id(part)] = 'Verse' if number == 0 else 'Part %s' % (
+                chr(ord('A') + number))
+    names = [None] * len(sections)
+    bridges = 0
+    for part in parts:
+        if id(part) in titles:
+            for number, index in enumerate(part):
+                names[index] = '%s %d' % (titles[id(part)], number + 1)
+        elif part[0] == 0:
+            names[0] = 'Intro'
+        elif part[0] == len(sections) - 1:
+            names[part[0]] = 'Outro'
+        else:
+            bridges += 1
+            names[part[0]] = 'Bridge %d' % bridges
+    return names
+
+
+def song_sections(uri, reference=440.0):
+    """
+    Sections of the song at `uri`: {'sections': [(start, end, name), ...]},
+    times in seconds on beats.
+    """
+    samples = song_samples(uri)
+    duration = len(samples) / float(RATE)
+    pitch, loudness, flux = song_melody(
+        uri, 0, frame_count(len(samples), NOTE_HOP))
+    fps = RATE / float(NOTE_HOP)
+    period = tempo_period(flux, fps)
+    found = beats(flux, period)
+    if len(found) < 2 * MIN_SECTION_BEATS:
+        return {'sections': []}
+    bounds = np.array([frame_time(i + 1, NOTE_HOP, NOTE_FRAME)
+                       for i in found] + [duration])
+
+    values, volume = song_chroma(uri, 0, frame_count(len(samples)),
+                                 reference)
+    times = np.array([frame_time(i) for i in range(len(values))])
+    per_beat = beat_chroma(values, times, bounds)
+    beat_loudness = beat_chroma(volume[:, None].astype(np.float64), times,
+                                bounds)[:, 0]
+    similarity = self_similarity(per_beat)
+    starts = section_bounds(novelty(similarity))
+    sections = list(zip(starts[:-1], starts[1:]))
+    names = section_names(sections, similarity, beat_loudness)
+    return {'sections': [(float(bounds[a]), float(bounds[b]), name)
+                         for (a, b), name in zip(sections, names)]}
+
+
+def library_song(cache, song_id, uri, min_consistency):
+    """
+    Put the tuning and sections of a song in `cache`, a
+    `looper_cache.AnalysisCache`, as not used yet: 'tuning' is [cents,
+    consistency] or None, 'sections' [[start, end, name], ...]. Sections
+    are found relative to the tuning if its peaks agree `min_consistency`
+    at least. 'library' marks the song done, even if it couldn't be
+    decoded.
+    """
+    # Whatever goes wrong, the song is done with: the library is walked
+    # unattended
+    results = {}
+    try:
+        tuning = song_tuning(uri)
+        reference = 440.0
+        if tuning is not None:
+            tuning = list(tuning)
+            if tuning[1] >= min_consistency:
+                reference = 440.0 * 2 ** (tuning[0] / 1200.0)
+        sections = song_sections(uri, reference)['sections']
+        results = {'tuning': tuning,
+                   'sections': [list(section) for section in sections]}
+    except Exception as e:
+        sys.stderr.write('Analysis of %s failed: %s\n' % (uri, e))
+    results['library'] = True
+    cache.update(song_id, uri, results, used=False)
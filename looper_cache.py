@@ -0,0 +1,289 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Data derived from songs, kept on disk so it's computed once.
+
+A `Store` is a directory of files named by key, `song_key` making keys of
+what the data depends on: the song, its file's modification time (so an
+edited file gets new keys) and the parameters of the computation. Files
+are written to a temporary file renamed into place, so readers (in other
+processes too) see a whole file or none. Arrays are read memory mapped.
+
+A file's modification time is its last use: reads touch it, and once the
+files outgrow the budget the least recently used are deleted, by one
+process at a time. A file deleted while being read stays readable until
+closed.
+"""
+
+import os
+import sys
+import json
+import time
+import mmap
+import fcntl
+import hashlib
+import tempfile
+import threading
+
+try:
+    from urllib.parse import unquote, urlparse
+except ImportError:
+    from urllib import unquote
+    from urlparse import urlparse
+
+
+def file_mtime(uri):
+    """Modification time of the file at a file:// `uri`, 0 for others."""
+    if not uri or not uri.startswith('file://'):
+        return 0
+    try:
+        return int(os.stat(unquote(urlparse(uri).path)).st_mtime)
+    except OSError:
+        return 0
+
+
+def song_key(song_id, uri, kind, params=None):
+    """
+    Key of `kind` data of a song, identified by `song_id` (by `uri` if
+    None), computed with `params` (anything JSON can encode).
+    """
+    identity = json.dumps([song_id or uri, file_mtime(uri), kind, params],
+                          sort_keys=True)
+    return hashlib.sha1(identity.encode('utf8')).hexdigest()
+
+
+class Store(object):
+    """
+    Files of data by key under `directory`, at most `budget` bytes of them
+    (no limit if None). Can be shared by threads, and by processes when
+    passed to them.
+    """
+
+    # Part of the budget kept by an eviction, so that not every write
+    # evicts.
+    LOW_WATER = 0.9
+
+    # Age (s) after which a temporary file is one left by a crash.
+    STALE = 3600
+
+    def __init__(self, directory, budget=None):
+        self.directory = directory
+        self.budget = budget
+        self.lock = threading.Lock()
+        # Bytes stored as far as this process knows, None until counted
+        # by `evict`.
+        self.size = None
+        self.evicting = False
+
+    def __getstate__(self):
+        return {'directory': self.directory, 'budget': self.budget}
+
+    def __setstate__(self, state):
+        self.__init__(state['directory'], state['budget'])
+
+    def path(self, key, extension):
+        return os.path.join(self.directory, key[:2], key + extension)
+
+    def find(self, key, extension):
+        """Path of the file of `key`, touched as used, or None."""
+        path = self.path(key, extension)
+        try:
+            os.utime(path, None)
+        except OSError:
+            return None
+        return path
+
+    def has(self, key, extension='.json'):
+        """Whether `key` is stored, without counting as a use."""
+        return os.path.isfile(self.path(key, extension))
+
+    def remove(self, key, extension='.json'):
+        try:
+            os.remove(self.path(key, extension))
+        except OSError:
+            pass
+
+    def write(self, key, extension, save, used=True):
+        """
+        Store the file of `key`, written by `save(file)`. Files not `used`
+        (computed ahead) are the first ones evicted.
+        """
+        path = self.path(key, extension)
+        directory = os.path.dirname(path)
+        try:
+            os.makedirs(directory)
+        except OSError:
+            # There already, or made meanwhile by another process
+            pass
+        fd, temporary = tempfile.mkstemp(prefix='.tmp-', dir=directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                save(f)
+            if not used:
+                os.utime(temporary, (0, 0))
+            os.rename(temporary, path)
+        except Exception:
+            os.remove(temporary)
+            raise
+        self.grow(os.path.getsize(path))
+
+    def get_json(self, key):
+        path = self.find(key, '.json')
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            try:
+                return json.loads(f.read().decode('utf8'))
+            except ValueError as e:
+                sys.stderr.write('Error on loading %s: %s\n' % (path, e))
+                return None
+
+    def put_json(self, key, value, used=True):
+        data = json.dumps(value).encode('utf8')
+        self.write(key, '.json', lambda f: f.write(data), used)
+
+    def get_array(self, key):
+        """NumPy array of `key`, memory mapped read only, or None."""
+        import numpy as np
+        path = self.find(key, '.npy')
+        if path is None:
+            return None
+        try:
+            return np.load(path, mmap_mode='r')
+        except (IOError, ValueError) as e:
+            sys.stderr.write('Error on loading %s: %s\n' % (path, e))
+            return None
+
+    def put_array(self, key, array, used=True):
+        import numpy as np
+        self.write(key, '.npy', lambda f: np.save(f, array), used)
+
+    def get_bytes(self, key):
+        """Bytes of `key`, memory mapped read only, or None."""
+        path = self.find(key, '.bin')
+        if path is None:
+            return None
+        with open(path, 'rb') as f:
+            if not os.fstat(f.fileno()).st_size:
+                return b''
+            return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def put_bytes(self, key, data, used=True):
+        self.write(key, '.bin', lambda f: f.write(data), used)
+
+    def grow(self, size):
+        """
+        Count `size` more bytes stored, evicting in the background when
+        over budget (or when not counted yet).
+        """
+        with self.lock:
+            if self.size is not None:
+                self.size += size
+            if self.evicting or self.budget is None or (
+                    self.size is not None and self.size <= self.budget):
+                return
+            self.evicting = True
+        thread = threading.Thread(target=self.evict)
+        thread.daemon = True
+        thread.start()
+
+    def set_budget(self, budget):
+        self.budget = budget
+        self.grow(0)
+
+    def evict(self):
+        """
+        Count the stored bytes, deleting the least recently used files
+        down to LOW_WATER of the budget when over it.
+        """
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory)
+            with open(os.path.join(self.directory, '.lock'), 'w') as lock:
+                # Else each process would delete as much
+                fcntl.flock(lock, fcntl.LOCK_EX)
+                files, total = self.scan()
+                budget = self.budget
+                if budget is not None and total > budget:
+                    for used, size, path in sorted(files):
+                        if total <= budget * self.LOW_WATER:
+                            break
+                        try:
+                            os.remove(path)
+                        except OSError:
+                            continue
+                        total -= size
+        except (IOError, OSError) as e:
+            sys.stderr.write('Error on evicting from %s: %s\n' % (
+                self.directory, e))
+            total = None
+        with self.lock:
+            self.size = total
+            self.evicting = False
+
+    def scan(self):
+        """
+        (last use, size, path) of every stored file and their total size,
+        deleting stale temporary files.
+        """
+        files, total = [], 0
+        now = time.time()
+        for directory, subdirectories, names in os.walk(self.directory):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    stat = os.stat(path)
+                    if not name.startswith('.'):
+                        files.append((stat.st_mtime, stat.st_size, path))
+                        total += stat.st_size
+                    elif (name.startswith('.tmp-') and
+                          now - stat.st_mtime > self.STALE):
+                        os.remove(path)
+                except OSError:
+                    continue
+        return files, total
+
+
+class AnalysisCache(object):
+    """
+    Analysis results (anything JSON can encode) of songs, given by song id
+    and playback uri, in a `Store`.
+    """
+
+    def __init__(self, store):
+        self.store = store
+
+    def key(self, song_id, uri, analysis):
+        return song_key(song_id, uri, 'analysis', analysis)
+
+    def get(self, song_id, uri, analysis):
+        return self.store.get_json(self.key(song_id, uri, analysis))
+
+    def has(self, song_id, uri, analysis):
+        """Whether there's a result, without counting as a use."""
+        return self.store.has(self.key(song_id, uri, analysis))
+
+    def put(self, song_id, uri, analysis, result, used=True):
+        """Results not `used` (analysed ahead) are the first ones evicted."""
+        self.store.put_json(self.key(song_id, uri, analysis), result, used)
+
+    def update(self, song_id, uri, results, used=True):
+        """`put` each of {analysis: result}."""
+        for analysis, result in results.items():
+            self.put(song_id, uri, analysis, result, used)
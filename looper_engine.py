@@ -0,0 +1,275 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Loop logic that knows nothing about GTK or Rhythmbox.
+
+The engine works on plain boundary and filter values. Whoever owns the
+player (the Rhythmbox plugin or the command line practice player) pushes
+values in when they change and calls `tick` with the elapsed time.
+
+Pushed values end up in an immutable `LoopState`, replaced as a whole on
+every change. `tick` reads the current state once, so it never sees half
+of an update even when called from another thread.
+"""
+
+import math
+import time
+from collections import namedtuple
+
+
+# Minimal allowed range in seconds.
+# (1 second is too small for meaningful sound)
+MIN_RANGE = 2
+
+# Tempo, pitch and rate presets in percent.
+PRESETS = [
+    ('x0.5', 50),
+    ('x0.6', 60),
+    ('x0.7', 70),
+    ('x0.75', 75),
+    ('x0.8', 80),
+    ('x0.9', 90),
+    ('x1.5', 150),
+    ('x2', 200),
+    ('reset', 100),
+]
+
+
+def seconds_to_time(seconds):
+    """Converts seconds to time format (MM:SS)."""
+    m, s = divmod(int(seconds), 60)
+    return "%02d:%02d" % (m, s)
+
+
+def time_to_seconds(value):
+    """Converts time format (MM:SS or plain seconds) to seconds."""
+    seconds = 0
+    for part in str(value).split(':'):
+        seconds = seconds * 60 + float(part)
+    return seconds
+
+
+def clamp_boundaries(start, end, moving, min_range, duration=None):
+    """
+    Dont let Start be greater than End or vice versa.
+
+    `moving` is 'start' or 'end', whichever boundary the user is moving.
+    Returns the corrected (start, end) pair.
+    """
+    if moving == 'start':
+        if start > end - min_range:
+            if duration and end >= duration:
+                start = end - min_range
+            else:
+                end = start + min_range
+    else:
+        if end < start + min_range:
+            if start == 0.0:
+                end = start + min_range
+            else:
+                start = end - min_range
+    return start, end
+
+
+class LoopState(namedtuple('LoopState', [
+        'start', 'end', 'tempo', 'pitch', 'rate', 'pitch_enabled',
+        'stream_start', 'stream_end'])):
+    """
+    Boundaries (song time) and filter values, with the boundaries in the
+    time of the played stream (`stream_start`, `stream_end`) worked out.
+    Use `make` or `update` rather than the constructor.
+    """
+
+    __slots__ = ()
+
+    @classmethod
+    def make(cls, start=0, end=0, tempo=100.0, pitch=100.0, rate=100.0,
+             pitch_enabled=False):
+        """
+        Tempo and rate change the speed of the stream, so the boundaries
+        set on the sliders (song time) have to be scaled.
+        """
+        stream_start = int(start)
+        stream_end = int(end)
+        if pitch_enabled:
+            speed = (tempo / 100) * (rate / 100)
+            stream_start = math.floor(stream_start / speed)
+            stream_end = math.ceil(stream_end / speed)
+        return cls(start, end, tempo, pitch, rate, pitch_enabled,
+                   stream_start, stream_end)
+
+    def update(self, **values):
+        """A new state with `values` changed."""
+        fields = dict(zip(self._fields[:6], self[:6]))
+        fields.update(values)
+        return self.make(**fields)
+
+
+class LoopEngine(object):
+    """
+    Keeps the playback between Start and End.
+
+    `seek` is a callable taking a relative offset in seconds. It is called
+    from `tick` whenever the position has to be moved back into the loop and
+    returns False if seeking failed.
+    `position` is a callable returning the precise position (s) of the
+    played stream, or None if unknown; without it `tick`'s elapsed time is
+    used, which Rhythmbox gives in whole seconds.
+    Tempo, pitch and rate are percentages, as shown on the sliders.
+    `telemetry` is a looper_telemetry.Telemetry, or None when disabled.
+    With telemetry, a seek is pending until the owner reports a position
+    back in the loop through `seek_done`, e.g. on ASYNC_DONE.
+    """
+
+    # Time (s) after which a pending seek is given up on.
+    SEEK_TIMEOUT = 2.0
+
+    def __init__(self, seek=None, position=None):
+        self.seek = seek
+        self.position = position
+        self.telemetry = None
+        # (wall time the boundary was crossed, start, end) of the seek
+        # being measured
+        self.pending_seek = None
+        self.duration = None
+        self.min_range = MIN_RANGE
+        self.state = LoopState.make()
+
+    @property
+    def start(self):
+        return self.state.start
+
+    @property
+    def end(self):
+        return self.state.end
+
+    @property
+    def tempo(self):
+        return self.state.tempo
+
+    @property
+    def pitch(self):
+        return self.state.pitch
+
+    @property
+    def rate(self):
+        return self.state.rate
+
+    @property
+    def pitch_enabled(self):
+        return self.state.pitch_enabled
+
+    @property
+    def transposition(self):
+        """Semitones the pitch filter moves the song by (pitch and rate)."""
+        state = self.state
+        if not state.pitch_enabled:
+            return 0.0
+        return 12 * math.log((state.pitch / 100) * (state.rate / 100), 2)
+
+    def clamp(self, start, end, moving):
+        return clamp_boundaries(start, end, moving, self.min_range,
+                                self.duration)
+
+    def set_boundaries(self, start, end):
+        if (start, end) != (self.state.start, self.state.end):
+            self.state = self.state.update(start=start, end=end)
+
+    def set_filter(self, tempo=None, pitch=None, rate=None, enabled=None):
+        values = {}
+        if tempo is not None:
+            values['tempo'] = float(tempo)
+        if pitch is not None:
+            values['pitch'] = float(pitch)
+        if rate is not None:
+            values['rate'] = float(rate)
+        if enabled is not None:
+            values['pitch_enabled'] = enabled
+        if values:
+            self.state = self.state.update(**values)
+
+    def boundaries(self):
+        """Start and End in the time of the played stream."""
+        state = self.state
+        return state.stream_start, state.stream_end
+
+    def seek_offset(self, elapsed, start, end):
+        """Relative seek needed to bring `elapsed` inside the loop."""
+        if elapsed < start:
+            # current time is bellow Start so fast forward
+            return start - elapsed
+        elif elapsed >= end:
+            # current time is above End so rewind
+            return start - elapsed
+        # current position is within boundaries, so chill
+        return False
+
+    def tick(self, elapsed):
+        """
+        Called periodically with the elapsed time of the playing stream.
+        Seeks if needed and returns the (start, end) boundaries used.
+        """
+        state = self.state
+        start, end = state.stream_start, state.stream_end
+        telemetry = self.telemetry
+        if telemetry is not None:
+            telemetry.tick(elapsed)
+        seek_time = self.seek_offset(elapsed, start, end)
+        # Sometimes song change event interferes with seeking. Therefore
+        # dont do anything if elapsed time is 0 (less than 1).
+        if seek_time and elapsed > 0 and self.seek:
+            if telemetry is None:
+                self.seek(seek_time)
+            else:
+                position = self.position() if self.position else None
+                if position is None:
+                    position = elapsed
+                # Stream time runs at wall speed: the boundary was crossed
+                # as long ago as the position is past it
+                crossed = time.time() - max(position - end, 0)
+                ok = self.seek(seek_time) is not False
+                telemetry.seek(ok)
+                self.pending_seek = (crossed, start, end) if ok else None
+        elif self.pending_seek is not None:
+            position = self.position() if self.position else None
+            self.seek_done(elapsed if position is None else position)
+        return start, end
+
+    @property
+    def seek_pending(self):
+        return self.pending_seek is not None
+
+    def seek_done(self, position):
+        """
+        Report the stream at `position` (s) after a seek: once inside the
+        loop, the time since the boundary was crossed is recorded as the
+        seek latency. Returns whether the seek is still pending.
+        """
+        pending, telemetry = self.pending_seek, self.telemetry
+        if pending is None or telemetry is None:
+            self.pending_seek = None
+            return False
+        crossed, start, end = pending
+        now = time.time()
+        if position is not None and start <= position < end:
+            telemetry.seek_done(now - crossed)
+            self.pending_seek = None
+        elif now - crossed > self.SEEK_TIMEOUT:
+            self.pending_seek = None
+        return self.pending_seek is not None
@@ -0,0 +1,171 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Isolation of an instrument, to hear the part being transcribed.
+
+A filter bank in one bin: an equalizer boosting or cutting a few bands, a
+high-pass and a low-pass filter bounding the instrument's range, and a
+balance toward the side it's panned to. Presets per instrument set them
+all. A preset is switched by ramping the properties to their new values,
+so the bin stays linked in the player and nothing clicks. Once off, the
+filters are put in passthrough, so the audio goes through untouched.
+"""
+
+import math
+
+from gi.repository import GLib, Gst
+
+
+# Centers (Hz) of the equalizer bands, and their width in octaves.
+BANDS = (100, 400, 1600, 6400)
+OCTAVES = 2.0
+
+# Cut-offs (Hz) of the high-pass and low-pass filters when they're off.
+LOWEST = 20
+HIGHEST = 20000
+
+# Preset: (name, label, equalizer gains (dB), high-pass and low-pass
+# cut-offs (Hz), balance from -1 (left) to 1 (right)).
+PRESETS = (
+    ('off', 'No isolation', (0, 0, 0, 0), LOWEST, HIGHEST, 0.0),
+    ('bass', 'Bass', (6, 0, -12, -24), 30, 500, 0.0),
+    ('guitar', 'Guitar', (-12, 3, 3, -6), 80, 5000, 0.0),
+    ('guitar-left', 'Guitar (left)', (-12, 3, 3, -6), 80, 5000, -0.7),
+    ('guitar-right', 'Guitar (right)', (-12, 3, 3, -6), 80, 5000, 0.7),
+    ('keys', 'Keys', (-6, 3, 3, -6), 60, 6000, 0.0),
+    ('vocals', 'Vocals', (-18, 3, 6, 0), 100, 8000, 0.0),
+    ('drums', 'Drums', (3, -9, -3, 6), 30, HIGHEST, 0.0),
+)
+
+PRESET_NAMES = [preset[0] for preset in PRESETS]
+
+
+def preset_values(name):
+    """Values to ramp of preset `name`: gains, cut-offs and balance."""
+    for preset in PRESETS:
+        if preset[0] == name:
+            gains, highpass, lowpass, balance = preset[2:]
+            return list(gains) + [highpass, lowpass, balance]
+    raise KeyError(name)
+
+
+def interpolate(start, end, fraction):
+    """
+    Values `fraction` of the way from `start` to `end`: the gains and
+    balance evenly, the cut-offs evenly in pitch.
+    """
+    values = [a + (b - a) * fraction for a, b in zip(start, end)]
+    for index in (len(BANDS), len(BANDS) + 1):
+        a, b = start[index], end[index]
+        values[index] = a * math.pow(b / float(a), fraction)
+    return values
+
+
+class IsolationFilter(object):
+    """
+    Presets of the filter bin `element`, which starts off, bypassed. Made
+    by `make`, None when an element is missing.
+    """
+
+    # Duration (ms) of a switch between presets, and of each step.
+    RAMP = 200
+    STEP = 10
+
+    def __init__(self, element):
+        self.element = element
+        self.equalizer = element.get_by_name('equalizer')
+        self.highpass = element.get_by_name('highpass')
+        self.lowpass = element.get_by_name('lowpass')
+        self.balance = element.get_by_name('balance')
+        self.preset = 'off'
+        self.values = preset_values('off')
+        self.start = self.target = self.values
+        self.steps = 0
+        self.ramp_id = None
+        self.bypassed = False
+        for index, freq in enumerate(BANDS):
+            band = self.equalizer.get_child_by_index(index)
+            band.set_property('freq', float(freq))
+            band.set_property('bandwidth', freq * (2 ** (OCTAVES / 2) -
+                                                   2 ** (-OCTAVES / 2)))
+        self.apply(self.values)
+        self.set_bypassed(True)
+
+    @classmethod
+    def make(cls):
+        try:
+            element = Gst.parse_bin_from_description(
+                # Stereo throughout, as audiopanorama outputs, so it can
+                # pass buffers through when bypassed
+                'audioconvert ! audio/x-raw,channels=2 ! '
+                'equalizer-nbands name=equalizer num-bands=%d ! '
+                'audiocheblimit name=highpass mode=high-pass poles=4 ! '
+                'audiocheblimit name=lowpass mode=low-pass poles=4 ! '
+                'audiopanorama name=balance method=simple ! audioconvert'
+                % len(BANDS), True)
+        except GLib.Error:
+            return None
+        element.set_name('isolation')
+        return cls(element)
+
+    def set_preset(self, name):
+        """Ramp to preset `name` from where the filters are."""
+        if name != 'off':
+            self.set_bypassed(False)
+        self.preset = name
+        self.start = self.values
+        self.target = preset_values(name)
+        self.steps = 0
+        if self.ramp_id is None:
+            self.ramp_id = GLib.timeout_add(self.STEP, self.on_step)
+
+    def on_step(self):
+        self.steps += 1
+        fraction = min(self.steps * self.STEP / float(self.RAMP), 1.0)
+        self.apply(interpolate(self.start, self.target, fraction))
+        if fraction < 1:
+            return True
+        self.ramp_id = None
+        if self.preset == 'off':
+            self.set_bypassed(True)
+        return False
+
+    def set_bypassed(self, bypassed):
+        """Pass the audio through the filters untouched, or filter it."""
+        if bypassed == self.bypassed:
+            return
+        self.bypassed = bypassed
+        for element in (self.equalizer, self.highpass, self.lowpass,
+                        self.balance):
+            element.set_passthrough(bypassed)
+
+    def apply(self, values):
+        self.values = values
+        for index in range(len(BANDS)):
+            self.equalizer.get_child_by_index(index).set_property(
+                'gain', float(values[index]))
+        highpass, lowpass, balance = values[len(BANDS):]
+        self.highpass.set_property('cutoff', float(highpass))
+        self.lowpass.set_property('cutoff', float(lowpass))
+        self.balance.set_property('panorama', float(balance))
+
+    def destroy(self):
+        if self.ramp_id is not None:
+            GLib.source_remove(self.ramp_id)
+            self.ramp_id = None
@@ -0,0 +1,178 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Analysis of the whole library, ahead of playing.
+
+`LibraryAnalyser` feeds the library's songs to a pool of low priority
+processes running `looper_analysis.library_song`, which put the results in
+the analysis cache themselves. Songs already there are skipped, so a run
+interrupted by quitting Rhythmbox resumes where it stopped.
+
+While the main loop runs late (Rhythmbox is busy, e.g. loading the library
+or importing) no new song is started. A song that fails is skipped, and one
+taking too long has its pool replaced.
+"""
+
+import sys
+import time
+import functools
+import multiprocessing
+from collections import deque
+
+from gi.repository import GLib
+
+from looper_analysis import library_song
+from looper_analysis import use_store
+from looper_tasks import lower_priority
+from looper_tasks import process_context
+
+
+def initializer():
+    """Set up a process of the pool."""
+    lower_priority()
+    # Songs are decoded once: storing them would only evict what's used
+    use_store(None)
+
+
+class LibraryAnalyser(object):
+    """
+    Analyses `songs`, a list of (song id, uri) in the order wanted, in the
+    background, into `cache`, a `looper_cache.AnalysisCache`. Whether a
+    song is done is checked just before it starts.
+    """
+
+    # Heartbeat interval (ms), how late (ms) it may be dispatched before
+    # Rhythmbox counts as busy, and how long (s) to pause then.
+    INTERVAL = 500
+    BUSY_LATENESS = 100
+    BUSY_PAUSE = 10
+
+    # Songs a process analyses before it is replaced, releasing what it
+    # kept in memory.
+    SONGS_PER_PROCESS = 20
+
+    # Time (s) a song may take before its process counts as stuck.
+    SONG_TIMEOUT = 600
+
+    def __init__(self, songs, cache, min_consistency, processes=None):
+        self.queue = deque(songs)
+        self.total = len(self.queue)
+        self.cache = cache
+        self.min_consistency = min_consistency
+        self.processes = processes or max(multiprocessing.cpu_count() // 2,
+                                          1)
+        # (start time, uri) of each running song, by song id
+        self.running = {}
+        self.pool = None
+        self.beat_id = None
+        self.last_beat = None
+        self.busy_until = 0
+
+    def start(self):
+        if self.pool is not None:
+            return
+        self.pool = self.make_pool()
+        self.last_beat = time.time()
+        self.beat_id = GLib.timeout_add(self.INTERVAL, self.beat)
+        self.fill()
+
+    def make_pool(self):
+        return process_context().Pool(self.processes, initializer,
+                                      maxtasksperchild=self.SONGS_PER_PROCESS)
+
+    def stop(self):
+        if self.pool is None:
+            return
+        GLib.source_remove(self.beat_id)
+        self.beat_id = None
+        self.pool.terminate()
+        self.pool = None
+        self.running.clear()
+
+    @property
+    def finished(self):
+        return not self.queue and not self.running
+
+    def beat(self):
+        now = time.time()
+        late = (now - self.last_beat) * 1000 - self.INTERVAL
+        self.last_beat = now
+        if late >= self.BUSY_LATENESS:
+            self.busy_until = now + self.BUSY_PAUSE
+        stuck = [song_id for song_id, (started, uri) in self.running.items()
+                 if now - started > self.SONG_TIMEOUT]
+        if stuck:
+            self.restart(stuck)
+        self.fill()
+        if self.finished:
+            self.stop()
+            return False
+        return True
+
+    def fill(self):
+        """Start songs until every process has one, unless busy."""
+        if self.pool is None or time.time() < self.busy_until:
+            return
+        while self.queue and len(self.running) < self.processes:
+            song_id, uri = self.queue.popleft()
+            if self.cache.has(song_id, uri, 'library'):
+                continue
+            self.running[song_id] = (time.time(), uri)
+            kwargs = {}
+            if sys.version_info[0] >= 3:
+                kwargs['error_callback'] = functools.partial(self.on_error,
+                                                             song_id, uri)
+            self.pool.apply_async(
+                library_song, (self.cache, song_id, uri, self.min_consistency),
+                callback=functools.partial(self.on_done, song_id), **kwargs)
+
+    def restart(self, stuck):
+        """
+        Replace the pool, whose processes `stuck` songs hold, starting the
+        other songs running again.
+        """
+        for song_id in stuck:
+            sys.stderr.write('Analysis of %s timed out\n' %
+                             self.running[song_id][1])
+        self.pool.terminate()
+        self.pool = self.make_pool()
+        for song_id, (started, uri) in self.running.items():
+            if song_id not in stuck:
+                self.queue.appendleft((song_id, uri))
+        self.running.clear()
+
+    def on_done(self, song_id, result):
+        """Called from the pool's result thread."""
+        GLib.idle_add(self.deliver, song_id)
+
+    def on_error(self, song_id, uri, error):
+        """Called from the pool's result thread: the song is skipped."""
+        sys.stderr.write('Analysis of %s failed: %s\n' % (uri, error))
+        GLib.idle_add(self.deliver, song_id)
+
+    def deliver(self, song_id):
+        if self.pool is None or song_id not in self.running:
+            return False
+        del self.running[song_id]
+        self.fill()
+        return False
+
+    def progress(self):
+        """Songs done (analysed or skipped) and in total."""
+        return self.total - len(self.queue) - len(self.running), self.total
@@ -0,0 +1,83 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Standard MIDI files of transcribed notes.
+"""
+
+import struct
+
+
+# Ticks per quarter note, and the tempo (microseconds per quarter note):
+# 120 bpm, so a second is 960 ticks whatever the song's tempo.
+TICKS = 480
+TEMPO = 500000
+
+
+def variable_length(value):
+    """`value` as a MIDI variable length quantity."""
+    data = bytearray([value & 0x7f])
+    value >>= 7
+    while value:
+        data.insert(0, 0x80 | (value & 0x7f))
+        value >>= 7
+    return data
+
+
+def seconds_to_ticks(seconds):
+    return int(round(seconds * 1e6 / TEMPO * TICKS))
+
+
+def midi_file(notes, name='', channel=0):
+    """
+    Format 0 MIDI file (bytes) of `notes`: (start, end, MIDI note,
+    velocity), times in seconds from the start of the file.
+    """
+    events = []
+    for start, end, note, velocity in notes:
+        note = min(max(int(note), 0), 127)
+        start, end = seconds_to_ticks(start), seconds_to_ticks(end)
+        # At the same tick, a note ends before the next one starts
+        events.append((start, 1, 0x90 | channel, note, velocity))
+        events.append((max(end, start + 1), 0, 0x80 | channel, note, 0))
+    events.sort()
+
+    track = bytearray()
+    if name:
+        name = name.encode('utf8')
+        track += bytearray([0, 0xff, 0x03]) + variable_length(len(name))
+        track += bytearray(name)
+    track += bytearray([0, 0xff, 0x51, 3]) + bytearray(
+        struct.pack('>I', TEMPO)[1:])
+    now = 0
+    for tick, order, status, note, velocity in events:
+        track += variable_length(tick - now)
+        track += bytearray([status, note, velocity])
+        now = tick
+    track += bytearray([0, 0xff, 0x2f, 0])
+
+    return bytes(bytearray(b'MThd') + bytearray(struct.pack('>IHHH', 6, 0, 1,
+                                                            TICKS)) +
+                 bytearray(b'MTrk') + bytearray(struct.pack('>I', len(track)))
+                 + track)
+
+
+def write_midi_file(path, notes, name=''):
+    """Write `midi_file` of `notes` to `path`."""
+    with open(path, 'wb') as f:
+        f.write(midi_file(notes, name))
@@ -0,0 +1,238 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Pitch detection for the Tuner.
+
+`yin` estimates the fundamental of one frame with the YIN algorithm, the
+difference function computed from an FFT autocorrelation so a frame costs
+a couple of FFTs. `Listener` captures audio with GStreamer and runs `yin`
+on overlapping frames in the streaming thread; only the latest result is
+handed to the main loop, at most once per idle.
+
+The input is the default microphone, or for testing any GStreamer source
+description or a sound file (see `source_description`).
+"""
+
+import os
+import math
+import threading
+
+import numpy as np
+from gi.repository import GLib, Gst
+
+
+# Index of A4 in the tuner's notes table, which starts at C1.
+A4_INDEX = 45
+
+
+def yin(frame, rate, fmin=40.0, fmax=2000.0, threshold=0.15, silence=1e-3):
+    """
+    Fundamental frequency of `frame` in Hz, or None when the frame is
+    silent or has no clear period. The frame must hold at least two
+    periods of `fmin`.
+    """
+    freq = yin_frames(np.asarray(frame)[None, :], rate, fmin, fmax,
+                      threshold, silence)[0]
+    return None if np.isnan(freq) else float(freq)
+
+
+def yin_frames(frames, rate, fmin=40.0, fmax=2000.0, threshold=0.15,
+               silence=1e-3):
+    """
+    `yin` of each row of `frames` at once, NaN where there's no pitch.
+    """
+    frames = np.asarray(frames, dtype=np.float64)
+    count, length = frames.shape
+    freqs = np.empty(count)
+    freqs.fill(np.nan)
+    window = length // 2
+    tau_min = max(int(rate / fmax), 2)
+    tau_max = min(int(rate / fmin), window - 1)
+    if tau_max <= tau_min:
+        return freqs
+
+    # d(tau) = sum((x[j] - x[j + tau]) ** 2 for j < window)
+    #        = energy of x[:window] + energy of x[tau:tau + window]
+    #          - 2 * autocorrelation(tau)
+    size = 1 << int(math.ceil(math.log(length + window, 2)))
+    spectrum = np.fft.rfft(frames, size, axis=1)
+    head = np.fft.rfft(frames[:, :window], size, axis=1)
+    acf = np.fft.irfft(spectrum * np.conj(head), size,
+                       axis=1)[:, :tau_max + 2]
+    energy = np.concatenate((np.zeros((count, 1)),
+                             np.cumsum(frames ** 2, axis=1)), axis=1)
+    taus = np.arange(tau_max + 2)
+    diff = (energy[:, window:window + 1] + energy[:, taus + window] -
+            energy[:, taus] - 2 * acf)
+
+    # Cumulative mean normalized difference
+    cmnd = np.ones_like(diff)
+    running = np.cumsum(diff[:, 1:], axis=1)
+    cmnd[:, 1:] = diff[:, 1:] * taus[1:] / np.where(running > 0, running, 1)
+
+    # First dip under the threshold, followed down to its minimum
+    below = cmnd[:, tau_min:tau_max] < threshold
+    loud = np.sqrt(np.mean(frames ** 2, axis=1)) >= silence
+    found = np.nonzero(below.any(axis=1) & loud)[0]
+    if not len(found):
+        return freqs
+    first = tau_min + np.argmax(below[found], axis=1)
+    rising = cmnd[found, 1:tau_max] >= cmnd[found, :tau_max - 1]
+    rising[:, -1] = True
+    rising &= taus[None, :tau_max - 1] >= first[:, None]
+    tau = np.argmax(rising, axis=1)
+
+    # Parabolic interpolation between the neighbours
+    before, here, after = (diff[found, tau - 1], diff[found, tau],
+                           diff[found, tau + 1])
+    curve = before - 2 * here + after
+    shift = np.where(curve > 0, 0.5 * (before - after) /
+                     np.where(curve > 0, curve, 1), 0)
+    freqs[found] = rate / (tau + shift)
+    return freqs
+
+
+def note_index(freq, reference=440.0):
+    """
+    Position of `freq` in the notes table (C1 is 0) as a float, with A4 at
+    `reference` Hz. The nearest note is its rounded value, the deviation
+    in cents is 100 times the rest.
+    """
+    return A4_INDEX + 12 * math.log(freq / reference, 2)
+
+
+def source_description(source):
+    """
+    GStreamer description of the capture source: the default input for an
+    empty `source`, a decoded file for a path, else `source` itself (e.g.
+    'audiotestsrc wave=sine freq=110 is-live=true').
+    """
+    if not source:
+        return 'autoaudiosrc'
+    if os.path.isfile(source):
+        return 'filesrc location="%s" ! decodebin' % source.replace('"', '\\"')
+    return source
+
+
+class Listener(object):
+    """
+    Pitch of what the input hears. `callback(freq)` is called from the
+    main loop with the latest estimate (None for no pitch), at most
+    RATE / HOP times a second; `on_error(message)` if capture fails.
+    """
+
+    RATE = 16000
+
+    # Analysed frame (128 ms, two periods of 16 Hz) and hop between
+    # frames (25 ms, 40 updates a second).
+    FRAME = 2048
+    HOP = 400
+
+    def __init__(self, callback, source='', on_error=None):
+        self.callback = callback
+        self.on_error = on_error
+        self.source = source
+        self.pipeline = None
+        self.lock = threading.Lock()
+        self.result = None
+        self.deliver_id = None
+
+    def start(self):
+        if self.pipeline is not None:
+            return
+        Gst.init_check(None)
+        self.samples = np.zeros(self.FRAME, dtype=np.float32)
+        self.pending = 0
+        self.pipeline = Gst.parse_launch(
+            '%s ! queue ! audioconvert ! audioresample ! '
+            'audio/x-raw,format=F32LE,channels=1,rate=%d ! '
+            'appsink name=sink emit-signals=true max-buffers=8 drop=true'
+            % (source_description(self.source), self.RATE))
+        self.sink = self.pipeline.get_by_name('sink')
+        self.new_sample_sigid = self.sink.connect('new-sample',
+                                                  self.on_new_sample)
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        self.error_sigid = bus.connect('message::error', self.on_bus_error)
+        self.eos_sigid = bus.connect('message::eos', self.on_eos)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def stop(self):
+        if self.pipeline is None:
+            return
+        self.pipeline.set_state(Gst.State.NULL)
+        self.sink.disconnect(self.new_sample_sigid)
+        bus = self.pipeline.get_bus()
+        bus.disconnect(self.error_sigid)
+        bus.disconnect(self.eos_sigid)
+        bus.remove_signal_watch()
+        with self.lock:
+            if self.deliver_id is not None:
+                GLib.source_remove(self.deliver_id)
+                self.deliver_id = None
+        self.pipeline = None
+        self.sink = None
+
+    def on_new_sample(self, sink):
+        """Analyse the new samples. Called from the streaming thread."""
+        sample = sink.emit('pull-sample')
+        buf = sample.get_buffer()
+        ok, info = buf.map(Gst.MapFlags.READ)
+        if not ok:
+            return Gst.FlowReturn.OK
+        try:
+            incoming = np.frombuffer(info.data, dtype='<f4').copy()
+        finally:
+            buf.unmap(info)
+
+        # Slide the frame, analysing once per HOP samples
+        while len(incoming):
+            take = min(self.HOP - self.pending, len(incoming))
+            self.samples = np.roll(self.samples, -take)
+            self.samples[-take:] = incoming[:take]
+            incoming = incoming[take:]
+            self.pending += take
+            if self.pending == self.HOP:
+                self.pending = 0
+                self.publish(yin(self.samples, self.RATE))
+        return Gst.FlowReturn.OK
+
+    def publish(self, freq):
+        """Hand `freq` to the main loop, replacing an undelivered one."""
+        with self.lock:
+            self.result = freq
+            if self.deliver_id is None and self.pipeline is not None:
+                self.deliver_id = GLib.idle_add(self.deliver)
+
+    def deliver(self):
+        with self.lock:
+            self.deliver_id = None
+            freq = self.result
+        self.callback(freq)
+        return False
+
+    def on_bus_error(self, bus, message):
+        error, debug = message.parse_error()
+        self.stop()
+        if self.on_error is not None:
+            self.on_error(error.message)
+
+    def on_eos(self, bus, message):
+        """A test file ended: start over."""
+        self.pipeline.seek_simple(Gst.Format.TIME, Gst.SeekFlags.FLUSH, 0)
@@ -0,0 +1,192 @@
+#!/usr/bin/env python
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Command line practice player.
+
+Loops part of a file with the Looper engine, without Rhythmbox:
+
+    ./looper_practice.py song.mp3 --start 01:10 --end 01:25 --tempo 75
+"""
+
+import os
+import sys
+import argparse
+
+import gi
+gi.require_version('Gst', '1.0')
+from gi.repository import GLib, Gst
+
+from looper_engine import LoopEngine
+from looper_engine import seconds_to_time
+from looper_engine import time_to_seconds
+
+
+class PracticePlayer(object):
+    """
+    Plays a file through a playbin, with the soundtouch `pitch` element as
+    the audio filter, and keeps it inside the engine's loop.
+    """
+
+    # How often (ms) the position is checked. Rhythmbox does it once a
+    # second with `elapsed-changed`; we can afford to be more precise.
+    POLL_INTERVAL = 50
+
+    def __init__(self, uri, engine, audio_sink=None):
+        self.engine = engine
+        self.engine.seek = self.seek
+        self.engine.position = self.position
+        self.loop = GLib.MainLoop()
+
+        self.playbin = Gst.ElementFactory.make('playbin', None)
+        self.playbin.set_property('uri', uri)
+        if audio_sink is not None:
+            self.playbin.set_property('audio-sink', audio_sink)
+
+        self.gst_pitch = None
+        if engine.pitch_enabled:
+            self.gst_pitch = Gst.ElementFactory.make('pitch', None)
+            if self.gst_pitch:
+                self.gst_pitch.set_property('tempo', engine.tempo / 100)
+                self.gst_pitch.set_property('pitch', engine.pitch / 100)
+                self.gst_pitch.set_property('rate', engine.rate / 100)
+                self.playbin.set_property('audio-filter', self.gst_pitch)
+            else:
+                sys.stderr.write('pitch missing, playing at normal speed\n')
+                engine.set_filter(enabled=False)
+
+        self.bus = self.playbin.get_bus()
+        self.bus.add_signal_watch()
+        self.bus_sigids = [
+            self.bus.connect('message::eos', self.on_eos),
+            self.bus.connect('message::error', self.on_error),
+            self.bus.connect('message::async-done', self.on_async_done)]
+
+    def run(self):
+        self.playbin.set_state(Gst.State.PLAYING)
+        self.poll_id = GLib.timeout_add(self.POLL_INTERVAL, self.on_poll)
+        try:
+            self.loop.run()
+        except KeyboardInterrupt:
+            pass
+        GLib.source_remove(self.poll_id)
+        for sigid in self.bus_sigids:
+            self.bus.disconnect(sigid)
+        self.bus.remove_signal_watch()
+        self.playbin.set_state(Gst.State.NULL)
+
+    def position(self):
+        ok, position = self.playbin.query_position(Gst.Format.TIME)
+        if not ok:
+            return None
+        return position / Gst.SECOND
+
+    def seek(self, seek_time):
+        position = self.position()
+        if position is None:
+            return False
+        target = max(position + seek_time, 0)
+        flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+        if not self.playbin.seek_simple(Gst.Format.TIME, flags,
+                                        int(target * Gst.SECOND)):
+            sys.stderr.write('Seek to ' + str(seek_time) + 's failed\n')
+            return False
+        return True
+
+    def on_async_done(self, bus, message):
+        # A flushing seek is done once prerolled again
+        if self.engine.seek_pending:
+            self.engine.seek_done(self.position())
+        # Duration is known once prerolled.
+        if self.engine.duration is None:
+            ok, duration = self.playbin.query_duration(Gst.Format.TIME)
+            if ok:
+                self.engine.duration = duration / Gst.SECOND
+                if self.engine.end > self.engine.duration:
+                    self.engine.set_boundaries(self.engine.start,
+                                               self.engine.duration)
+
+    def on_poll(self):
+        elapsed = self.position()
+        if elapsed is not None:
+            start, end = self.engine.tick(elapsed)
+            sys.stdout.write('\r[%s - %s] %s ' % (
+                seconds_to_time(start), seconds_to_time(end),
+                seconds_to_time(elapsed)))
+            sys.stdout.flush()
+        return True
+
+    def on_eos(self, bus, message):
+        # The poll can miss End when it's at the song's end (no --end, or
+        # rounded up by tempo and rate scaling): wrap here instead
+        start, end = self.engine.boundaries()
+        flags = Gst.SeekFlags.FLUSH | Gst.SeekFlags.ACCURATE
+        if not self.playbin.seek_simple(Gst.Format.TIME, flags,
+                                        int(start * Gst.SECOND)):
+            sys.stderr.write('Seek to ' + str(start) + 's failed\n')
+            self.loop.quit()
+
+    def on_error(self, bus, message):
+        error, debug = message.parse_error()
+        sys.stderr.write('Error: %s\n' % error.message)
+        self.loop.quit()
+
+
+def parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Loop part of a song for practice.')
+    parser.add_argument('file', help='audio file or URI')
+    parser.add_argument('-s', '--start', default='0',
+                        help='loop start (MM:SS or seconds)')
+    parser.add_argument('-e', '--end', default=None,
+                        help='loop end (MM:SS or seconds), default: song end')
+    parser.add_argument('-t', '--tempo', type=float, default=100,
+                        help='tempo in percent')
+    parser.add_argument('-p', '--pitch', type=float, default=100,
+                        help='pitch in percent')
+    parser.add_argument('-r', '--rate', type=float, default=100,
+                        help='rate in percent')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    Gst.init(None)
+
+    if Gst.uri_is_valid(args.file):
+        uri = args.file
+    else:
+        uri = Gst.filename_to_uri(os.path.abspath(args.file))
+
+    engine = LoopEngine()
+    start = time_to_seconds(args.start)
+    # Without an explicit End loop the whole song. It is corrected once
+    # the duration is known.
+    end = time_to_seconds(args.end) if args.end else sys.maxsize
+    engine.set_boundaries(*engine.clamp(start, end, 'end'))
+    filtered = (args.tempo, args.pitch, args.rate) != (100, 100, 100)
+    engine.set_filter(tempo=args.tempo, pitch=args.pitch, rate=args.rate,
+                      enabled=filtered)
+
+    PracticePlayer(uri, engine).run()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,201 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Profiling of the GStreamer elements Looper inserts into the player.
+
+Buffer probes on the sink and src pad of each element time how long the
+element works on a buffer: from a buffer entering the sink pad to the
+element pushing a buffer out of its src pad, in the same streaming thread.
+Elements that collect input before pushing (soundtouch `pitch`) get the
+time of the whole collected batch attributed to the buffer they push.
+
+Load is the processing time divided by the duration of the audio pushed;
+anything close to 100% can't keep up with real time and stutters.
+"""
+
+import json
+import time
+import threading
+
+from gi.repository import Gst
+
+from looper_telemetry import Histogram
+
+
+class ElementProfile(object):
+    def __init__(self, element):
+        factory = element.get_factory()
+        # Bins made from a description have no factory
+        self.name = factory.get_name() if factory else element.get_name()
+        self.processing = Histogram(self.name)
+        self.busy = 0.0
+        self.media = 0.0
+        self.buffers = 0
+        self.latency = 0.0
+        self.local = threading.local()
+
+    def reset(self):
+        self.processing.reset()
+        self.busy = 0.0
+        self.media = 0.0
+        self.buffers = 0
+
+    @property
+    def load(self):
+        if not self.media:
+            return 0.0
+        return 100 * self.busy / self.media
+
+    def as_dict(self):
+        return {
+            'processing_ms': self.processing.as_dict(),
+            'buffers': self.buffers,
+            'load_percent': self.load,
+            'latency_ms': self.latency,
+        }
+
+
+class FilterProfiler(object):
+    """Profiles a changing set of filter elements."""
+
+    def __init__(self):
+        self.profiles = {}
+        self.probes = {}
+        self.queues = {}
+        self.started = time.time()
+
+    def sync(self, elements):
+        """Profile exactly `elements`."""
+        for element in list(self.probes):
+            if element not in elements:
+                self.detach(element)
+        for element in elements:
+            if element not in self.probes:
+                self.attach(element)
+
+    def attach(self, element):
+        if element not in self.profiles:
+            self.profiles[element] = ElementProfile(element)
+        profile = self.profiles[element]
+        sink = element.get_static_pad('sink')
+        src = element.get_static_pad('src')
+        self.probes[element] = [
+            (sink, sink.add_probe(Gst.PadProbeType.BUFFER, self.on_sink,
+                                  profile)),
+            (src, src.add_probe(Gst.PadProbeType.BUFFER, self.on_src,
+                                profile)),
+        ]
+
+    def detach(self, element):
+        for pad, probe_id in self.probes.pop(element, []):
+            pad.remove_probe(probe_id)
+
+    def detach_all(self):
+        for element in list(self.probes):
+            self.detach(element)
+
+    def on_sink(self, pad, info, profile):
+        profile.local.entered = time.time()
+        return Gst.PadProbeReturn.OK
+
+    def on_src(self, pad, info, profile):
+        now = time.time()
+        entered = getattr(profile.local, 'entered', None)
+        if entered is not None:
+            spent = now - entered
+            profile.processing.record(spent * 1000)
+            profile.busy += spent
+            buf = info.get_buffer()
+            if buf.duration != Gst.CLOCK_TIME_NONE:
+                profile.media += buf.duration / Gst.SECOND
+            profile.buffers += 1
+            # Time after this push belongs to the next output buffer.
+            profile.local.entered = now
+        return Gst.PadProbeReturn.OK
+
+    def update(self):
+        """Query latencies and queue levels. Called from the main loop."""
+        for element, profile in self.profiles.items():
+            query = Gst.Query.new_latency()
+            if element in self.probes and element.query(query):
+                live, min_latency, max_latency = query.parse_latency()
+                profile.latency = min_latency / Gst.MSECOND
+        self.queues = {}
+        for element in self.probes:
+            pipeline = element
+            while pipeline.get_parent() is not None:
+                pipeline = pipeline.get_parent()
+            if not isinstance(pipeline, Gst.Bin):
+                continue
+            for child in iterate(pipeline.iterate_recurse()):
+                factory = child.get_factory()
+                if factory and factory.get_name() in ('queue', 'queue2'):
+                    self.queues[child.get_name()] = queue_fill(child)
+
+    def reset(self):
+        for profile in self.profiles.values():
+            profile.reset()
+        self.started = time.time()
+
+    def as_dict(self):
+        return {
+            'since': self.started,
+            'elements': dict((profile.name, profile.as_dict())
+                             for profile in self.profiles.values()),
+            'queues': self.queues,
+        }
+
+    def summary(self):
+        lines = []
+        for element, profile in self.profiles.items():
+            if element not in self.probes:
+                continue
+            lines.append(profile.processing.summary())
+            lines.append('%-15s load %5.1f%%  latency %6.1f ms  buffers %d' % (
+                '', profile.load, profile.latency, profile.buffers))
+        for name in sorted(self.queues):
+            lines.append('%-15s fill %5.1f%%' % (name, self.queues[name]))
+        if not lines:
+            lines.append('No Looper filters active')
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
+
+
+def iterate(iterator):
+    """Elements of a Gst.Iterator."""
+    while True:
+        result, value = iterator.next()
+        if result == Gst.IteratorResult.OK:
+            yield value
+        elif result == Gst.IteratorResult.RESYNC:
+            iterator.resync()
+        else:
+            break
+
+
+def queue_fill(queue):
+    """Fill level of a queue in percent of its time limit."""
+    level = queue.get_property('current-level-time')
+    limit = queue.get_property('max-size-time')
+    if not limit:
+        return 0.0
+    return 100.0 * level / limit
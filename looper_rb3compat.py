@@ -34,16 +34,25 @@ from gi.repository import RB
 import rb
 
 
+# The environment is detected once, at import; everything below is bound to
+# the implementation for it instead of checking on every call.
+
+PYVER = sys.version_info[0]
+
+# RB2.98 and earlier have a GtkUIManager, RB2.99+ use GActions.
+IS_RB3 = not hasattr(RB.Shell.props, 'ui_manager')
+
+_PYGOBJECT_VERSION = tuple(int(v) for v in GObject.pygobject_version)
+_PYGOBJECT_FLOAT = float('%d.%d' % _PYGOBJECT_VERSION[:2])
+_pygobject_comparisons = {}
+
+
 def pygobject_version():
-    ''' 
+    '''
     returns float of the major and minor parts of a pygobject version 
     e.g. version (3, 9, 5) return float(3.9)
     '''
-    to_number = lambda t: ".".join(str(v) for v in t)
-
-    str_version = to_number(GObject.pygobject_version)
-
-    return float(str_version.rsplit('.', 1)[0])
+    return _PYGOBJECT_FLOAT
 
 
 def compare_pygobject_version(version):
@@ -51,124 +60,75 @@ def compare_pygobject_version(version):
     return True if version is less than pygobject_version
     i.e. 3.9 < 3.11
     '''
-    to_number = lambda t: ".".join(str(v) for v in t)
+    try:
+        return _pygobject_comparisons[version]
+    except KeyError:
+        pass
 
-    str_version = to_number(GObject.pygobject_version)
-
-    split = str_version.rsplit('.', 2)
     split_compare = version.rsplit('.', 2)
-
-    if int(split_compare[0]) < int(split[0]):
-        return True
-
-    if int(split_compare[1]) < int(split[1]):
-        return True
-
-    return False
+    result = (int(split_compare[0]) < _PYGOBJECT_VERSION[0] or
+              int(split_compare[1]) < _PYGOBJECT_VERSION[1])
+    _pygobject_comparisons[version] = result
+    return result
 
 
-PYVER = sys.version_info[0]
-
 if PYVER >= 3:
     import urllib.request, urllib.parse, urllib.error
-else:
-    import urllib
-    from urlparse import urlparse as rb2urlparse
-
-if PYVER >= 3:
     import http.client
-else:
-    import httplib
-
 
-def responses():
-    if PYVER >= 3:
+    def responses():
         return http.client.responses
-    else:
-        return httplib.responses
 
-
-def unicodestr(param, charset):
-    if PYVER >= 3:
+    def unicodestr(param, charset):
         return param  #str(param, charset)
-    else:
-        return unicode(param, charset)
-
 
-def unicodeencode(param, charset):
-    if PYVER >= 3:
+    def unicodeencode(param, charset):
         return param  #str(param).encode(charset)
-    else:
-        return unicode(param).encode(charset)
 
-
-def unicodedecode(param, charset):
-    if PYVER >= 3:
+    def unicodedecode(param, charset):
         return param
-    else:
-        return param.decode(charset)
-
-
-def urlparse(uri):
-    if PYVER >= 3:
-        return urllib.parse.urlparse(uri)
-    else:
-        return rb2urlparse(uri)
-
-
-def url2pathname(url):
-    if PYVER >= 3:
-        return urllib.request.url2pathname(url)
-    else:
-        return urllib.url2pathname(url)
 
+    urlparse = urllib.parse.urlparse
+    url2pathname = urllib.request.url2pathname
+    urlopen = urllib.request.urlopen
+    pathname2url = urllib.request.pathname2url
+    unquote = urllib.parse.unquote
+    quote_plus = urllib.parse.quote_plus
+    _quote = urllib.parse.quote
+else:
+    import urllib
+    import httplib
+    from urlparse import urlparse
 
-def urlopen(filename):
-    if PYVER >= 3:
-        return urllib.request.urlopen(filename)
-    else:
-        return urllib.urlopen(filename)
+    def responses():
+        return httplib.responses
 
+    def unicodestr(param, charset):
+        return unicode(param, charset)
 
-def pathname2url(filename):
-    if PYVER >= 3:
-        return urllib.request.pathname2url(filename)
-    else:
-        return urllib.pathname2url(filename)
+    def unicodeencode(param, charset):
+        return unicode(param).encode(charset)
 
+    def unicodedecode(param, charset):
+        return param.decode(charset)
 
-def unquote(uri):
-    if PYVER >= 3:
-        return urllib.parse.unquote(uri)
-    else:
-        return urllib.unquote(uri)
+    url2pathname = urllib.url2pathname
+    urlopen = urllib.urlopen
+    pathname2url = urllib.pathname2url
+    unquote = urllib.unquote
+    quote_plus = urllib.quote_plus
+    _quote = urllib.quote
 
 
 def quote(uri, safe=None):
-    if PYVER >= 3:
-        if safe:
-            return urllib.parse.quote(uri, safe=safe)
-        else:
-            return urllib.parse.quote(uri)
-    else:
-        if safe:
-            return urllib.quote(uri, safe=safe)
-        else:
-            return urllib.quote(uri)
-
-
-def quote_plus(uri):
-    if PYVER >= 3:
-        return urllib.parse.quote_plus(uri)
+    if safe:
+        return _quote(uri, safe=safe)
     else:
-        return urllib.quote_plus(uri)
+        return _quote(uri)
 
 
 def is_rb3(*args):
-    if hasattr(RB.Shell.props, 'ui_manager'):
-        return False
-    else:
-        return True
+    return IS_RB3
 
 
 class Menu(GObject.Object):
@@ -210,7 +170,7 @@ class Menu(GObject.Object):
         '''
         label = action.label
 
-        if is_rb3(self.shell):
+        if IS_RB3:
             app = self.shell.props.application
             item = Gio.MenuItem()
             action.associate_menuitem(item)
@@ -243,7 +203,7 @@ class Menu(GObject.Object):
         :param menubar: `str` is the name GtkMenu (or ignored for RB2.99+)
         :param position: `int` position to add to GtkMenu (ignored for RB2.99+)
         '''
-        if not is_rb3(self.shell):
+        if not IS_RB3:
             menu_item = Gtk.SeparatorMenuItem().new()
             menu_item.set_visible(True)
             self._rbmenu_items['separator' + str(self._unique_num)] = menu_item
@@ -260,7 +220,7 @@ class Menu(GObject.Object):
         :param menubar: `str` is the name of the GtkMenu containing the menu items (ignored for RB2.99+)
         :param section_name: `str` is the name of the section containing the menu items (for RB2.99+ only)
         '''
-        if is_rb3(self.shell):
+        if IS_RB3:
             if not section_name in self._rbmenu_items:
                 return
 
@@ -302,7 +262,7 @@ class Menu(GObject.Object):
         except:
             pass
 
-        if is_rb3(self.shell):
+        if IS_RB3:
             ui_filename = rb3_ui_filename
         else:
             ui_filename = rb2_ui_filename
@@ -336,7 +296,7 @@ class Menu(GObject.Object):
         :param signals: `dict` key is the name of the menuitem 
              and value is the function callback when the menu is activated
         '''
-        if is_rb3(self.shell):
+        if IS_RB3:
             self._connect_rb3_signals(signals)
         else:
             self._connect_rb2_signals(signals)
@@ -350,7 +310,7 @@ class Menu(GObject.Object):
             return self._rbmenu_objects[popup_name]
         item = self.builder.get_object(popup_name)
 
-        if is_rb3(self.shell):
+        if IS_RB3:
             app = self.shell.props.application
             app.link_shared_menus(item)
             popup_menu = Gtk.Menu.new_from_model(item)
@@ -370,7 +330,7 @@ class Menu(GObject.Object):
         if menu_name_or_link in self._rbmenu_objects:
             return self._rbmenu_objects[menu_name_or_link]
         item = self.builder.get_object(menu_name_or_link)
-        if is_rb3(self.shell):
+        if IS_RB3:
             if item:
                 popup_menu = item
             else:
@@ -391,7 +351,7 @@ class Menu(GObject.Object):
         :param enable: `bool` value to enable/disable
         '''
 
-        if is_rb3(self.shell):
+        if IS_RB3:
             item = self.shell.props.window.lookup_action(menu_or_action_item)
             item.set_enabled(enable)
         else:
@@ -427,7 +387,7 @@ class ActionGroup(object):
 
         self._actions = {}
 
-        if is_rb3(self.shell):
+        if IS_RB3:
             self.actiongroup = Gio.SimpleActionGroup()
         else:
             self.actiongroup = Gtk.ActionGroup(group_name)
@@ -496,7 +456,7 @@ class ActionGroup(object):
         if 'action_state' in args:
             state = args['action_state']
 
-        if is_rb3(self.shell):
+        if IS_RB3:
             if state == ActionGroup.TOGGLE:
                 action = Gio.SimpleAction.new_stateful(action_name, None,
                                                        GLib.Variant('b', False))
@@ -562,7 +522,7 @@ class ApplicationShell(object):
         def __init__(self, shell):
             self.shell = shell
 
-            if is_rb3(self.shell):
+            if IS_RB3:
                 self._uids = {}
             else:
                 self._uids = []
@@ -587,7 +547,7 @@ class ApplicationShell(object):
             :param action_type: `str` RB2.99+ action type ("win" or "app")
             '''
 
-            if is_rb3(self.shell):
+            if IS_RB3:
                 if action_type == "app":
                     action = self.shell.props.application.lookup_action(action_name)
                 else:
@@ -628,7 +588,7 @@ class ApplicationShell(object):
             :param menu: `str` RB2.99 menu section to add to - nominally either
               'tools' or 'view'
             '''
-            if is_rb3(self.shell):
+            if IS_RB3:
                 root = ET.fromstring(ui_string)
                 for elem in root.findall(".//menuitem"):
                     action_name = elem.attrib['action']
@@ -666,7 +626,7 @@ class ApplicationShell(object):
         
             :param group_name: `str` unique name of the ActionGroup to add menu items to
             '''
-            if is_rb3(self.shell):
+            if IS_RB3:
                 root = ET.fromstring(ui_string)
                 for elem in root.findall("./popup"):
                     popup_name = elem.attrib['name']
@@ -706,7 +666,7 @@ class ApplicationShell(object):
             '''
             utility remove any menuitems created.
             '''
-            if is_rb3(self.shell):
+            if IS_RB3:
                 for uid in self._uids:
                     Gio.Application.get_default().remove_plugin_menu_item(self._uids[uid],
                                                                           uid)
@@ -738,6 +698,9 @@ class ApplicationShell(object):
 class Action(object):
     '''
     class that wraps around either a Gio.Action or a Gtk.Action
+
+    Methods that differ between RB2 and RB3 are defined once for the
+    running version.
     '''
 
     def __init__(self, shell, action):
@@ -762,10 +725,7 @@ class Action(object):
         if address == 'activate':
             func = self._activate
 
-        if is_rb3(self.shell):
-            self.action.connect(address, func, args)
-        else:
-            self.action.connect(address, func, None, args)
+        return self._connect(address, func, args)
 
     def _activate(self, action, *args):
         if self._do_update_state:
@@ -774,26 +734,6 @@ class Action(object):
 
         self._connect_func(action, None, self._connect_args)
 
-    @property
-    def label(self):
-        ''' 
-        get the menu label associated with the Action
-        
-        for RB2.99+ actions dont have menu labels so this is managed
-        manually
-        '''
-        if not is_rb3(self.shell):
-            return self.action.get_label()
-        else:
-            return self._label
-
-    @label.setter
-    def label(self, new_label):
-        if not is_rb3(self.shell):
-            self.action.set_label(new_label)
-
-        self._label = new_label
-
     @property
     def accel(self):
         ''' 
@@ -808,73 +748,130 @@ class Action(object):
         else:
             self._accel = ''
 
-    def get_sensitive(self):
-        ''' 
-        get the sensitivity (enabled/disabled) state of the Action
-        
-        returns boolean
-        '''
-        if is_rb3(self.shell):
+    if IS_RB3:
+        def _connect(self, address, func, args):
+            return self.action.connect(address, func, args)
+
+        @property
+        def label(self):
+            ''' 
+            get the menu label associated with the Action
+
+            for RB2.99+ actions dont have menu labels so this is managed
+            manually
+            '''
+            return self._label
+
+        @label.setter
+        def label(self, new_label):
+            self._label = new_label
+
+        def get_sensitive(self):
+            ''' 
+            get the sensitivity (enabled/disabled) state of the Action
+
+            returns boolean
+            '''
             return self.action.get_enabled()
-        else:
-            return self.action.get_sensitive()
 
-    def set_state(self, value):
-        ''' 
-        set the state of a stateful action - this is applicable only
-        to RB2.99+
-        '''
-        if is_rb3(self.shell) and self.action.props.state_type:
-            self.action.change_state(GLib.Variant('b', value))
+        def set_state(self, value):
+            ''' 
+            set the state of a stateful action - this is applicable only
+            to RB2.99+
+            '''
+            if self.action.props.state_type:
+                self.action.change_state(GLib.Variant('b', value))
 
-    def activate(self):
-        ''' 
-        invokes the activate signal for the action
-        '''
-        if is_rb3(self.shell):
+        def activate(self):
+            ''' 
+            invokes the activate signal for the action
+            '''
             self.action.activate(None)
-        else:
-            self.action.activate()
 
-    def set_active(self, value):
-        ''' 
-        activate or deactivate a stateful action signal
-        For consistency with earlier RB versions, this will fire the 
-        activate signal for the action
-        
-        :param value: `boolean` state value
-        '''
+        def set_active(self, value):
+            ''' 
+            activate or deactivate a stateful action signal
+            For consistency with earlier RB versions, this will fire the 
+            activate signal for the action
 
-        if is_rb3(self.shell):
+            :param value: `boolean` state value
+            '''
             self.action.change_state(GLib.Variant('b', value))
             self._current_state = value
             self._do_update_state = False
             self.activate()
             self._do_update_state = True
-        else:
-            self.action.set_active(value)
 
-    def get_active(self):
-        ''' 
-        get the state of the action
-        
-        returns `boolean` state value
-        '''
-        if is_rb3(self.shell):
-            returnval = self._current_state
-        else:
-            returnval = self.action.get_active()
+        def get_active(self):
+            ''' 
+            get the state of the action
 
-        return returnval
+            returns `boolean` state value
+            '''
+            return self._current_state
 
-    def associate_menuitem(self, menuitem):
-        ''' 
-        links a menu with the action
-        
-        '''
-        if is_rb3(self.shell):
+        def associate_menuitem(self, menuitem):
+            ''' 
+            links a menu with the action
+
+            '''
             menuitem.set_detailed_action('win.' + self.action.get_name())
-        else:
-            menuitem.set_related_action(self.action)
-            
+    else:
+        def _connect(self, address, func, args):
+            return self.action.connect(address, func, None, args)
+
+        @property
+        def label(self):
+            ''' 
+            get the menu label associated with the Action
+            '''
+            return self.action.get_label()
+
+        @label.setter
+        def label(self, new_label):
+            self.action.set_label(new_label)
+            self._label = new_label
+
+        def get_sensitive(self):
+            ''' 
+            get the sensitivity (enabled/disabled) state of the Action
+
+            returns boolean
+            '''
+            return self.action.get_sensitive()
 
+        def set_state(self, value):
+            ''' 
+            set the state of a stateful action - this is applicable only
+            to RB2.99+
+            '''
+            pass
+
+        def activate(self):
+            ''' 
+            invokes the activate signal for the action
+            '''
+            self.action.activate()
+
+        def set_active(self, value):
+            ''' 
+            activate or deactivate a stateful action signal
+
+            :param value: `boolean` state value
+            '''
+            self.action.set_active(value)
+
+        def get_active(self):
+            ''' 
+            get the state of the action
+
+            returns `boolean` state value
+            '''
+            return self.action.get_active()
+
+        def associate_menuitem(self, menuitem):
+            ''' 
+            links a menu with the action
+
+            '''
+            menuitem.set_related_action(self.action)
@@ -0,0 +1,159 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Playback of a region rendered ahead.
+
+Some processing is too slow for the player's streaming thread, e.g. the
+harmonic/percussive separation of `looper_analysis.loop_separation`. It's
+rendered in the background instead, and `RenderFilter`, an element in the
+player registered as 'looperrenderfilter', plays the render in place of
+the song while the song is in its region: the position of each buffer in
+the song comes from its timestamp, so seeks and loops find their place in
+the render. Elsewhere, or until a render is set, audio passes through.
+A render is made at the filter's `rate`, notified when it changes.
+It needs the GStreamer Python bindings, like `looper_speech`, and writes
+to buffers the same way, with `Gst.Buffer.fill`.
+"""
+
+import sys
+
+import numpy as np
+from gi.repository import GObject, Gst
+
+try:
+    from gi.repository import GstBase
+except ImportError:
+    GstBase = None
+
+
+if GstBase is not None:
+    class RenderFilter(GstBase.BaseTransform):
+        """
+        Plays `render`, stereo float samples of the song from `start`
+        seconds at `rate`, see `set_render`. Should come before filters
+        that change the song's time or delay it.
+        """
+
+        __gstmetadata__ = ('Looper render filter', 'Filter/Effect/Audio',
+                           'Plays a render of a region of the song',
+                           'Looper')
+
+        CAPS = ('audio/x-raw,format=F32LE,channels=2,layout=interleaved,'
+                'rate=[1,2147483647]')
+        __gsttemplates__ = (
+            Gst.PadTemplate.new('src', Gst.PadDirection.SRC,
+                                Gst.PadPresence.ALWAYS,
+                                Gst.Caps.from_string(CAPS)),
+            Gst.PadTemplate.new('sink', Gst.PadDirection.SINK,
+                                Gst.PadPresence.ALWAYS,
+                                Gst.Caps.from_string(CAPS)))
+
+        __gproperties__ = {
+            'rate': (int, 'Rate', 'Sample rate negotiated (0 until then)',
+                     0, 2147483647, 0, GObject.ParamFlags.READABLE),
+        }
+
+        # Crossfade (s) between the song and the render at the region's
+        # ends, so entering and leaving it doesn't click.
+        FADE = 0.01
+
+        def __init__(self):
+            super(RenderFilter, self).__init__()
+            self.rate = 0
+            self.segment = None
+            # (samples, start, rate), swapped whole: read by the streaming
+            # thread once per buffer
+            self.render = None
+            self.bypassed = False
+            # Else passthrough would still call `do_transform_ip`
+            self.set_transform_ip_on_passthrough(False)
+            self.set_passthrough(True)
+
+        def do_get_property(self, prop):
+            return getattr(self, prop.name)
+
+        def set_render(self, render, start=0.0, rate=None):
+            """Play `render` from `start` s at `rate`, or nothing if None."""
+            if self.bypassed:
+                return
+            self.render = None if render is None else (render, start, rate)
+            self.set_passthrough(render is None)
+
+        def do_set_caps(self, incaps, outcaps):
+            ok, rate = incaps.get_structure(0).get_int('rate')
+            if ok and rate != self.rate:
+                self.rate = rate
+                self.notify('rate')
+            return ok
+
+        def do_sink_event(self, event):
+            if event.type == Gst.EventType.SEGMENT:
+                self.segment = event.parse_segment().copy()
+            return GstBase.BaseTransform.do_sink_event(self, event)
+
+        def do_transform_ip(self, buf):
+            render, segment = self.render, self.segment
+            if (render is None or segment is None or
+                    buf.pts == Gst.CLOCK_TIME_NONE):
+                return Gst.FlowReturn.OK
+            samples, start, rate = render
+            if rate != self.rate:
+                return Gst.FlowReturn.OK
+            position = segment.to_stream_time(Gst.Format.TIME, buf.pts)
+            if position == Gst.CLOCK_TIME_NONE:
+                return Gst.FlowReturn.OK
+            first = int(round((position / float(Gst.SECOND) - start) * rate))
+            count = buf.get_size() // 8
+            low, high = max(first, 0), min(first + count, len(samples))
+            if low >= high:
+                return Gst.FlowReturn.OK
+            ok, info = buf.map(Gst.MapFlags.READ)
+            if not ok:
+                return Gst.FlowReturn.ERROR
+            try:
+                # Copied: a view of the mapping would end with it
+                song = np.frombuffer(info.data, dtype='<f4').reshape(
+                    -1, 2)[low - first:high - first].copy()
+            finally:
+                buf.unmap(info)
+            indices = np.arange(low, high)
+            edge = np.minimum(indices, len(samples) - 1 - indices)
+            fade = np.clip(edge / (self.FADE * rate), 0, 1)[:, None]
+            song += (samples[low:high] - song) * fade
+            data = song.astype('<f4').tobytes()
+            if buf.fill((low - first) * 8, data) != len(data):
+                self.bypass('buffer not filled')
+            return Gst.FlowReturn.OK
+
+        def bypass(self, reason):
+            self.set_render(None)
+            self.bypassed = True
+            sys.stderr.write('Render filter bypassed: %s\n' % reason)
+
+
+def make_render_filter():
+    """A 'looperrenderfilter', None without the GStreamer Python bindings."""
+    if GstBase is None:
+        return None
+    if Gst.ElementFactory.find('looperrenderfilter') is None:
+        GObject.type_register(RenderFilter)
+        if not Gst.Element.register(None, 'looperrenderfilter',
+                                    Gst.Rank.NONE, RenderFilter):
+            return None
+    return Gst.ElementFactory.make('looperrenderfilter', None)
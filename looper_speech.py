@@ -0,0 +1,273 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Speech and vocal removal by spectral masking.
+
+Voices are usually mixed to the center: the same in both channels. In a
+short time Fourier transform of the stereo signal, each bin's similarity of
+left and right (1 for the same, 0 for one channel only or unrelated ones)
+says how much of it is centered, and that much of the bin's mid is taken
+out of both channels. Only between `low` and `high` Hz, so the bass and
+kick drum, centered too, stay.
+
+`CenterRemover` does it on a stream, all the frames of a buffer at once;
+`CenterFilter` wraps it in a GStreamer element for the player, registered
+as 'loopercenterfilter'. It needs the GStreamer Python bindings and works
+within a per buffer budget: if it can't keep up, it passes audio through
+rather than stutter. The bindings map buffers as read only copies, so the
+output is copied back with `Gst.Buffer.fill`.
+"""
+
+import sys
+import time
+import threading
+
+import numpy as np
+from gi.repository import GObject, Gst
+
+try:
+    from gi.repository import GstBase
+except ImportError:
+    GstBase = None
+
+
+def frame_size(rate, seconds=0.02):
+    """FFT size of about `seconds` at `rate`, a power of two."""
+    size = 256
+    while size < rate * seconds:
+        size *= 2
+    return size
+
+
+class CenterRemover(object):
+    """
+    Takes what's centered between `low` and `high` Hz out of stereo audio
+    at `rate`, by `level` (1 for all of it), with a latency of `size`
+    samples. The band and level can change between calls of `process`.
+    """
+
+    def __init__(self, rate, low=150, high=7000, level=1.0, size=None):
+        self.rate = rate
+        self.low = low
+        self.high = high
+        self.level = level
+        self.size = size or frame_size(rate)
+        self.hop = self.size // 2
+        # Square root of a periodic Hann window, applied before and after
+        # the transform: the squares of frames half a frame apart sum to 1.
+        self.window = np.sqrt(0.5 - 0.5 * np.cos(
+            2 * np.pi * np.arange(self.size) / self.size))[None, :, None]
+        self.offsets = np.arange(self.size)
+        self.reset()
+
+    def reset(self):
+        """Forget the stream, e.g. after a seek."""
+        # Input not yet in a whole frame, the second half of the last frame
+        # processed, and output not yet returned.
+        self.pending = np.zeros((self.size - self.hop, 2), np.float32)
+        self.tail = np.zeros((self.hop, 2))
+        self.ready = np.zeros((self.hop, 2), np.float32)
+
+    def bins(self):
+        """Range of FFT bins of the band."""
+        scale = self.size / float(self.rate)
+        first = max(int(round(self.low * scale)), 0)
+        last = min(int(round(self.high * scale)) + 1, self.size // 2 + 1)
+        return first, max(last, first)
+
+    def mask(self, spectra):
+        """Remove the centered part of `spectra` (frames, bins, 2)."""
+        first, last = self.bins()
+        left = spectra[:, first:last, 0]
+        right = spectra[:, first:last, 1]
+        power = (left.real ** 2 + left.imag ** 2 +
+                 right.real ** 2 + right.imag ** 2)
+        similarity = 2 * (left * np.conj(right)).real / np.maximum(power,
+                                                                  1e-12)
+        mid = (left + right) * (0.5 * self.level *
+                                np.clip(similarity, 0, 1))
+        spectra[:, first:last, 0] -= mid
+        spectra[:, first:last, 1] -= mid
+        return spectra
+
+    def process(self, samples):
+        """
+        The output for `samples` (count, 2): as many samples, from `size`
+        samples earlier in the stream.
+        """
+        data = np.concatenate((self.pending, samples))
+        count = max((len(data) - self.size) // self.hop + 1, 0)
+        if count:
+            indices = (np.arange(count)[:, None] * self.hop +
+                       self.offsets[None, :])
+            spectra = np.fft.rfft(data[indices] * self.window, axis=1)
+            frames = np.fft.irfft(self.mask(spectra), self.size,
+                                  axis=1) * self.window
+            # Overlap-add: each hop is the first half of a frame plus the
+            # second half of the one before
+            chunks = frames[:, :self.hop].copy()
+            chunks[0] += self.tail
+            chunks[1:] += frames[:-1, self.hop:]
+            self.tail = frames[-1, self.hop:]
+            self.pending = data[count * self.hop:]
+            self.ready = np.concatenate((self.ready,
+                                         chunks.reshape(-1, 2)))
+        else:
+            self.pending = data
+        output, self.ready = (self.ready[:len(samples)],
+                              self.ready[len(samples):])
+        return output
+
+
+if GstBase is not None:
+    class CenterFilter(GstBase.BaseTransform):
+        """
+        `CenterRemover` as an in place filter element. Its `load` is the
+        time spent on buffers over their duration, averaged.
+        """
+
+        __gstmetadata__ = ('Looper center filter', 'Filter/Effect/Audio',
+                           'Removes centered voices in a frequency band',
+                           'Looper')
+
+        CAPS = ('audio/x-raw,format=F32LE,channels=2,layout=interleaved,'
+                'rate=[1,2147483647]')
+        __gsttemplates__ = (
+            Gst.PadTemplate.new('src', Gst.PadDirection.SRC,
+                                Gst.PadPresence.ALWAYS,
+                                Gst.Caps.from_string(CAPS)),
+            Gst.PadTemplate.new('sink', Gst.PadDirection.SINK,
+                                Gst.PadPresence.ALWAYS,
+                                Gst.Caps.from_string(CAPS)))
+
+        __gproperties__ = {
+            'low': (int, 'Low', 'Lowest frequency removed (Hz)',
+                    0, 96000, 150, GObject.ParamFlags.READWRITE),
+            'high': (int, 'High', 'Highest frequency removed (Hz)',
+                     0, 96000, 7000, GObject.ParamFlags.READWRITE),
+            'level': (float, 'Level', 'Part of the centered sound removed',
+                      0.0, 1.0, 1.0, GObject.ParamFlags.READWRITE),
+        }
+
+        # Part of a buffer's duration its processing may take, and for how
+        # long (s) it may take more before the filter passes audio through.
+        BUDGET = 0.5
+        OVER_BUDGET = 2.0
+
+        # Weight of the latest buffer in the averaged load.
+        SMOOTHING = 0.05
+
+        def __init__(self):
+            super(CenterFilter, self).__init__()
+            self.low = 150
+            self.high = 7000
+            self.level = 1.0
+            self.remover = None
+            self.lock = threading.Lock()
+            self.load = 0.0
+            self.over_budget = 0.0
+            self.bypassed = False
+
+        def do_get_property(self, prop):
+            return getattr(self, prop.name)
+
+        def do_set_property(self, prop, value):
+            setattr(self, prop.name, value)
+            remover = self.remover
+            if remover is not None:
+                # Read by the streaming thread on its next buffer
+                setattr(remover, prop.name, value)
+
+        def do_set_caps(self, incaps, outcaps):
+            ok, rate = incaps.get_structure(0).get_int('rate')
+            with self.lock:
+                self.remover = CenterRemover(rate, self.low, self.high,
+                                             self.level)
+            return ok
+
+        def do_sink_event(self, event):
+            if event.type == Gst.EventType.FLUSH_STOP:
+                with self.lock:
+                    if self.remover is not None:
+                        self.remover.reset()
+            return GstBase.BaseTransform.do_sink_event(self, event)
+
+        def do_query(self, direction, query):
+            result = GstBase.BaseTransform.do_query(self, direction, query)
+            remover = self.remover
+            if (result and query.type == Gst.QueryType.LATENCY and
+                    remover is not None and not self.bypassed):
+                live, low, high = query.parse_latency()
+                latency = remover.size * Gst.SECOND // remover.rate
+                if high != Gst.CLOCK_TIME_NONE:
+                    high += latency
+                query.set_latency(live, low + latency, high)
+            return result
+
+        def do_transform_ip(self, buf):
+            if self.bypassed or self.remover is None:
+                return Gst.FlowReturn.OK
+            started = time.time()
+            ok, info = buf.map(Gst.MapFlags.READ)
+            if not ok:
+                return Gst.FlowReturn.ERROR
+            try:
+                # Copied: a view of the mapping would end with it
+                samples = np.frombuffer(info.data, dtype='<f4').reshape(
+                    -1, 2).copy()
+            finally:
+                buf.unmap(info)
+            with self.lock:
+                output = self.remover.process(samples)
+            data = output.astype('<f4').tobytes()
+            if buf.fill(0, data) != len(data):
+                self.bypass('buffer not filled')
+                return Gst.FlowReturn.OK
+            self.account(time.time() - started,
+                         len(samples) / float(self.remover.rate))
+            return Gst.FlowReturn.OK
+
+        def account(self, busy, duration):
+            """Average the load, bypassing when over budget for long."""
+            if not duration:
+                return
+            load = busy / duration
+            self.load += self.SMOOTHING * (load - self.load)
+            if load > self.BUDGET:
+                self.over_budget += duration
+                if self.over_budget > self.OVER_BUDGET:
+                    self.bypass('%d%% of real time' % (100 * self.load))
+            else:
+                self.over_budget = 0.0
+
+        def bypass(self, reason):
+            self.bypassed = True
+            sys.stderr.write('Center filter bypassed: %s\n' % reason)
+
+
+def make_center_filter():
+    """A 'loopercenterfilter', None without the GStreamer Python bindings."""
+    if GstBase is None:
+        return None
+    if Gst.ElementFactory.find('loopercenterfilter') is None:
+        GObject.type_register(CenterFilter)
+        if not Gst.Element.register(None, 'loopercenterfilter',
+                                    Gst.Rank.NONE, CenterFilter):
+            return None
+    return Gst.ElementFactory.make('loopercenterfilter', None)
@@ -0,0 +1,282 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+In-process tone synthesis for the Tuner.
+
+Notes are rendered with NumPy, as a sine or a Karplus-Strong pluck, and
+cached per voice, frequency and length. One GStreamer pipeline fed by an
+appsrc mixes whatever is playing, so a note starts without spawning a
+process and any number of notes can sound at once (chords).
+
+Latency from the click to the note reaching the speaker is recorded in
+`Synth.latency`.
+
+Nothing runs while nothing plays: once the last note has drained out of
+the sink the pipeline is paused, which stops the streaming thread, and
+the next `play` resumes it.
+"""
+
+import time
+import threading
+from collections import OrderedDict
+
+import numpy as np
+from gi.repository import GLib, Gst
+
+from looper_telemetry import Histogram
+
+
+SINE = 'sine'
+PLUCK = 'pluck'
+
+
+def sine(freq, count, rate):
+    t = np.arange(count) / float(rate)
+    return 0.5 * np.sin(2 * np.pi * freq * t)
+
+
+def pluck(freq, count, rate, decay=0.996):
+    """
+    Karplus-Strong plucked string. The delay line is a whole number of
+    samples long (plus half a sample of the averaging filter), so the
+    string is rendered slightly off pitch and resampled to `freq`.
+    """
+    period = max(int(round(rate / freq - 0.5)), 2)
+    ratio = freq * (period + 0.5) / float(rate)
+    needed = int(count * ratio) + 2
+    rows = needed // period + 1
+    lines = np.empty((rows, period))
+    lines[0] = np.random.uniform(-1, 1, period)
+    lines[0] -= lines[0].mean()
+    last = 0.0
+    for k in range(1, rows):
+        previous = lines[k - 1]
+        # y[n] = decay * (y[n - period] + y[n - period - 1]) / 2
+        shifted = np.concatenate(([last], previous[:-1]))
+        lines[k] = decay * 0.5 * (previous + shifted)
+        last = previous[-1]
+    string = lines.ravel()[:needed]
+    return 0.5 * np.interp(np.arange(count) * ratio, np.arange(needed), string)
+
+
+RENDERERS = {SINE: sine, PLUCK: pluck}
+
+
+class Note(object):
+    """
+    A playing note (or chord). Has the `poll` and `terminate` of the
+    subprocess.Popen objects Tuner keeps for its external backends.
+    `on_done` is called from the main loop once the note is over.
+    """
+
+    def __init__(self, synth, samples, clicked, on_done=None):
+        self.synth = synth
+        self.samples = samples
+        self.position = 0
+        self.clicked = clicked
+        self.on_done = on_done
+        self.finished = False
+
+    def finish(self):
+        if not self.finished:
+            self.finished = True
+            if self.on_done is not None:
+                GLib.idle_add(self.on_done)
+
+    def poll(self):
+        if self.finished:
+            return 0
+        return None
+
+    def terminate(self):
+        self.synth.stop(self)
+
+
+class Synth(object):
+
+    RATE = 44100
+
+    # Samples per pushed buffer (~12 ms) and buffers appsrc may queue.
+    BLOCK = 512
+    QUEUED = 2
+
+    # Audio sink buffering in microseconds, far below the usual 200 ms.
+    BUFFER_TIME = 50000
+    LATENCY_TIME = 10000
+
+    # Fade in/out (s) so notes don't click.
+    RAMP = 0.005
+
+    # Rendered notes kept.
+    CACHE_SIZE = 64
+
+    def __init__(self):
+        Gst.init_check(None)
+        self.cache = OrderedDict()
+        self.notes = []
+        self.lock = threading.Lock()
+        self.latency = Histogram('note latency')
+        self.pipeline = None
+        # Silence (samples) mixed since the last note ended, and the
+        # amount after which everything queued towards the sink is silent.
+        self.silent = 0
+        self.drain = (self.BLOCK * (self.QUEUED + 1) +
+                      self.BUFFER_TIME * self.RATE // 1000000)
+        self.pause_id = None
+
+    def render(self, freq, length, voice=PLUCK):
+        """Samples of one note, from the cache when possible."""
+        key = (voice, float(freq), float(length))
+        samples = self.cache.pop(key, None)
+        if samples is None:
+            samples = RENDERERS[voice](float(freq), int(length * self.RATE),
+                                       self.RATE)
+            ramp = min(int(self.RAMP * self.RATE), len(samples) // 2)
+            envelope = np.linspace(0, 1, ramp)
+            samples[:ramp] *= envelope
+            samples[len(samples) - ramp:] *= envelope[::-1]
+            samples = samples.astype('<f4')
+            if len(self.cache) >= self.CACHE_SIZE:
+                self.cache.popitem(last=False)
+        self.cache[key] = samples
+        return samples
+
+    def play(self, freqs, length, voice=PLUCK, clicked=None, on_done=None):
+        """
+        Play `freqs` together for `length` seconds. `clicked` is the time
+        (time.time()) the user asked for the note, to measure latency.
+        """
+        self.start()
+        rendered = [self.render(freq, length, voice) for freq in freqs]
+        if len(rendered) == 1:
+            samples = rendered[0]
+        else:
+            samples = np.zeros(max(len(r) for r in rendered), dtype='<f4')
+            for r in rendered:
+                samples[:len(r)] += r
+            samples /= len(rendered) ** 0.5
+        note = Note(self, samples, clicked, on_done)
+        with self.lock:
+            self.notes.append(note)
+            self.silent = 0
+        self.pipeline.set_state(Gst.State.PLAYING)
+        return note
+
+    def stop(self, note=None):
+        """Stop `note`, or everything."""
+        with self.lock:
+            for playing in self.notes:
+                if note is None or playing is note:
+                    playing.finish()
+            self.notes = [n for n in self.notes if not n.finished]
+
+    def start(self):
+        if self.pipeline is not None:
+            return
+        self.offset = 0
+        self.pipeline = Gst.parse_launch(
+            'appsrc name=src format=time ! audioconvert ! audioresample ! '
+            'autoaudiosink')
+        self.src = self.pipeline.get_by_name('src')
+        self.src.set_property('caps', Gst.Caps.from_string(
+            'audio/x-raw,format=F32LE,layout=interleaved,channels=1,'
+            'rate=%d' % self.RATE))
+        self.src.set_property('max-bytes', self.BLOCK * 4 * self.QUEUED)
+        self.need_data_sigid = self.src.connect('need-data',
+                                                self.on_need_data)
+        self.element_added_sigid = self.pipeline.connect(
+            'deep-element-added', self.on_element_added)
+        bus = self.pipeline.get_bus()
+        bus.add_signal_watch()
+        self.error_sigid = bus.connect('message::error', self.on_error)
+        self.pipeline.set_state(Gst.State.PLAYING)
+
+    def pause(self):
+        """Pause the drained pipeline. Called from the main loop."""
+        self.pause_id = None
+        # Notes are only added from the main loop, so this can't race.
+        with self.lock:
+            idle = not self.notes
+        if idle and self.pipeline is not None:
+            self.pipeline.set_state(Gst.State.PAUSED)
+        return False
+
+    def close(self):
+        if self.pipeline is None:
+            return
+        self.stop()
+        if self.pause_id is not None:
+            GLib.source_remove(self.pause_id)
+            self.pause_id = None
+        self.pipeline.set_state(Gst.State.NULL)
+        self.src.disconnect(self.need_data_sigid)
+        self.pipeline.disconnect(self.element_added_sigid)
+        bus = self.pipeline.get_bus()
+        bus.disconnect(self.error_sigid)
+        bus.remove_signal_watch()
+        self.pipeline = None
+        self.src = None
+
+    def on_element_added(self, pipeline, bin, element):
+        """Shrink the buffering of the sink autoaudiosink picks."""
+        if element.find_property('buffer-time') is not None:
+            element.set_property('buffer-time', self.BUFFER_TIME)
+            element.set_property('latency-time', self.LATENCY_TIME)
+
+    def on_error(self, bus, message):
+        error, debug = message.parse_error()
+        print('Synth: %s' % error.message)
+        self.close()
+
+    def on_need_data(self, src, length):
+        """Mix the next block. Called from the streaming thread."""
+        block = np.zeros(self.BLOCK, dtype='<f4')
+        onsets = []
+        with self.lock:
+            for note in self.notes:
+                if note.position == 0 and note.clicked is not None:
+                    onsets.append(note)
+                chunk = note.samples[note.position:note.position + self.BLOCK]
+                block[:len(chunk)] += chunk
+                note.position += len(chunk)
+                if note.position >= len(note.samples):
+                    note.finish()
+            self.notes = [n for n in self.notes if not n.finished]
+            if not self.notes:
+                self.silent += self.BLOCK
+                if self.silent >= self.drain and self.pause_id is None:
+                    self.pause_id = GLib.idle_add(self.pause)
+        np.clip(block, -1, 1, out=block)
+
+        buf = Gst.Buffer.new_wrapped(block.tobytes())
+        buf.pts = self.offset * Gst.SECOND // self.RATE
+        buf.duration = self.BLOCK * Gst.SECOND // self.RATE
+        self.offset += self.BLOCK
+        for note in onsets:
+            self.record_latency(note, buf.pts)
+        src.emit('push-buffer', buf)
+
+    def record_latency(self, note, pts):
+        """The audio sink plays `pts` when its clock reaches base time + pts."""
+        clock = self.pipeline.get_clock()
+        if clock is None:
+            return
+        sounds_in = (self.pipeline.get_base_time() + pts -
+                     clock.get_time()) / float(Gst.SECOND)
+        self.latency.record((time.time() + sounds_in - note.clicked) * 1000)
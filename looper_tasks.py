@@ -0,0 +1,305 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Background tasks.
+
+`Executor` runs functions in a pool of threads, or of child processes for
+long ones that would compete with Rhythmbox for the interpreter, and calls
+back from the main loop with their results. Waiting tasks start by
+priority, then in the order submitted.
+
+A `Task` can be cancelled: if waiting it never runs, if running in a
+process the process is stopped, if running in a thread its result is
+dropped. A task submitted with a `key` cancels the one before it with that
+key, since only the latest matters (e.g. the analysis of the loop region
+while the sliders move). Tasks of a `group` are cancelled together, e.g.
+those about the playing song when it changes, see `Executor.cancel_on`.
+"""
+
+import os
+import sys
+import heapq
+import itertools
+import threading
+import multiprocessing
+
+from gi.repository import GLib
+
+
+def lower_priority():
+    """Run the calling process at the lowest CPU priority."""
+    try:
+        os.nice(19)
+    except OSError:
+        pass
+
+
+def python_executable():
+    """
+    The Python interpreter, None if not found: within Rhythmbox
+    `sys.executable` is Rhythmbox (or empty).
+    """
+    executable = sys.executable
+    if executable and os.path.basename(executable).startswith('python'):
+        return executable
+    executable = os.path.join(sys.exec_prefix, 'bin',
+                              'python%d.%d' % sys.version_info[:2])
+    if os.access(executable, os.X_OK):
+        return executable
+    return None
+
+
+def process_context():
+    """
+    The multiprocessing context to start child processes with:
+    'forkserver', whose children are forked from a fresh interpreter, not
+    from Rhythmbox, where another thread may hold a lock a forked child
+    would wait on forever. Else (Python 2, no interpreter to start) 'fork';
+    modules with locks then re-create them in the child, see
+    `looper_analysis`.
+    """
+    try:
+        context = multiprocessing.get_context('forkserver')
+    except (AttributeError, ValueError):
+        return multiprocessing
+    executable = python_executable()
+    if executable is None:
+        return multiprocessing.get_context('fork')
+    if executable != sys.executable:
+        context.set_executable(executable)
+    if not getattr(sys, 'argv', None):
+        # Sent to the children, and missing in embedded interpreters
+        sys.argv = ['']
+    return context
+
+
+class Cancelled(Exception):
+    pass
+
+
+class Task(object):
+    """A function call submitted to an `Executor`."""
+
+    WAITING, RUNNING, DONE, CANCELLED = range(4)
+
+    def __init__(self, executor, func, args, callback, errback, priority,
+                 process, key, group):
+        self.executor = executor
+        self.func = func
+        self.args = args
+        self.callback = callback
+        self.errback = errback
+        self.priority = priority
+        self.process = process
+        self.key = key
+        self.group = group
+        self.state = Task.WAITING
+
+    def cancel(self):
+        self.executor.cancel_task(self)
+
+    @property
+    def cancelled(self):
+        return self.state == Task.CANCELLED
+
+    @property
+    def done(self):
+        """Whether the callback was called (or the task cancelled)."""
+        return self.state in (Task.DONE, Task.CANCELLED)
+
+
+class Executor(object):
+    """
+    Runs tasks in up to `threads` threads and `processes` child processes.
+    The processes (see `process_context`) run at low priority; a task's
+    function, arguments and result have to be picklable, the function
+    importable.
+    """
+
+    # Task priorities, the lower the sooner.
+    HIGH = 0
+    DEFAULT = 1
+    LOW = 2
+
+    # How often (s) a thread waiting for a process checks for cancelling.
+    POLL = 0.5
+
+    def __init__(self, threads=3, processes=1):
+        self.condition = threading.Condition()
+        self.size = {False: threads, True: processes}
+        self.queues = {False: [], True: []}
+        self.threads = {False: [], True: []}
+        # Child process of each thread running process tasks
+        self.pools = {}
+        self.keys = {}
+        self.running = set()
+        self.order = itertools.count()
+        self.closed = False
+        self.signals = []
+
+    def submit(self, func, args=(), callback=None, errback=None,
+               priority=DEFAULT, process=False, key=None, group=None):
+        """
+        Run `func(*args)`, then call `callback(result)` from the main loop,
+        or `errback(exception)` if it raised (by default the error is
+        written to stderr).
+        """
+        task = Task(self, func, args, callback, errback, priority, process,
+                    key, group)
+        with self.condition:
+            if self.closed:
+                raise RuntimeError('Executor shut down')
+            if key is not None:
+                previous = self.keys.get(key)
+                if previous is not None:
+                    self.cancel_locked(previous)
+                self.keys[key] = task
+            heapq.heappush(self.queues[process],
+                           (priority, next(self.order), task))
+            threads = self.threads[process]
+            if len(threads) < self.size[process]:
+                thread = threading.Thread(target=self.run, args=(process,))
+                thread.daemon = True
+                thread.start()
+                threads.append(thread)
+            self.condition.notify_all()
+        return task
+
+    def cancel_task(self, task):
+        with self.condition:
+            self.cancel_locked(task)
+
+    def cancel_locked(self, task):
+        if task.done:
+            return
+        # A waiting task is dropped when it comes up, a running one by its
+        # thread when it finishes (or polls its process).
+        task.state = Task.CANCELLED
+        if task.key is not None and self.keys.get(task.key) is task:
+            del self.keys[task.key]
+
+    def cancel(self, key):
+        """Cancel the task with `key`, if any."""
+        with self.condition:
+            task = self.keys.get(key)
+            if task is not None:
+                self.cancel_locked(task)
+
+    def cancel_group(self, group):
+        with self.condition:
+            for queue in self.queues.values():
+                for priority, order, task in queue:
+                    if task.group == group:
+                        self.cancel_locked(task)
+            for task in self.running:
+                if task.group == group:
+                    self.cancel_locked(task)
+
+    def cancel_on(self, obj, signal, group):
+        """
+        Cancel the tasks of `group` whenever `obj` emits `signal`. Connect
+        before other handlers of the signal, which may submit new tasks of
+        the group.
+        """
+        sigid = obj.connect(signal, lambda *args: self.cancel_group(group))
+        self.signals.append((obj, sigid))
+
+    def run(self, process):
+        queue = self.queues[process]
+        while True:
+            with self.condition:
+                while not queue and not self.closed:
+                    self.condition.wait()
+                if self.closed:
+                    return
+                priority, order, task = heapq.heappop(queue)
+                if task.cancelled:
+                    continue
+                task.state = Task.RUNNING
+                self.running.add(task)
+            try:
+                if process:
+                    result = self.call(task)
+                else:
+                    result = task.func(*task.args)
+                error = None
+            except Cancelled:
+                result, error = None, None
+            except Exception as e:
+                result, error = None, e
+            with self.condition:
+                self.running.discard(task)
+                if task.cancelled:
+                    continue
+            GLib.idle_add(self.deliver, task, result, error)
+
+    def call(self, task):
+        """Run `task` in this thread's child process, waiting for it."""
+        thread = threading.current_thread()
+        with self.condition:
+            pool = self.pools.get(thread)
+            if pool is None:
+                pool = self.pools[thread] = process_context().Pool(
+                    1, lower_priority)
+        result = pool.apply_async(task.func, task.args)
+        while not result.ready():
+            if task.cancelled or self.closed:
+                # The child is busy with it: replace the child
+                with self.condition:
+                    if self.pools.get(thread) is pool:
+                        del self.pools[thread]
+                pool.terminate()
+                raise Cancelled()
+            result.wait(self.POLL)
+        return result.get()
+
+    def deliver(self, task, result, error):
+        with self.condition:
+            if task.done or self.closed:
+                return False
+            task.state = Task.DONE
+            if task.key is not None and self.keys.get(task.key) is task:
+                del self.keys[task.key]
+        if error is None:
+            if task.callback is not None:
+                task.callback(result)
+        elif task.errback is not None:
+            task.errback(error)
+        else:
+            sys.stderr.write('%s failed: %s\n' % (
+                task.key or getattr(task.func, '__name__', 'Task'), error))
+        return False
+
+    def shutdown(self):
+        """Cancel every task, stopping the child processes."""
+        for obj, sigid in self.signals:
+            obj.disconnect(sigid)
+        self.signals = []
+        with self.condition:
+            self.closed = True
+            for queue in self.queues.values():
+                for priority, order, task in queue:
+                    self.cancel_locked(task)
+                del queue[:]
+            for task in self.running:
+                self.cancel_locked(task)
+            pools, self.pools = list(self.pools.values()), {}
+            self.condition.notify_all()
+        for pool in pools:
+            pool.terminate()
@@ -0,0 +1,181 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Loop engine telemetry.
+
+Values are kept in fixed size histograms, so recording is a bisect and two
+additions and memory never grows. When telemetry is disabled the engine
+holds no `Telemetry` object at all and pays a single `is None` check.
+"""
+
+import json
+import time
+import bisect
+
+
+# Histogram bucket upper bounds in ms: from 0.1 ms growing by sqrt(2).
+# The last bucket holds everything above the last bound.
+BUCKETS = 48
+BOUNDS = [0.1 * 2 ** (i / 2.0) for i in range(BUCKETS - 1)]
+
+
+class Histogram(object):
+    """
+    Histogram of millisecond values with logarithmic buckets.
+    Percentiles are reported as bucket bounds.
+    """
+
+    BUCKETS = BUCKETS
+    BOUNDS = BOUNDS
+
+    def __init__(self, name):
+        self.name = name
+        self.reset()
+
+    def reset(self):
+        self.counts = [0] * self.BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        if value < 0:
+            value = 0.0
+        self.counts[bisect.bisect_left(self.BOUNDS, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, percent):
+        if not self.count:
+            return 0.0
+        wanted = self.count * percent / 100.0
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if seen >= wanted:
+                if index < len(self.BOUNDS):
+                    return min(self.BOUNDS[index], self.max)
+                return self.max
+        return self.max
+
+    @property
+    def mean(self):
+        if not self.count:
+            return 0.0
+        return self.total / self.count
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'mean': self.mean,
+            'p50': self.percentile(50),
+            'p90': self.percentile(90),
+            'p99': self.percentile(99),
+            'max': self.max,
+            'bounds': self.BOUNDS,
+            'counts': self.counts,
+        }
+
+    def summary(self):
+        return '%-15s n=%-6d p50 %7.1f  p90 %7.1f  p99 %7.1f  max %7.1f ms' % (
+            self.name, self.count, self.percentile(50), self.percentile(90),
+            self.percentile(99), self.max)
+
+
+class Telemetry(object):
+    """
+    Collects:
+
+    - seek_latency: from the moment playback crossed End (in stream time)
+      to the position being back inside the loop after the seek,
+    - tick_jitter: how far the wall clock between two ticks drifted from
+      the stream time between them,
+    - filter_latency: latency reported by the filter chain,
+    - seeks and seek failures per codec (the entry's media type).
+    """
+
+    def __init__(self):
+        self.seek_latency = Histogram('seek latency')
+        self.tick_jitter = Histogram('tick jitter')
+        self.filter_latency = Histogram('filter latency')
+        self.codec = 'unknown'
+        self.seeks = {}
+        self.seek_failures = {}
+        self._last_tick = None
+        self.started = time.time()
+
+    def reset(self):
+        for histogram in self.histograms():
+            histogram.reset()
+        self.seeks = {}
+        self.seek_failures = {}
+        self._last_tick = None
+        self.started = time.time()
+
+    def histograms(self):
+        return (self.seek_latency, self.tick_jitter, self.filter_latency)
+
+    def tick(self, elapsed):
+        now = time.time()
+        if self._last_tick is not None:
+            last_now, last_elapsed = self._last_tick
+            stream = (elapsed - last_elapsed) * 1000
+            # A seek happened in between, stream time jumped.
+            if 0 < stream < 10000:
+                self.tick_jitter.record(abs((now - last_now) * 1000 - stream))
+        self._last_tick = (now, elapsed)
+
+    def seek(self, ok):
+        """A seek was asked for, `ok` if the player took it."""
+        self.seeks[self.codec] = self.seeks.get(self.codec, 0) + 1
+        if not ok:
+            self.seek_failures[self.codec] = \
+                self.seek_failures.get(self.codec, 0) + 1
+        # Stream time jumps with the seek, don't count it as jitter.
+        self._last_tick = None
+
+    def seek_done(self, latency):
+        """A seek completed `latency` (s) after the boundary was crossed."""
+        self.seek_latency.record(latency * 1000)
+
+    def filter(self, latency):
+        self.filter_latency.record(latency)
+
+    def as_dict(self):
+        data = {
+            'since': self.started,
+            'seeks': self.seeks,
+            'seek_failures': self.seek_failures,
+        }
+        for histogram in self.histograms():
+            data[histogram.name.replace(' ', '_')] = histogram.as_dict()
+        return data
+
+    def summary(self):
+        lines = [histogram.summary() for histogram in self.histograms()]
+        for codec in sorted(self.seeks):
+            lines.append('%-15s seeks %d, failed %d' % (
+                codec, self.seeks[codec], self.seek_failures.get(codec, 0)))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
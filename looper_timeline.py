@@ -0,0 +1,179 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Timeline of the loop region, drawn under the loop controls with the scale
+of their progress bar: Start on the left edge, End on the right one.
+"""
+
+from gi.repository import Gdk, Gtk
+
+
+NOTE_NAMES = ('C', 'C#', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb', 'B')
+
+
+def note_name(note):
+    """Name of MIDI `note`, e.g. 'A4' for 69."""
+    return '%s%d' % (NOTE_NAMES[note % 12], note // 12 - 1)
+
+
+class Timeline(Gtk.DrawingArea):
+    """
+    Chords of the loop region and its key, the notes of its melody as a
+    piano roll, and where playback is. Each band shows only when enabled
+    with `set_bands`.
+    """
+
+    HEIGHT = 24
+    ROLL_HEIGHT = 72
+
+    # Chord boxes alternate between these shades (RGBA).
+    SHADES = ((0.35, 0.55, 0.85, 0.35), (0.35, 0.55, 0.85, 0.2))
+
+    # Notes (RGB), more opaque the louder.
+    NOTE_COLOR = (0.9, 0.45, 0.2)
+
+    def __init__(self):
+        super(Timeline, self).__init__()
+        self.add_events(Gdk.EventMask.BUTTON_PRESS_MASK)
+        self.start = 0.0
+        self.end = 0.0
+        self.position = None
+        self.key = None
+        self.chords = []
+        self.notes = []
+        self.transpose = 0
+        self.show_chords = True
+        self.show_notes = False
+        self.set_size_request(-1, self.HEIGHT)
+        self.draw_sigid = self.connect('draw', self.on_draw)
+
+    def set_bands(self, chords, notes):
+        """Show the chords band, the piano roll, or both."""
+        if (chords, notes) != (self.show_chords, self.show_notes):
+            self.show_chords, self.show_notes = chords, notes
+            self.set_size_request(-1, self.HEIGHT * chords +
+                                  self.ROLL_HEIGHT * notes)
+            self.queue_draw()
+
+    def set_region(self, start, end):
+        if (start, end) != (self.start, self.end):
+            self.start, self.end = start, end
+            self.queue_draw()
+
+    def set_position(self, position):
+        self.position = position
+        self.queue_draw()
+
+    def set_harmony(self, key, chords):
+        """`chords` is a list of (start, end, name), in song time."""
+        self.key = key
+        self.chords = chords
+        self.queue_draw()
+
+    def set_notes(self, notes):
+        """
+        `notes` is a list of (start, end, MIDI note, velocity), in song
+        time, as recorded.
+        """
+        self.notes = notes
+        self.queue_draw()
+
+    def set_transpose(self, semitones):
+        """Show the notes `semitones` higher than recorded."""
+        if semitones != self.transpose:
+            self.transpose = semitones
+            self.queue_draw()
+
+    def clear(self):
+        self.set_harmony(None, [])
+        self.set_notes([])
+
+    def x(self, seconds, width):
+        return (seconds - self.start) / (self.end - self.start) * width
+
+    def on_draw(self, widget, cr):
+        width = self.get_allocated_width()
+        height = self.get_allocated_height()
+        if self.end <= self.start:
+            return False
+        color = self.get_style_context().get_color(Gtk.StateFlags.NORMAL)
+        if self.show_chords:
+            self.draw_chords(cr, width, min(height, self.HEIGHT), color)
+        if self.show_notes:
+            top = self.HEIGHT if self.show_chords else 0
+            self.draw_notes(cr, width, top, height - top, color)
+
+        if self.position is not None and self.start <= self.position <= self.end:
+            cr.set_source_rgba(color.red, color.green, color.blue, 1)
+            x = self.x(self.position, width)
+            cr.move_to(x, 0)
+            cr.line_to(x, height)
+            cr.stroke()
+        return False
+
+    def draw_chords(self, cr, width, height, color):
+        for index, (start, end, name) in enumerate(self.chords):
+            if end <= self.start or start >= self.end:
+                continue
+            left = max(self.x(start, width), 0)
+            right = min(self.x(end, width), width)
+            cr.set_source_rgba(*self.SHADES[index % 2])
+            cr.rectangle(left, 0, right - left, height)
+            cr.fill()
+            extents = cr.text_extents(name)
+            if extents.width + 4 < right - left:
+                cr.set_source_rgba(color.red, color.green, color.blue, 1)
+                cr.move_to(left + 2, (height + extents.height) / 2)
+                cr.show_text(name)
+
+        if self.key:
+            extents = cr.text_extents(self.key)
+            cr.set_source_rgba(color.red, color.green, color.blue, 0.6)
+            cr.move_to(width - extents.width - 4, extents.height + 2)
+            cr.show_text(self.key)
+
+    def draw_notes(self, cr, width, top, height, color):
+        """The notes as bars, a row per semitone from the lowest one."""
+        notes = [note for note in self.notes
+                 if note[1] > self.start and note[0] < self.end]
+        if not notes:
+            return
+        low = min(note for start, end, note, velocity in notes)
+        high = max(note for start, end, note, velocity in notes)
+        row = height / float(high - low + 1)
+        for start, end, note, velocity in notes:
+            left = max(self.x(start, width), 0)
+            right = min(self.x(end, width), width)
+            alpha = 0.3 + 0.7 * velocity / 127.0
+            cr.set_source_rgba(*(self.NOTE_COLOR + (alpha,)))
+            cr.rectangle(left, top + (high - note) * row, max(right - left, 1),
+                         max(row - 1, 1))
+            cr.fill()
+
+        # Names of the highest and lowest notes, as heard
+        cr.set_source_rgba(color.red, color.green, color.blue, 0.6)
+        name = note_name(high + self.transpose)
+        cr.move_to(2, top + cr.text_extents(name).height + 2)
+        cr.show_text(name)
+        if low < high:
+            cr.move_to(2, top + height - 2)
+            cr.show_text(note_name(low + self.transpose))
+
+    def destroy_widgets(self):
+        self.disconnect(self.draw_sigid)
@@ -0,0 +1,168 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Main loop stall detector.
+
+Everything Looper does runs on the GTK main thread, so a slow handler
+freezes all of Rhythmbox. The watchdog
+
+- schedules a heartbeat and measures how late the main loop dispatches it,
+- times every Looper handler decorated with `@watched`,
+- attributes late heartbeats to the Looper handlers that ran meanwhile,
+- keeps the worst offenders and the most recent stalls for inspection.
+
+While no watchdog is installed `@watched` handlers only pay a global lookup.
+"""
+
+import json
+import time
+import heapq
+import functools
+from collections import deque
+
+from gi.repository import GLib
+
+from looper_telemetry import Histogram
+
+
+_watchdog = None
+
+
+def watched(func):
+    """Time the decorated handler while a watchdog is installed."""
+    name = getattr(func, '__qualname__', func.__name__)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        watchdog = _watchdog
+        if watchdog is None:
+            return func(*args, **kwargs)
+        return watchdog.call(name, func, args, kwargs)
+    return wrapper
+
+
+class Watchdog(object):
+
+    # Heartbeat interval in ms.
+    INTERVAL = 50
+
+    # Handlers and heartbeats slower than this (ms) are stalls.
+    THRESHOLD = 20
+
+    # Number of worst offenders and recent stalls kept.
+    WORST = 20
+    RECENT = 50
+
+    def __init__(self):
+        self.dispatch_latency = Histogram('dispatch latency')
+        self.reset()
+        self.beat_id = None
+
+    def reset(self):
+        self.dispatch_latency.reset()
+        self.handlers = {}
+        self.worst = []
+        self.stalls = deque(maxlen=self.RECENT)
+        self.calls = deque(maxlen=32)
+        self.started = time.time()
+        self.last_beat = None
+
+    def install(self):
+        global _watchdog
+        _watchdog = self
+        self.last_beat = time.time()
+        self.beat_id = GLib.timeout_add(self.INTERVAL, self.beat)
+
+    def uninstall(self):
+        global _watchdog
+        if _watchdog is self:
+            _watchdog = None
+        if self.beat_id is not None:
+            GLib.source_remove(self.beat_id)
+            self.beat_id = None
+
+    def call(self, name, func, args, kwargs):
+        start = time.time()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            end = time.time()
+            duration = (end - start) * 1000
+            stats = self.handlers.get(name)
+            if stats is None:
+                stats = self.handlers[name] = [0, 0.0, 0.0]
+            stats[0] += 1
+            stats[1] += duration
+            stats[2] = max(stats[2], duration)
+            self.calls.append((name, start, end))
+            if duration >= self.THRESHOLD:
+                offender = (duration, start, name)
+                if len(self.worst) < self.WORST:
+                    heapq.heappush(self.worst, offender)
+                else:
+                    heapq.heappushpop(self.worst, offender)
+
+    def beat(self):
+        now = time.time()
+        late = (now - self.last_beat) * 1000 - self.INTERVAL
+        self.dispatch_latency.record(late)
+        if late >= self.THRESHOLD:
+            self.stalls.append((now, late, self.culprit(self.last_beat, now)))
+        self.last_beat = now
+        return True
+
+    def culprit(self, since, until):
+        """The Looper handler that ran longest between `since` and `until`."""
+        longest, culprit = 0, 'outside Looper'
+        for name, start, end in self.calls:
+            overlap = min(end, until) - max(start, since)
+            if overlap > longest:
+                longest, culprit = overlap, name
+        return culprit
+
+    def as_dict(self):
+        return {
+            'since': self.started,
+            'dispatch_latency': self.dispatch_latency.as_dict(),
+            'handlers': dict((name, {'count': s[0], 'total_ms': s[1],
+                                     'max_ms': s[2]})
+                             for name, s in self.handlers.items()),
+            'worst': [{'handler': name, 'ms': duration, 'at': start}
+                      for duration, start, name in
+                      sorted(self.worst, reverse=True)],
+            'stalls': [{'at': at, 'late_ms': late, 'handler': name}
+                       for at, late, name in self.stalls],
+        }
+
+    def summary(self):
+        lines = [self.dispatch_latency.summary(), '', 'Worst offenders:']
+        for duration, start, name in sorted(self.worst, reverse=True)[:8]:
+            lines.append('  %8.1f ms  %s  %s' % (
+                duration, time.strftime('%H:%M:%S', time.localtime(start)),
+                name))
+        lines.append('')
+        lines.append('Recent stalls:')
+        for at, late, name in list(self.stalls)[-5:]:
+            lines.append('  %8.1f ms  %s  %s' % (
+                late, time.strftime('%H:%M:%S', time.localtime(at)), name))
+        return '\n'.join(lines)
+
+    def dump(self, path):
+        with open(path, 'w') as f:
+            json.dump(self.as_dict(), f, indent=2, sort_keys=True)
@@ -0,0 +1,100 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Lookup of Rhythmbox widgets Looper doesn't get a reference to.
+"""
+
+from gi.repository import Gtk
+
+
+# Couldn't find better way to find widgets than loop through them
+def find(node, search_id, search_type):
+    if isinstance(node, Gtk.Buildable):
+        if search_type == 'by_id':
+            if Gtk.Buildable.get_name(node) == search_id:
+                return node
+        elif search_type == 'by_name':
+            if node.get_name() == search_id:
+                return node
+
+    if isinstance(node, Gtk.Container):
+        for child in node.get_children():
+            ret = find(child, search_id, search_type)
+            if ret:
+                return ret
+    return None
+
+
+class WidgetLocator(object):
+    """
+    Remembers the widget `resolve()` returns, through a GObject weak
+    reference, and calls `resolve` again only after the widget moved in the
+    widget tree (`hierarchy-changed`) or was finalized. A miss is
+    remembered too, until `window`, if given, is realized (e.g. Rhythmbox's
+    header isn't built yet) or `forget()` is called, so `get()` doesn't walk
+    the tree each time.
+    """
+
+    def __init__(self, resolve, window=None):
+        self.resolve = resolve
+        self.window = window
+        self.ref = None
+        self.sigid = None
+        self.missed = False
+        self.window_sigid = None
+
+    def get(self):
+        if self.ref is not None:
+            widget = self.ref()
+            if widget is not None:
+                return widget
+        elif self.missed:
+            return None
+        return self.locate()
+
+    def locate(self):
+        self.forget()
+        widget = self.resolve()
+        if widget is not None:
+            self.ref = widget.weak_ref()
+            self.sigid = widget.connect('hierarchy-changed',
+                                        self.on_hierarchy_changed)
+        else:
+            self.missed = True
+            if self.window is not None and not self.window.get_realized():
+                self.window_sigid = self.window.connect('realize',
+                                                        self.on_realize)
+        return widget
+
+    def on_hierarchy_changed(self, widget, previous_toplevel):
+        self.forget()
+
+    def on_realize(self, window):
+        self.forget()
+
+    def forget(self):
+        widget = self.ref() if self.ref is not None else None
+        if widget is not None:
+            widget.disconnect(self.sigid)
+        self.ref = None
+        self.sigid = None
+        if self.window_sigid is not None:
+            self.window.disconnect(self.window_sigid)
+            self.window_sigid = None
+        self.missed = False
@@ -0,0 +1,42 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+"""
+Looper's modules, imported from the repository root. These tests don't
+need GTK or GStreamer: without PyGObject, `gi.repository` is a stand-in
+whose modules are None, as the modules tested only use them when running
+(the tests replace what they call).
+"""
+
+import os
+import sys
+import types
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if ROOT not in sys.path:
+    sys.path.insert(0, ROOT)
+
+try:
+    import gi.repository  # noqa: F401
+except ImportError:
+    gi = types.ModuleType('gi')
+    gi.repository = types.ModuleType('gi.repository')
+    for name in ('GLib', 'GObject', 'Gst'):
+        setattr(gi.repository, name, None)
+    sys.modules['gi'] = gi
+    sys.modules['gi.repository'] = gi.repository
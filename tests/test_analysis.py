@@ -0,0 +1,103 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+import pytest
+
+np = pytest.importorskip('numpy')
+
+import looper_analysis  # noqa: E402
+from looper_analysis import (RATE, median_filter, median_filter_axis,  # noqa
+                             segments, separate, separate_chunk,
+                             tuning_offset)
+
+
+@pytest.fixture
+def noise():
+    return np.random.RandomState(0).uniform(
+        -0.5, 0.5, (40000, 2)).astype(np.float32)
+
+
+def sine(freq, seconds=3.0, rate=RATE):
+    return np.sin(2 * np.pi * freq * np.arange(int(seconds * rate)) /
+                  float(rate)).astype(np.float32)
+
+
+def test_median_filter():
+    values = np.array([1.0, 1.0, 9.0, 1.0, 2.0, 2.0, 2.0])
+    assert list(median_filter(values, 3)) == [1, 1, 1, 2, 2, 2, 2]
+    # Edges repeated
+    assert list(median_filter(np.array([5.0, 0.0, 0.0]), 5)) == [5, 0, 0]
+
+
+@pytest.mark.parametrize('axis', [0, 1])
+def test_median_filter_axis(monkeypatch, axis):
+    monkeypatch.setattr(looper_analysis, 'SEPARATION_BLOCK', 3)
+    values = np.random.RandomState(1).rand(9, 7).astype(np.float32)
+    expected = np.apply_along_axis(median_filter, axis, values, 5)
+    assert np.allclose(median_filter_axis(values, 5, axis), expected)
+
+
+def test_separated_parts_add_up(noise):
+    harmonic = separate(noise, 'harmonic')
+    percussive = separate(noise, 'percussive')
+    assert harmonic.shape == noise.shape
+    assert harmonic.dtype == np.float32
+    assert np.abs(harmonic + percussive - noise).max() < 1e-5
+
+
+def test_separate_in_chunks(monkeypatch, noise):
+    monkeypatch.setattr(looper_analysis, 'SEPARATION_CHUNK', 16)
+    whole = separate_chunk(noise, 'harmonic', looper_analysis.SEPARATION_FRAME,
+                           looper_analysis.SEPARATION_HOP)
+    assert np.abs(separate(noise, 'harmonic') - whole).max() < 1e-5
+
+
+def test_steady_tone_is_harmonic():
+    tone = np.tile(sine(440.0)[:, None], (1, 2))
+    harmonic = separate(tone, 'harmonic')
+    percussive = separate(tone, 'percussive')
+    assert np.sum(harmonic ** 2) > 100 * np.sum(percussive ** 2)
+
+
+def test_clicks_are_percussive():
+    clicks = np.zeros((3 * RATE, 2), np.float32)
+    clicks[RATE // 4::RATE // 2] = 1.0
+    harmonic = separate(clicks, 'harmonic')
+    percussive = separate(clicks, 'percussive')
+    assert np.sum(percussive ** 2) > 10 * np.sum(harmonic ** 2)
+
+
+@pytest.mark.parametrize('cents', [-30, 0, 20])
+def test_tuning_offset(cents):
+    freq = 440.0 * 2 ** (cents / 1200.0)
+    samples = sine(freq) + 0.5 * sine(2 * freq)
+    offset, consistency = tuning_offset(samples)
+    assert offset == pytest.approx(cents, abs=3)
+    assert consistency > 0.9
+
+
+def test_tuning_offset_of_silence():
+    assert tuning_offset(np.zeros(RATE, np.float32)) is None
+    assert tuning_offset(np.zeros(100, np.float32)) is None
+
+
+def test_segments():
+    labels = np.array([3, 3, -1, -1, -1, 5])
+    assert segments(labels, first=10) == [(10, 12, 3), (12, 15, -1),
+                                          (15, 16, 5)]
+    assert segments(np.array([], int)) == []
@@ -0,0 +1,132 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+import os
+
+import pytest
+
+from looper_cache import Store
+
+
+@pytest.fixture
+def store(tmpdir):
+    return Store(str(tmpdir.join('cache')))
+
+
+def put(store, key, size, used):
+    """Store `size` bytes under `key`, last used at `used` (s)."""
+    store.put_bytes(key, b'x' * size)
+    path = store.path(key, '.bin')
+    os.utime(path, (used, used))
+    return path
+
+
+def test_json(store):
+    assert store.get_json('ab01') is None
+    store.put_json('ab01', {'tuning': [12.5, 0.9]})
+    assert store.has('ab01')
+    assert store.get_json('ab01') == {'tuning': [12.5, 0.9]}
+    assert os.path.isfile(os.path.join(store.directory, 'ab', 'ab01.json'))
+
+
+def test_bytes(store):
+    store.put_bytes('cd02', b'samples')
+    assert store.get_bytes('cd02')[:] == b'samples'
+    store.put_bytes('cd03', b'')
+    assert store.get_bytes('cd03') == b''
+
+
+def test_array(store):
+    np = pytest.importorskip('numpy')
+    store.put_array('ef04', np.arange(6, dtype=np.float32))
+    assert list(store.get_array('ef04')) == [0, 1, 2, 3, 4, 5]
+
+
+def test_write_replaces(store):
+    store.put_json('ab01', 1)
+    store.put_json('ab01', 2)
+    assert store.get_json('ab01') == 2
+    files, total = store.scan()
+    assert len(files) == 1
+
+
+def test_failed_write_leaves_nothing(store):
+    def save(f):
+        f.write(b'half')
+        raise ValueError('no')
+    with pytest.raises(ValueError):
+        store.write('ab01', '.json', save)
+    assert not store.has('ab01')
+    assert store.scan() == ([], 0)
+
+
+def test_remove(store):
+    store.put_json('ab01', 1)
+    store.remove('ab01')
+    store.remove('ab01')
+    assert not store.has('ab01')
+
+
+def test_unused_write_is_oldest(store):
+    store.put_json('ab01', 1, used=False)
+    assert os.path.getmtime(store.path('ab01', '.json')) == 0
+    # A read counts as a use
+    store.get_json('ab01')
+    assert os.path.getmtime(store.path('ab01', '.json')) > 0
+
+
+def test_evict_least_recently_used(store):
+    paths = [put(store, 'k%d' % used, 100, used) for used in range(1, 6)]
+    store.budget = 320
+    store.evict()
+    # Down to LOW_WATER of the budget, the oldest first
+    assert [os.path.exists(path) for path in paths] == [
+        False, False, False, True, True]
+    assert store.size == 200
+    assert not store.evicting
+
+
+def test_evict_under_budget(store):
+    paths = [put(store, 'k%d' % used, 100, used) for used in range(1, 4)]
+    store.budget = 300
+    store.evict()
+    assert all(os.path.exists(path) for path in paths)
+    assert store.size == 300
+
+
+def test_evict_deletes_stale_temporary_files(store):
+    put(store, 'k1', 100, 1)
+    directory = os.path.dirname(store.path('k1', '.bin'))
+    stale = os.path.join(directory, '.tmp-stale')
+    fresh = os.path.join(directory, '.tmp-fresh')
+    for path in (stale, fresh):
+        with open(path, 'wb') as f:
+            f.write(b'partial')
+    os.utime(stale, (1, 1))
+    store.evict()
+    assert not os.path.exists(stale)
+    assert os.path.exists(fresh)
+    assert store.size == 100
+
+
+def test_pickled_store_starts_uncounted(store):
+    import pickle
+    store.size = 100
+    copy = pickle.loads(pickle.dumps(store))
+    assert copy.directory == store.directory
+    assert copy.size is None
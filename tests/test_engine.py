@@ -0,0 +1,158 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+import pytest
+
+import looper_engine
+from looper_engine import LoopEngine, LoopState, clamp_boundaries
+from looper_telemetry import Telemetry
+
+
+class Clock(object):
+    """Stands in for `time.time` in `looper_engine`."""
+
+    def __init__(self, now=1000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(looper_engine.time, 'time', clock)
+    return clock
+
+
+def test_clamp_pushes_end_when_start_moves_past_it():
+    assert clamp_boundaries(9, 10, 'start', 2) == (9, 11)
+
+
+def test_clamp_pulls_start_when_end_is_the_song_end():
+    assert clamp_boundaries(59, 60, 'start', 2, duration=60) == (58, 60)
+
+
+def test_clamp_pulls_start_when_end_moves_before_it():
+    assert clamp_boundaries(10, 11, 'end', 2) == (9, 11)
+
+
+def test_clamp_pushes_end_from_the_song_start():
+    assert clamp_boundaries(0.0, 1, 'end', 2) == (0.0, 2)
+
+
+def test_clamp_leaves_a_wide_enough_loop():
+    assert clamp_boundaries(10, 20, 'start', 2) == (10, 20)
+    assert clamp_boundaries(10, 20, 'end', 2) == (10, 20)
+
+
+def test_engine_clamp_uses_its_range_and_duration():
+    engine = LoopEngine()
+    engine.min_range = 5
+    engine.duration = 30
+    assert engine.clamp(28, 30, 'start') == (25, 30)
+
+
+def test_state_scales_boundaries_with_the_filter():
+    state = LoopState.make(10, 21, tempo=50.0, rate=100.0,
+                           pitch_enabled=True)
+    assert (state.stream_start, state.stream_end) == (20, 42)
+    assert LoopState.make(10, 21, tempo=50.0)[6:] == (10, 21)
+
+
+def test_state_update():
+    state = LoopState.make(10, 20)
+    updated = state.update(tempo=200.0, pitch_enabled=True)
+    assert updated.tempo == 200.0
+    assert (updated.start, updated.end) == (10, 20)
+    assert (updated.stream_start, updated.stream_end) == (5, 10)
+    # A new state, the old one unchanged
+    assert state.tempo == 100.0
+    assert (state.stream_start, state.stream_end) == (10, 20)
+
+
+def test_tick_seeks_back_into_the_loop():
+    seeks = []
+    engine = LoopEngine(seek=seeks.append)
+    engine.set_boundaries(10, 20)
+    assert engine.tick(15) == (10, 20)
+    assert engine.tick(20) == (10, 20)
+    engine.tick(5)
+    assert seeks == [-10, 5]
+
+
+def test_tick_waits_for_the_song_to_start():
+    seeks = []
+    engine = LoopEngine(seek=seeks.append)
+    engine.set_boundaries(10, 20)
+    engine.tick(0)
+    assert seeks == []
+
+
+def test_tick_uses_the_stream_boundaries():
+    seeks = []
+    engine = LoopEngine(seek=seeks.append)
+    engine.set_boundaries(10, 20)
+    engine.set_filter(tempo=200, enabled=True)
+    assert engine.tick(12) == (5, 10)
+    assert seeks == [-7]
+
+
+def test_seek_done_records_the_latency(clock):
+    engine = LoopEngine(seek=lambda offset: True, position=lambda: 20.5)
+    engine.telemetry = Telemetry()
+    engine.set_boundaries(10, 20)
+    engine.tick(20)
+    assert engine.seek_pending
+    clock.now += 0.1
+    # Not back in the loop yet
+    assert engine.seek_done(20.6)
+    clock.now += 0.2
+    assert not engine.seek_done(10.1)
+    assert not engine.seek_pending
+    histogram = engine.telemetry.seek_latency
+    assert histogram.count == 1
+    # Crossed 0.5 s before the seek, done 0.3 s after it
+    assert histogram.total == pytest.approx(800, abs=1)
+
+
+def test_failed_seek_isnt_pending():
+    engine = LoopEngine(seek=lambda offset: False)
+    engine.telemetry = Telemetry()
+    engine.set_boundaries(10, 20)
+    engine.tick(25)
+    assert not engine.seek_pending
+    assert engine.telemetry.seek_failures == {'unknown': 1}
+
+
+def test_seek_done_gives_up_after_the_timeout(clock):
+    engine = LoopEngine(seek=lambda offset: True)
+    engine.telemetry = Telemetry()
+    engine.set_boundaries(10, 20)
+    engine.tick(20)
+    clock.now += LoopEngine.SEEK_TIMEOUT + 1
+    assert not engine.seek_done(25)
+    assert engine.telemetry.seek_latency.count == 0
+
+
+def test_seek_done_without_telemetry():
+    engine = LoopEngine(seek=lambda offset: True)
+    engine.set_boundaries(10, 20)
+    engine.tick(20)
+    assert not engine.seek_pending
+    assert not engine.seek_done(15)
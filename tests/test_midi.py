@@ -0,0 +1,112 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+import struct
+
+from looper_midi import (TICKS, midi_file, seconds_to_ticks, variable_length,
+                         write_midi_file)
+
+
+def test_variable_length():
+    assert variable_length(0) == bytearray([0])
+    assert variable_length(0x7f) == bytearray([0x7f])
+    assert variable_length(0x80) == bytearray([0x81, 0])
+    assert variable_length(0x3fff) == bytearray([0xff, 0x7f])
+    assert variable_length(0x4000) == bytearray([0x81, 0x80, 0])
+
+
+def test_seconds_to_ticks():
+    assert seconds_to_ticks(0) == 0
+    assert seconds_to_ticks(1) == 2 * TICKS
+    assert seconds_to_ticks(0.25) == TICKS // 2
+
+
+def events(data):
+    """Header fields and (delta, event bytes) of a format 0 file."""
+    assert data[:4] == b'MThd'
+    header = struct.unpack('>IHHH', data[4:14])
+    assert data[14:18] == b'MTrk'
+    length, = struct.unpack('>I', data[18:22])
+    track = bytearray(data[22:])
+    assert len(track) == length
+    found, index = [], 0
+    while index < len(track):
+        delta = 0
+        while True:
+            byte = track[index]
+            index += 1
+            delta = (delta << 7) | (byte & 0x7f)
+            if not byte & 0x80:
+                break
+        if track[index] == 0xff:
+            size = 3 + track[index + 2]
+        else:
+            size = 3
+        found.append((delta, bytes(track[index:index + size])))
+        index += size
+    return header, found
+
+
+def test_header():
+    header, found = events(midi_file([]))
+    assert header == (6, 0, 1, TICKS)
+    # Tempo, then the end of the track
+    assert found == [(0, b'\xff\x51\x03\x07\xa1\x20'), (0, b'\xff\x2f\x00')]
+
+
+def test_notes():
+    header, found = events(midi_file([(0.5, 1.0, 69, 100),
+                                      (1.0, 1.5, 71, 90)], channel=2))
+    assert found[1:-1] == [
+        (480, b'\x92\x45\x64'),
+        (480, b'\x82\x45\x00'),
+        # A note ends before the next one starts at the same tick
+        (0, b'\x92\x47\x5a'),
+        (480, b'\x82\x47\x00'),
+    ]
+
+
+def test_unordered_notes_are_sorted():
+    header, found = events(midi_file([(1.0, 1.5, 60, 80),
+                                      (0.0, 0.5, 62, 80)]))
+    assert [event[1][1] for event in found[1:-1]] == [62, 62, 60, 60]
+
+
+def test_note_range_and_length():
+    header, found = events(midi_file([(0.0, 0.0, 200, 80),
+                                      (1.0, 1.0, -3, 80)]))
+    assert found[1:-1] == [
+        (0, b'\x90\x7f\x50'),
+        # At least a tick long
+        (1, b'\x80\x7f\x00'),
+        (959, b'\x90\x00\x50'),
+        (1, b'\x80\x00\x00'),
+    ]
+
+
+def test_name():
+    header, found = events(midi_file([], name=u'Lick \xe9'))
+    assert found[0] == (0, b'\xff\x03\x07Lick \xc3\xa9')
+
+
+def test_write_midi_file(tmpdir):
+    path = str(tmpdir.join('notes.mid'))
+    notes = [(0.0, 1.0, 60, 100)]
+    write_midi_file(path, notes, 'C')
+    with open(path, 'rb') as f:
+        assert f.read() == midi_file(notes, 'C')
@@ -0,0 +1,190 @@
+# -*- Mode: python; coding: utf-8; tab-width: 4; indent-tabs-mode: nil; -*-
+###############################################################################
+# Copyright 2013 Ivan Augustinović
+#
+# This file is part of Looper.
+#
+# Looper is free software: you can redistribute it and/or modify it under the
+# terms of the GNU General Public License as published by the Free Software
+# Foundation, either version 3 of the License, or (at your option) any later
+# version.
+#
+# Looper is distributed in the hope that it will be useful, but WITHOUT ANY
+# WARRANTY; without even the implied warranty of MERCHANTABILITY or FITNESS FOR
+# A PARTICULAR PURPOSE. See the GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License along with
+# Looper. If not, see http://www.gnu.org/licenses/.
+###############################################################################
+import threading
+import time
+
+import pytest
+
+import looper_tasks
+from looper_tasks import Executor
+
+
+class MainLoop(object):
+    """Stands in for GLib: idle callbacks run when `run` is called."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.idle = []
+
+    def idle_add(self, func, *args):
+        with self.lock:
+            self.idle.append((func, args))
+        return len(self.idle)
+
+    def run(self):
+        with self.lock:
+            idle, self.idle = self.idle, []
+        for func, args in idle:
+            func(*args)
+
+
+@pytest.fixture
+def main_loop(monkeypatch):
+    main_loop = MainLoop()
+    monkeypatch.setattr(looper_tasks, 'GLib', main_loop)
+    return main_loop
+
+
+@pytest.fixture
+def executor(main_loop):
+    executor = Executor(threads=1, processes=0)
+    yield executor
+    executor.shutdown()
+
+
+def finish(executor, main_loop, *tasks):
+    """
+    Run the main loop until `tasks` are delivered (or cancelled), then
+    once more after the executor's thread has nothing left to run.
+    """
+    deadline = time.time() + 5
+    while not all(task.done for task in tasks):
+        assert time.time() < deadline, 'tasks not delivered'
+        main_loop.run()
+        time.sleep(0.01)
+    while True:
+        with executor.condition:
+            if not executor.running and not executor.queues[False]:
+                break
+        assert time.time() < deadline, 'tasks still running'
+        time.sleep(0.01)
+    main_loop.run()
+
+
+def blocked(executor, results, **kwargs):
+    """A task running until the event returned with it is set."""
+    started, release = threading.Event(), threading.Event()
+
+    def block():
+        started.set()
+        release.wait(5)
+        return 'blocked'
+    task = executor.submit(block, callback=results.append, **kwargs)
+    assert started.wait(5)
+    return task, release
+
+
+def test_result_is_delivered_in_the_main_loop(executor, main_loop):
+    results = []
+    task = executor.submit(lambda a, b: a + b, (1, 2),
+                           callback=results.append)
+    assert results == []
+    finish(executor, main_loop, task)
+    assert results == [3]
+
+
+def test_error_goes_to_the_errback(executor, main_loop):
+    errors = []
+    task = executor.submit(lambda: 1 / 0, errback=errors.append)
+    finish(executor, main_loop, task)
+    assert isinstance(errors[0], ZeroDivisionError)
+
+
+def test_cancel_waiting_task_by_key(executor, main_loop):
+    results = []
+    blocker, release = blocked(executor, results)
+    task = executor.submit(lambda: 'tuning', callback=results.append,
+                           key='song_tuning')
+    executor.cancel('song_tuning')
+    assert task.cancelled
+    executor.cancel('song_tuning')
+    release.set()
+    finish(executor, main_loop, blocker)
+    assert results == ['blocked']
+
+
+def test_same_key_replaces_the_task(executor, main_loop):
+    results = []
+    blocker, release = blocked(executor, results)
+    first = executor.submit(lambda: 1, callback=results.append, key='notes')
+    second = executor.submit(lambda: 2, callback=results.append, key='notes')
+    assert first.cancelled and not second.cancelled
+    release.set()
+    finish(executor, main_loop, blocker, second)
+    assert results == ['blocked', 2]
+    assert executor.keys == {}
+
+
+def test_cancel_running_task_by_key(executor, main_loop):
+    results = []
+    blocker, release = blocked(executor, results, key='sections')
+    executor.cancel('sections')
+    assert blocker.cancelled
+    release.set()
+    finish(executor, main_loop)
+    assert results == []
+
+
+def test_cancel_group(executor, main_loop):
+    results = []
+    blocker, release = blocked(executor, results, group='song')
+    waiting = executor.submit(lambda: 'chords', callback=results.append,
+                              group='song')
+    other = executor.submit(lambda: 'library', callback=results.append,
+                            group='library')
+    executor.cancel_group('song')
+    assert blocker.cancelled and waiting.cancelled
+    release.set()
+    finish(executor, main_loop, other)
+    assert results == ['library']
+
+
+def test_cancel_before_delivery(executor, main_loop):
+    results = []
+    task = executor.submit(lambda: 'late', callback=results.append,
+                           key='late')
+    # Whether or not its result is waiting for the main loop
+    task.cancel()
+    finish(executor, main_loop)
+    assert results == []
+
+
+def test_priority(executor, main_loop):
+    results = []
+    blocker, release = blocked(executor, results)
+    low = executor.submit(lambda: 'low', callback=results.append,
+                          priority=Executor.LOW)
+    high = executor.submit(lambda: 'high', callback=results.append,
+                           priority=Executor.HIGH)
+    release.set()
+    finish(executor, main_loop, blocker, low, high)
+    assert results == ['blocked', 'high', 'low']
+
+
+def test_shutdown(executor, main_loop):
+    results = []
+    blocker, release = blocked(executor, results)
+    task = executor.submit(lambda: 'never', callback=results.append)
+    executor.shutdown()
+    release.set()
+    assert blocker.cancelled and task.cancelled
+    with pytest.raises(RuntimeError):
+        executor.submit(lambda: None)
+    main_loop.run()
+    assert results == []
@@ -19,10 +19,26 @@
 Class Tuner creates a tuner : a keyboard and a few controls
 """
 
-from gi.repository import Gtk, GObject, Gdk
+from gi.repository import Gtk, GObject, Gdk, GLib
 from subprocess import Popen
 from collections import deque
-import locale, gettext, os, sys
+import locale, gettext, os, sys, time
+
+# Translation of the tuner's strings, set by the first Tuner. Not
+# gettext.install, which would replace the `_` of the whole process.
+_ = gettext.gettext
+
+try:
+    from looper_synth import Synth, PLUCK, SINE
+except ImportError:
+    # No NumPy, only the external backends are available
+    Synth = None
+
+try:
+    from looper_pitch import Listener, note_index
+except ImportError:
+    # No NumPy, no listening
+    Listener = None
 
 class _Note():
 
@@ -223,8 +239,8 @@ class _Key(Gtk.Box):
     Each key consists of a button to play a sound, a button to select the
     frequency, and two buttons to tune up or down with a half tone step
 
-    Public methods : adjust_freq(), get_freq(), get_index(), set_notestyle(), 
-    set_key_enabled()
+    Public methods : adjust_freq(), get_freq(), get_index(), set_index(),
+    set_notestyle(), set_key_enabled()
 
     """
 
@@ -343,7 +359,7 @@ class _Key(Gtk.Box):
 
         # Show all
         ##########
-        self._set_label()
+        self.set_index(index)
         self.show()
 
     def adjust_freq(self, widget=None, shift=0):
@@ -401,25 +417,7 @@ class _Key(Gtk.Box):
         # If new freq selected
         if note_selector.run() == Gtk.ResponseType.OK:
             # Get freq index from dialog
-            self._index = note_selector.get_index()
-            # Set label
-            self._set_label()
-            # Set buttons sensitivity accordingly
-            if self._index == 0:
-                self._button_up.set_sensitive(True)
-                self._button_oct_up.set_sensitive(True)
-                self._button_down.set_sensitive(False)
-                self._button_oct_down.set_sensitive(False)
-            elif self._index == (len(_Note.notes) - 1 ):
-                self._button_up.set_sensitive(False)
-                self._button_oct_up.set_sensitive(False)
-                self._button_down.set_sensitive(True)
-                self._button_oct_down.set_sensitive(True)
-            else:
-                self._button_up.set_sensitive(True)
-                self._button_oct_up.set_sensitive(True)
-                self._button_down.set_sensitive(True)
-                self._button_oct_down.set_sensitive(True)
+            self.set_index(note_selector.get_index())
             self.emit('frequency-changed')
         
         # Destroy dialog
@@ -437,6 +435,22 @@ class _Key(Gtk.Box):
 
         return self._index
 
+    def set_index(self, index):
+
+        """Set frequency index, refresh labels and buttons sensitivity.
+
+        Doesn't emit frequency-changed, this is how the Tuner switches
+        tunings without rebuilding its keys.
+        """
+
+        self._index = index
+        self._set_label()
+        # Set buttons sensitivity accordingly
+        self._button_up.set_sensitive(index < len(_Note.notes) - 1)
+        self._button_oct_up.set_sensitive(index < len(_Note.notes) - 1)
+        self._button_down.set_sensitive(index > 0)
+        self._button_oct_down.set_sensitive(index > 0)
+
     def set_notestyle(self, notestyle):
 
         """Set _notesyle and refresh labels."""
@@ -479,20 +493,41 @@ class Tuner:
     key step tuning, global step tuning. French and english notestyle are
     supported. The length of each note is adjustable.
 
-    Two backends are currently supported : beep and sox. The first uses the
-    internal speaker, the latter the soundcard output.
+    Three backends are currently supported : the built-in synthesizer, beep
+    and sox. Beep uses the internal speaker, the others the soundcard
+    output. The built-in one (needs NumPy) plays in-process, with no
+    startup delay per note, and can play all keys as a chord.
+
+    The key's notes are picked in _Note.notes table. Tunings (sets of keys)
+    are saved by name and switched from the tuning selector; the keys are
+    reused rather than rebuilt.
 
-    The key's notes are picked in _Note.notes table.
+    Listen turns it into a chromatic tuner: the pitch heard by the
+    microphone (needs NumPy) is shown as the nearest note and its deviation
+    in cents.
+
+    Notes are relative to A4 at 440 Hz, or at the frequency set with
+    set_reference(), e.g. that of a recording tuned otherwise.
+
+    The window isn't modal: closing it hides it, present() shows it again
+    as it was left, and destroy() gets rid of it.
     """
 
     # Define backends
-    _BEEP, _SOX_SINE, _SOX_PLUCK = range(3)
+    _BEEP, _SOX_SINE, _SOX_PLUCK, _SYNTH_PLUCK, _SYNTH_SINE = range(5)
+    _SYNTH_VOICES = {_SYNTH_PLUCK: PLUCK, _SYNTH_SINE: SINE} if Synth else {}
 
-    def __init__(self, keys=None):
+    def __init__(self, keys=None, settings=None, parent=None, source=''):
 
-        """Initialize and display a keyboard
+        """Initialize a keyboard
         
-        keys is an optional array of frequency indexes
+        keys is an optional array of frequency indexes,
+        settings is an optional Gio.Settings holding the saved tunings
+        ('tunings' and 'tuning' keys), keys is ignored when given, and
+        the input to listen to ('tuner-input' key), source is ignored then,
+        parent is the window the tuner belongs to,
+        source is what to listen to instead of the microphone: a sound
+        file or a GStreamer source description.
         
         """
 
@@ -500,10 +535,26 @@ class Tuner:
         ######
         # Using local path
         local_path = os.path.abspath(os.path.dirname(sys.argv[0])) + "/locale"
-        gettext.install("tuner", local_path)
+        global _
+        _ = gettext.translation("tuner", local_path, fallback=True).gettext
         
-        # Create empty if no key specified
-        self._default_keys = keys or []
+        # Saved tunings, from the settings or only the keys specified
+        self._settings = settings
+        if settings is not None:
+            self._tunings = dict(settings['tunings'])
+            self._tuning = settings['tuning']
+        else:
+            self._tuning = _("Default")
+            self._tunings = {self._tuning: list(keys or [])}
+        # Create empty if tuning unknown
+        self._default_keys = self._tunings.get(self._tuning, [])
+
+        # Frequency of A4, all notes played and heard are relative to it
+        self._reference = 440.0
+
+        # Pitch listener, while listening
+        self._listener = None
+        self._source = settings['tuner-input'] if settings else source
 
         # Variables
         ###########
@@ -511,37 +562,79 @@ class Tuner:
         # Buttons and handlers
         self._buttons = []
 
-        # Beep process
+        # Beep process (or built-in synthesizer note)
         self._beep_process = 0
 
+        # Built-in synthesizer, created on first use
+        self._synth = None
+
         # Beep queue
         self._beep_queue = deque([])
 
         # Note playing token
         self._note_playing  = False
 
+        # Set once the dialog is destroyed, for late end of note callbacks
+        self._destroyed = False
+
         # Keys modified flag
         self._keys_modified_flag = False
 
         # Settings
         self._beep_length = 1
         self._notestyle = _Note.INDEX_FR_NAME
-        self._backend = self._SOX_PLUCK
+        self._backend = self._SYNTH_PLUCK if Synth else self._SOX_PLUCK
 
         # Create window
         ###############
         self._dialog = Gtk.Dialog()
-        self._dialog.connect("destroy", self._close_request)
+        if parent is not None:
+            self._dialog.set_transient_for(parent)
+        self._dialog.connect("delete-event", self._hide)
         self._dialog.set_title(_("Tuner"))
         self._dialog.set_border_width(10)
 
         # Create vertical box and horizontal sub-boxes
         vbox = Gtk.Box(homogeneous=False, spacing=10, 
                        orientation=Gtk.Orientation.VERTICAL)
+        hbox_tuning = Gtk.Box(homogeneous=False, spacing=5)
         hbox_controls = Gtk.ButtonBox()
         self._hbox_keys = Gtk.Box(homogeneous=True)
         hbox_settings = Gtk.Box(homogeneous=False, spacing=10)
 
+        # Tuning horizontal box
+        #######################
+
+        label = Gtk.Label(label=_("Tuning"))
+        hbox_tuning.pack_start(label, False, True, 0)
+        label.show()
+
+        # Tuning selector, its entry names the tuning to save
+        self._tuning_combo = Gtk.ComboBoxText.new_with_entry()
+        self._fill_tunings()
+        self._tuning_combo.connect("changed", self._select_tuning)
+        hbox_tuning.pack_start(self._tuning_combo, True, True, 0)
+        self._tuning_combo.show()
+
+        # Save keys as tuning
+        button = Gtk.Button(stock=Gtk.STOCK_SAVE)
+        button.connect("clicked", self._save_tuning)
+        hbox_tuning.pack_start(button, False, True, 0)
+        button.show()
+
+        # Delete tuning
+        self._delete_tuning_button = Gtk.Button(stock=Gtk.STOCK_DELETE)
+        self._delete_tuning_button.set_sensitive(len(self._tunings) > 1)
+        self._delete_tuning_button.connect("clicked", self._delete_tuning)
+        hbox_tuning.pack_start(self._delete_tuning_button, False, True, 0)
+        self._delete_tuning_button.show()
+
+        # Reference frequency
+        self._reference_label = Gtk.Label()
+        hbox_tuning.pack_end(self._reference_label, False, True, 0)
+        self._reference_label.show()
+        self.set_reference(self._reference)
+
         # Control horizontal box
         ########################
 
@@ -582,6 +675,14 @@ class Tuner:
         self._play_all_button.connect("clicked", self._play_all)
         self._play_all_button.show()
 
+        # Play all keys at once (built-in synthesizer only)
+        self._play_chord_button = Gtk.Button(label=_("Chord"))
+        hbox_controls.add(self._play_chord_button)
+        hbox_controls.set_child_secondary(self._play_chord_button, True)
+        self._play_chord_button.connect("clicked", self._play_chord)
+        self._play_chord_button.set_sensitive(self._is_synth_backend())
+        self._play_chord_button.show()
+
         # Keys horizontal box
         #####################
 
@@ -719,7 +820,19 @@ class Tuner:
         label.set_alignment(0, 1)
         vbox_backend.pack_start(label, False, True, 0)
         label.show()
-        button = Gtk.RadioButton.new_with_label_from_widget(None, 
+        button = None
+        if Synth:
+            button = Gtk.RadioButton.new_with_label_from_widget(
+                None, _("Built-in (pluck)"))
+            button.connect("clicked", self._set_backend, self._SYNTH_PLUCK)
+            vbox_backend.pack_start(button, False, True, 0)
+            button.show()
+            button = Gtk.RadioButton.new_with_label_from_widget(
+                button, _("Built-in (sine)"))
+            button.connect("clicked", self._set_backend, self._SYNTH_SINE)
+            vbox_backend.pack_start(button, False, True, 0)
+            button.show()
+        button = Gtk.RadioButton.new_with_label_from_widget(button,
                                                             "Sox (pluck)")
         button.connect("clicked", self._set_backend, self._SOX_PLUCK)
         vbox_backend.pack_start(button, False, True, 0)
@@ -734,37 +847,84 @@ class Tuner:
         button.connect("clicked", self._set_backend, self._BEEP)
         vbox_backend.pack_start(button, False, True, 0)
         button.show()
+        # Click to sound latency of the built-in synthesizer
+        self._latency_label = Gtk.Label()
+        self._latency_label.set_alignment(0, 1)
+        vbox_backend.pack_start(self._latency_label, False, True, 0)
+        self._latency_label.show()
         hbox_settings.pack_start(vbox_backend, False, True, 0)
         vbox_backend.show()
 
+        # Listen horizontal box
+        #######################
+
+        hbox_listen = Gtk.Box(homogeneous=False, spacing=10)
+
+        # Listen toggle
+        self._listen_button = Gtk.ToggleButton(label=_("Listen"))
+        self._listen_button.set_sensitive(Listener is not None)
+        self._listen_button.connect("toggled", self._toggle_listen)
+        hbox_listen.pack_start(self._listen_button, False, True, 0)
+        self._listen_button.show()
+
+        # Nearest note
+        self._pitch_label = Gtk.Label()
+        self._pitch_label.set_width_chars(6)
+        hbox_listen.pack_start(self._pitch_label, False, True, 0)
+        self._pitch_label.show()
+
+        # Deviation in cents, needle and value
+        self._cents_scale = Gtk.Scale.new_with_range(
+            Gtk.Orientation.HORIZONTAL, -50, 50, 1)
+        self._cents_scale.set_draw_value(False)
+        self._cents_scale.add_mark(0, Gtk.PositionType.BOTTOM, None)
+        self._cents_scale.set_sensitive(False)
+        hbox_listen.pack_start(self._cents_scale, True, True, 0)
+        self._cents_scale.show()
+        self._cents_label = Gtk.Label()
+        self._cents_label.set_width_chars(18)
+        hbox_listen.pack_start(self._cents_label, False, True, 0)
+        self._cents_label.show()
+
         # Show everything
         #################
+        vbox.pack_start(hbox_tuning, True, True, 0)
         vbox.pack_start(hbox_controls, True, True, 0)
         vbox.pack_start(self._hbox_keys, True, True, 0)
         vbox.pack_start(hbox_settings, True, True, 0)
+        vbox.pack_start(hbox_listen, True, True, 0)
+        hbox_tuning.show()
         hbox_controls.show()
         self._hbox_keys.show()
         hbox_settings.show()
+        hbox_listen.show()
         vbox.show()
         self._dialog.vbox.add(vbox)
-        self._dialog.show()
-
-        # Poll note queue
-        GObject.idle_add(self._play_note_from_queue)
 
-    def _play_note(self, freq):
+    def _play_note(self, freqs, clicked=None):
 
         """ Play a note.
         
-        freq is the frequency of the note to be played.
+        freqs are the frequencies of the note to be played, more than one
+        only for chords on the built-in synthesizer.
+        clicked is the time the note was asked for, to measure latency.
         """
 
+        # Notes table is at A4 = 440 Hz
+        freqs = [float(f) * self._reference / 440.0 for f in freqs]
+        freq = '%.2f' % freqs[0]
+
         # Disable buttons while playing
         self._set_buttons_enabled(False)
         
         # Call external program (backend) to play the note
         try:
-            if self._backend == self._BEEP:
+            if self._is_synth_backend():
+                self._beep_process = self._get_synth().play(
+                    freqs, self._beep_length,
+                    self._SYNTH_VOICES[self._backend], clicked,
+                    self._note_done)
+            elif self._backend == self._BEEP:
                 self._beep_process = \
                     Popen(['beep',
                            '-f %s' % freq, 
@@ -785,10 +945,28 @@ class Tuner:
             self._missing_package_error(self._backend)
             self._set_buttons_enabled(True)
         
-        # Set polling in idle to re-enable buttons when done
+        # Re-enable buttons when done: the synthesizer calls back, for
+        # external programs watch the process
         else:
             self._note_playing = True
-            GObject.idle_add(self._poll_beep_in_progress)
+            if not self._is_synth_backend():
+                GLib.child_watch_add(GLib.PRIORITY_DEFAULT,
+                                     self._beep_process.pid,
+                                     self._note_done)
+
+    def _is_synth_backend(self):
+
+        """Whether the built-in synthesizer plays the notes."""
+
+        return self._backend in self._SYNTH_VOICES
+
+    def _get_synth(self):
+
+        """The built-in synthesizer, created on the first call."""
+
+        if self._synth is None:
+            self._synth = Synth()
+        return self._synth
 
     def _stop_playback_request(self, *args):
 
@@ -853,13 +1031,15 @@ class Tuner:
         freq is the frequency of the note to add to the queue.
         """
 
-        self._beep_queue.append(freq)
+        self._beep_queue.append(([freq], time.time()))
+        self._play_note_from_queue()
 
     def _play_note_from_queue(self):
 
         """Play first note from the queue
         
-        This function is called from main loop.
+        This function is called when notes are queued and when a note
+        ends, so nothing runs while the queue is empty.
         """
 
         # If no playback ongoing
@@ -867,15 +1047,25 @@ class Tuner:
             # If queue not empty
             if self._beep_queue:
                 # Play note from queue
-                self._play_note(self._beep_queue.popleft())
-        return True
+                self._play_note(*self._beep_queue.popleft())
 
     def _play_all(self, *args):
 
         """Add all notes on keyboard to queue."""
 
+        # Latency only counts for the first one, the rest wait their turn
         for key in self._buttons:
-            self._add_note_to_queue(None, key.get_freq())
+            self._beep_queue.append(([key.get_freq()], None))
+        self._play_note_from_queue()
+
+    def _play_chord(self, *args):
+
+        """Add all notes on keyboard to queue, to be played at once."""
+
+        if self._buttons:
+            self._beep_queue.append(
+                ([key.get_freq() for key in self._buttons], time.time()))
+            self._play_note_from_queue()
 
     def _add_key(self, widget, index=None, reset=False):
 
@@ -929,6 +1119,56 @@ class Tuner:
         if not reset:
             self._keys_modified()
         
+    def _toggle_listen(self, button):
+
+        """Start or stop listening to the input."""
+
+        if button.get_active():
+            self._listener = Listener(self._show_pitch, self._source,
+                                      self._listen_error)
+            self._listener.start()
+        else:
+            self._stop_listening()
+
+    def _stop_listening(self):
+
+        """Stop listening and clear the pitch display."""
+
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
+        self._show_pitch(None)
+
+    def _show_pitch(self, freq):
+
+        """Show nearest note and deviation of freq, None for no pitch.
+
+        This function is called from main loop, by the listener.
+        """
+
+        if freq is None:
+            self._pitch_label.set_text("-")
+            self._cents_label.set_text("")
+            self._cents_scale.set_value(0)
+            return
+        index = note_index(freq, self._reference)
+        nearest = int(round(index))
+        cents = (index - nearest) * 100
+        if 0 <= nearest < len(_Note.notes):
+            self._pitch_label.set_text(_Note.notes[nearest][self._notestyle])
+        else:
+            self._pitch_label.set_text("?")
+        self._cents_label.set_text("%+d cents (%.1f Hz)" % (cents, freq))
+        self._cents_scale.set_value(cents)
+
+    def _listen_error(self, message):
+
+        """Report a capture error and untoggle Listen."""
+
+        self._listen_button.set_active(False)
+        self._pitch_label.set_text("")
+        self._cents_label.set_text(message)
+
     def _set_notestyle(self, widget, notestyle):
 
         """Set notestyle variable.
@@ -947,6 +1187,7 @@ class Tuner:
         """
 
         self._backend = backend
+        self._play_chord_button.set_sensitive(self._is_synth_backend())
 
     def _set_beep_length (self, widget, beep_length_spin):
 
@@ -981,8 +1222,10 @@ class Tuner:
         for key in self._buttons:
             key.set_key_enabled(enable)
 
-        # Enable / disable play all button
+        # Enable / disable play all buttons
         self._play_all_button.set_sensitive(enable)
+        self._play_chord_button.set_sensitive(enable and
+                                              self._is_synth_backend())
 
         # Disable / enable stop playback button
         self._stop_playback_button.set_sensitive(not enable)
@@ -993,15 +1236,22 @@ class Tuner:
 
     def _reset_keys (self, *args):
        
-        """Reset keyboard to default configuration."""
+        """Reset keyboard to default configuration (the current tuning).
+        
+        Existing keys are reused, only missing ones are created.
+        """
         
-        # Remove all keys
-        for i in range(len(self._buttons)):
+        # Remove extra keys
+        while len(self._buttons) > len(self._default_keys):
             self._rem_key(reset=True)
+
+        # Retune remaining keys
+        for key, index in zip(self._buttons, self._default_keys):
+            key.set_index(index)
         
-        # Set default keys
-        for i in range (len(self._default_keys)):
-            self._add_key(None, self._default_keys[i], reset=True)
+        # Add missing keys
+        for index in self._default_keys[len(self._buttons):]:
+            self._add_key(None, index, reset=True)
         
         # Disable keys modified flag
         self._keys_modified_flag = False
@@ -1009,6 +1259,73 @@ class Tuner:
         # Disable reset button
         self._reset_button.set_sensitive(False)
         
+    def _fill_tunings(self):
+
+        """Refresh the tuning selector from _tunings, _tuning selected."""
+
+        self._tuning_combo.remove_all()
+        for name in sorted(self._tunings):
+            self._tuning_combo.append_text(name)
+            if name == self._tuning:
+                self._tuning_combo.set_active(
+                    len(self._tuning_combo.get_model()) - 1)
+
+    def _store_tunings(self):
+
+        """Save tunings and the current one in the settings, if any."""
+
+        if self._settings is not None:
+            self._settings['tunings'] = self._tunings
+            self._settings['tuning'] = self._tuning
+
+    def _select_tuning(self, combo):
+
+        """Switch keyboard to the tuning picked in the selector."""
+
+        # Typing a name in the entry, or refreshing the selector
+        if combo.get_active() == -1:
+            return
+        name = combo.get_active_text()
+        if name == self._tuning:
+            return
+        self._tuning = name
+        self._default_keys = self._tunings[name]
+        self._reset_keys()
+        if self._settings is not None:
+            self._settings['tuning'] = name
+
+    def _save_tuning(self, *args):
+
+        """Save keys as the tuning named in the selector's entry."""
+
+        name = self._tuning_combo.get_active_text().strip()
+        if not name:
+            return
+        self._tuning = name
+        self._default_keys = [key.get_index() for key in self._buttons]
+        self._tunings[name] = self._default_keys
+        self._store_tunings()
+        self._fill_tunings()
+        self._delete_tuning_button.set_sensitive(len(self._tunings) > 1)
+
+        # Saved keys are the ones reset goes back to
+        self._keys_modified_flag = False
+        self._reset_button.set_sensitive(False)
+
+    def _delete_tuning(self, *args):
+
+        """Delete current tuning and switch to the first one left."""
+
+        if len(self._tunings) < 2:
+            return
+        self._tunings.pop(self._tuning, None)
+        self._tuning = sorted(self._tunings)[0]
+        self._default_keys = self._tunings[self._tuning]
+        self._store_tunings()
+        self._fill_tunings()
+        self._reset_keys()
+        self._delete_tuning_button.set_sensitive(len(self._tunings) > 1)
+
     def _keys_modified (self, *args):
 
         """Set _keys_modified_flag and enable reset button."""
@@ -1019,28 +1336,57 @@ class Tuner:
         # ... and set reset button sensitive
         self._reset_button.set_sensitive(True)
 
-    def _poll_beep_in_progress (self):
+    def _note_done (self, *args):
         
-        """Unset _note_playing flag when playback is over.
+        """Unset _note_playing flag when playback is over and play the
+        next note from the queue.
         
-        This function is called from main loop.
+        This function is called from main loop, by the child watch of the
+        backend process or by the synthesizer.
         """
         
-        # Process still running -> return true to keep polling
-        if self._beep_process.poll() is None:
-            return True
+        if self._destroyed:
+            return False
         # If no more note in queue, enable buttons. Otherwise, don't.
         # (this avoids glitches when enabling/disabling instantly)
         if not self._beep_queue:
             self._set_buttons_enabled(True)
         self._note_playing = False
+        self._show_latency()
+        self._play_note_from_queue()
         return False
 
-    def _close_request (self, *args):
+    def _show_latency(self):
+
+        """Show click to sound latency of the built-in synthesizer."""
+
+        if self._synth is not None and self._synth.latency.count:
+            latency = self._synth.latency
+            self._latency_label.set_text(
+                _("Latency %d ms (max %d ms)") % (latency.percentile(50),
+                                                   latency.max))
+
+    def set_reference(self, reference):
+
+        """Set the frequency of A4 (Hz) notes are played and heard against."""
+
+        self._reference = reference
+        self._reference_label.set_text(_("A4 = %.1f Hz") % reference)
 
-        """Ask for application close in main loop to avoid race conditions."""
+    def _hide (self, *args):
 
-        GObject.idle_add(self.destroy)
+        """Interrupt playback and hide the window instead of destroying it."""
+
+        self._stop_playback()
+        self._listen_button.set_active(False)
+        self._dialog.hide()
+        return True
+
+    def present(self):
+
+        """Show the window, as it was when hidden."""
+
+        self._dialog.present()
 
     def destroy(self):
 
@@ -1049,9 +1395,15 @@ class Tuner:
         This function is called from main loop.
         """
 
+        if self._destroyed:
+            return
         # self._beep_process is not 0 : a subprocess was launched at some point
         if self._beep_process != 0 :
             self._stop_playback()
+        if self._synth is not None:
+            self._synth.close()
+        self._stop_listening()
+        self._destroyed = True
         self._dialog.destroy()
 
     def run(self):
@@ -1059,7 +1411,9 @@ class Tuner:
 
 if __name__ == "__main__":
     
-    # Create Tuner with default guitar tuning (E, A, D, G, B, e).
-    tuner = Tuner([16, 21, 26, 31, 35, 40])
+    # Create Tuner with default guitar tuning (E, A, D, G, B, e), listening
+    # to the sound file or GStreamer source given instead of the microphone.
+    tuner = Tuner([16, 21, 26, 31, 35, 40],
+                  source=sys.argv[1] if len(sys.argv) > 1 else '')
     tuner.run()
-    Gtk.main()
+    tuner.destroy()